@@ -1,3 +1,5 @@
+from sqlalchemy import and_
+
 from common.models import db
 from common.models.logs import Logs
 from common.models.transactions import Transactions
@@ -8,10 +10,17 @@ def get_logs_with_input_by_hash(hash, columns="*"):
     bytes_hash = bytes.fromhex(hash.lower()[2:])
     # Always get FUll Logs now
 
+    # The block number lets partitioned logs be pruned to the partition of the transaction's block
+    block_number = (
+        db.session.query(Transactions.block_number).filter(Transactions.hash == bytes_hash).limit(1).scalar_subquery()
+    )
     logs = (
         db.session.query(Logs)
-        .filter(Logs.transaction_hash == bytes_hash)
-        .join(Transactions, Logs.transaction_hash == Transactions.hash)
+        .filter(Logs.transaction_hash == bytes_hash, Logs.block_number == block_number)
+        .join(
+            Transactions,
+            and_(Logs.transaction_hash == Transactions.hash, Logs.block_number == Transactions.block_number),
+        )
         .add_columns(Transactions.input)
         .all()
     )
@@ -25,7 +34,10 @@ def get_logs_with_input_by_address(address: str, limit=None, offset=None):
     statement = (
         db.session.query(Logs)
         .filter(Logs.address == address_bytes)
-        .join(Transactions, Logs.transaction_hash == Transactions.hash)
+        .join(
+            Transactions,
+            and_(Logs.transaction_hash == Transactions.hash, Logs.block_number == Transactions.block_number),
+        )
         .add_columns(Transactions.input)
     )
 
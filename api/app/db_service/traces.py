@@ -3,17 +3,15 @@ from common.models.traces import Traces
 from common.utils.db_utils import build_entities
 
 
-def get_traces_by_transaction_hash(transaction_hash, columns="*"):
+def get_traces_by_transaction_hash(transaction_hash, columns="*", block_number=None):
     transaction_hash = bytes.fromhex(transaction_hash[2:])
     entities = build_entities(Traces, columns)
 
-    traces = (
-        db.session.query(Traces)
-        .with_entities(*entities)
-        .filter(Traces.transaction_hash == transaction_hash)
-        .order_by(Traces.trace_address)
-        .all()
-    )
+    statement = db.session.query(Traces).with_entities(*entities).filter(Traces.transaction_hash == transaction_hash)
+    if block_number is not None:
+        # Restricts partitioned traces to the partition of the block
+        statement = statement.filter(Traces.block_number == block_number)
+    traces = statement.order_by(Traces.trace_address).all()
 
     return traces
 
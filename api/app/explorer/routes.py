@@ -790,8 +790,11 @@ class ExplorerTransactionInternalTransactions(Resource):
         if len(hash) != 66 or not all(c in string.hexdigits for c in hash[2:]):
             raise APIError("Invalid transaction hash", code=400)
         try:
-
-            traces_row = get_traces_by_transaction_hash(hash)
+            # Traces are partitioned by block, the block of the transaction restricts the lookup to its partition
+            transaction = get_transaction_by_hash(hash=hash, columns=["block_number"])
+            traces_row = get_traces_by_transaction_hash(
+                hash, block_number=transaction.block_number if transaction else None
+            )
 
             trace = get_debug_trace_transaction(
                 [
@@ -5,6 +5,7 @@ import click
 from cli.aggregates import aggregates
 from cli.api import api
 from cli.init_db import init_db
+from cli.partition_tables import partition_tables
 from cli.reorg import reorg
 from cli.stream import stream
 from indexer.utils.logging_utils import logging_basic_config
@@ -30,3 +31,4 @@ cli.add_command(api, "api")
 cli.add_command(aggregates, "aggregates")
 cli.add_command(reorg, "reorg")
 cli.add_command(init_db, "init_db")
+cli.add_command(partition_tables, "partition_tables")
@@ -188,10 +188,11 @@ def reorg(
     )
 
     controller = ReorgController(
-        batch_web3_provider=ThreadLocalProxy(lambda: get_provider_from_uri(provider_uri, batch=False)),
+        batch_web3_provider=ThreadLocalProxy(lambda: get_provider_from_uri(provider_uri, batch=True)),
         job_scheduler=job_scheduler,
         ranges=ranges,
         config=config,
+        batch_size=batch_size,
     )
 
     job = None
@@ -9,7 +9,9 @@ from common.services.postgresql_service import PostgreSQLService
 from enumeration.entity_type import DEFAULT_COLLECTION, calculate_entity_value, generate_output_types
 from indexer.controller.scheduler.job_scheduler import JobScheduler
 from indexer.controller.stream_controller import StreamController
+from indexer.executors.batch_work_executor import enable_adaptive_batching
 from indexer.exporters.item_exporter import create_item_exporters
+from indexer.utils.eth_call_cache import EthCallCache, immutable_selectors
 from indexer.utils.exception_recorder import ExceptionRecorder
 from indexer.utils.limit_reader import create_limit_reader
 from indexer.utils.logging_utils import configure_logging, configure_signals
@@ -18,8 +20,9 @@ from indexer.utils.parameter_utils import (
     check_source_load_parameter,
     generate_dataclass_type_list_from_parameter,
 )
+from indexer.utils.partition_manager import PartitionManager
 from indexer.utils.provider import get_provider_from_uri
-from indexer.utils.sync_recorder import create_recorder
+from indexer.utils.sync_recorder import CoalescingRecorder, PGSyncRecorder, create_recorder
 from indexer.utils.thread_local_proxy import ThreadLocalProxy
 from indexer.utils.utils import pick_random_provider_uri
 
@@ -190,6 +193,184 @@ def calculate_execution_time(func):
     help="The number of workers",
     envvar="MAX_WORKERS",
 )
+@click.option(
+    "--rpc-pool-size",
+    default=0,
+    show_default=True,
+    type=int,
+    envvar="RPC_POOL_SIZE",
+    help="How many keep-alive connections to open per http(s) provider for batch RPC requests. "
+    "When set, batch requests of every worker thread go through one asynchronous connection pool. "
+    "0 means each worker thread sends its requests over its own connection.",
+)
+@click.option(
+    "--rpc-max-inflight",
+    default=256,
+    show_default=True,
+    type=int,
+    envvar="RPC_MAX_INFLIGHT",
+    help="How many batch RPC requests may be in flight at once per provider when --rpc-pool-size is set.",
+)
+@click.option(
+    "--rpc-hedge-percentile",
+    default=0,
+    show_default=True,
+    type=int,
+    envvar="RPC_HEDGE_PERCENTILE",
+    help="When several comma separated provider uris are given, a batch request still running after this "
+    "latency percentile of its endpoint is also sent to the next healthiest endpoint. "
+    "e.g. 95. 0 disables hedging.",
+)
+@click.option(
+    "--eth-call-cache-size",
+    default=0,
+    show_default=True,
+    type=int,
+    envvar="ETH_CALL_CACHE_SIZE",
+    help="Keep up to this many eth_call results shared by every job, so repeated calls are not sent again. "
+    "Calls to decimals(), token0(), token1() and factory() are kept whatever their block. 0 disables the cache.",
+)
+@click.option(
+    "--eth-call-cache-immutable",
+    default="",
+    show_default=True,
+    type=str,
+    envvar="ETH_CALL_CACHE_IMMUTABLE",
+    help="Comma separated calls also kept whatever their block, among name, symbol, fee and tickSpacing, "
+    "or 0x prefixed selectors. Only list calls whose results never change on the indexed contracts.",
+)
+@click.option(
+    "--eth-call-cache-blocks",
+    default=128,
+    show_default=True,
+    type=int,
+    envvar="ETH_CALL_CACHE_BLOCKS",
+    help="Results of calls made at a block are dropped once they are this many blocks behind the latest call.",
+)
+@click.option(
+    "--eth-call-cache-persist",
+    default=None,
+    show_default=True,
+    type=str,
+    envvar="ETH_CALL_CACHE_PERSIST",
+    help="File or redis:// uri where results of calls that never change are saved and loaded on start.",
+)
+@click.option(
+    "--target-batch-latency",
+    default=0,
+    show_default=True,
+    type=float,
+    envvar="TARGET_BATCH_LATENCY",
+    help="Target seconds per batch. When set, each job tunes its batch size and number of concurrent batches "
+    "from measured latency and rate limit or payload too large errors, starting from --batch-size and --max-workers. "
+    "0 keeps the fixed batch sizes.",
+)
+@click.option(
+    "--prefetch-ranges",
+    default=0,
+    show_default=True,
+    type=int,
+    envvar="PREFETCH_RANGES",
+    help="Number of upcoming block ranges whose blocks and receipts are fetched in the background "
+    "while the current range is processed. Useful while catching up. 0 disables prefetching.",
+)
+@click.option(
+    "--log-first",
+    default=False,
+    show_default=True,
+    type=bool,
+    envvar="LOG_FIRST",
+    help="When the requested outputs only need logs, export logs straight from eth_getLogs "
+    "and fetch only the block headers needed, instead of full blocks and every receipt.",
+)
+@click.option(
+    "--pg-copy-min-items",
+    default=0,
+    show_default=True,
+    type=int,
+    envvar="PG_COPY_MIN_ITEMS",
+    help="Item groups of at least this size are loaded into postgres with a binary COPY into a staging table "
+    "and merged with a single upsert, instead of batched INSERT statements. 0 always uses INSERT.",
+)
+@click.option(
+    "--atomic-export",
+    default=False,
+    show_default=True,
+    type=bool,
+    envvar="ATOMIC_EXPORT",
+    help="Export every table of a block range to postgres in a single transaction. "
+    "With a pg sync recorder, the sync record is updated in the same transaction, "
+    "so restarts resume exactly after the last exported range.",
+)
+@click.option(
+    "--pg-synchronous-commit",
+    default=True,
+    show_default=True,
+    type=bool,
+    envvar="PG_SYNCHRONOUS_COMMIT",
+    help="Whether range transactions of --atomic-export wait for the WAL flush. "
+    "When false, a crash may lose the last exported ranges together with their sync record.",
+)
+@click.option(
+    "--pg-export-workers",
+    default=1,
+    show_default=True,
+    type=int,
+    envvar="PG_EXPORT_WORKERS",
+    help="How many tables are exported to postgres in parallel, each on its own connection. "
+    "Large item groups such as logs and traces are also split by block range over these workers. "
+    "Ranges exported with --atomic-export always use a single connection.",
+)
+@click.option(
+    "--pg-partition-size",
+    default=0,
+    show_default=True,
+    type=int,
+    envvar="PG_PARTITION_SIZE",
+    help="Blocks per partition of the high volume tables such as logs, transactions and traces. "
+    "When set, the database migration converts these tables to tables range partitioned by block number, "
+    "and partitions are created ahead of the sync head. 0 keeps the tables unpartitioned. "
+    "Databases already migrated are converted with the partition_tables command.",
+)
+@click.option(
+    "--pipeline-depth",
+    default=0,
+    show_default=True,
+    type=int,
+    envvar="PIPELINE_DEPTH",
+    help="Background export: how many block ranges may wait to be exported while the next ranges are fetched and "
+    "processed. Only the export runs in the background, ranges are still fetched and processed one at a time. "
+    "0 means every range is exported before the next one starts. "
+    "The sync record only moves past a range once it has been exported.",
+)
+@click.option(
+    "--export-batch-items",
+    default=0,
+    show_default=True,
+    type=int,
+    envvar="EXPORT_BATCH_ITEMS",
+    help="Items of consecutive block ranges are held and exported together, in one batch per table, "
+    "once at least this many items are waiting. The export runs in the background, "
+    "using a pipeline depth of 1 when --pipeline-depth is not set. 0 exports every range on its own.",
+)
+@click.option(
+    "--export-batch-seconds",
+    default=0,
+    show_default=True,
+    type=int,
+    envvar="EXPORT_BATCH_SECONDS",
+    help="Items held for --export-batch-items are exported once the oldest of them has waited this many seconds, "
+    "even if fewer items are waiting. 0 disables the time threshold.",
+)
+@click.option(
+    "--job-concurrency",
+    default=1,
+    show_default=True,
+    type=int,
+    envvar="JOB_CONCURRENCY",
+    help="How many jobs may run at the same time for one block range. "
+    "Each job starts as soon as the jobs producing its dependencies have finished.",
+)
 @click.option(
     "--delay",
     default=0,
@@ -246,6 +427,23 @@ def calculate_execution_time(func):
     'e.g pg:base. means sync record data will store in pg as "base" be key'
     'or file:base. means sync record data will store in file as "base" be file name',
 )
+@click.option(
+    "--checkpoint-ranges",
+    default=0,
+    show_default=True,
+    type=int,
+    envvar="CHECKPOINT_RANGES",
+    help="Write the sync record only once every this many synced ranges. 0 or 1 writes it after every range.",
+)
+@click.option(
+    "--checkpoint-seconds",
+    default=0,
+    show_default=True,
+    type=int,
+    envvar="CHECKPOINT_SECONDS",
+    help="Write the sync record at most once every this many seconds, or sooner with --checkpoint-ranges. "
+    "Records are always written when idle at the chain head and on exit. 0 disables the time limit.",
+)
 @click.option(
     "--cache",
     default="memory",
@@ -336,13 +534,38 @@ def stream(
     force_filter_mode=False,
     auto_upgrade_db=True,
     log_level="INFO",
+    pipeline_depth=0,
+    job_concurrency=1,
+    rpc_pool_size=0,
+    rpc_max_inflight=256,
+    rpc_hedge_percentile=0,
+    target_batch_latency=0,
+    prefetch_ranges=0,
+    log_first=False,
+    pg_copy_min_items=0,
+    atomic_export=False,
+    pg_synchronous_commit=True,
+    pg_export_workers=1,
+    pg_partition_size=0,
+    export_batch_items=0,
+    export_batch_seconds=0,
+    checkpoint_ranges=0,
+    checkpoint_seconds=0,
+    eth_call_cache_size=0,
+    eth_call_cache_blocks=128,
+    eth_call_cache_immutable="",
+    eth_call_cache_persist=None,
 ):
     configure_logging(log_level, log_file)
     configure_signals()
+    enable_adaptive_batching(target_batch_latency)
+    # Batch requests are balanced over every given uri, single requests go to one of them.
+    batch_provider_uri = provider_uri
+    batch_debug_provider_uri = debug_provider_uri
     provider_uri = pick_random_provider_uri(provider_uri)
     debug_provider_uri = pick_random_provider_uri(debug_provider_uri)
-    logging.info("Using provider " + provider_uri)
-    logging.info("Using debug provider " + debug_provider_uri)
+    logging.info("Using provider " + batch_provider_uri)
+    logging.info("Using debug provider " + batch_debug_provider_uri)
 
     # parameter logic checking
     if source_path:
@@ -353,11 +576,20 @@ def stream(
     config = {
         "blocks_per_file": blocks_per_file,
         "source_path": source_path,
+        "pg_copy_min_items": pg_copy_min_items,
+        "pg_synchronous_commit": pg_synchronous_commit,
+        "pg_export_workers": pg_export_workers,
         "chain_id": Web3(Web3.HTTPProvider(provider_uri)).eth.chain_id,
     }
 
     if postgres_url:
-        service = PostgreSQLService(postgres_url, db_version=db_version, init_schema=auto_upgrade_db)
+        service = PostgreSQLService(
+            postgres_url,
+            db_version=db_version,
+            init_schema=auto_upgrade_db,
+            max_connections=max(10, pg_export_workers + 2),
+            partition_size=pg_partition_size,
+        )
         config["db_service"] = service
         exception_recorder.init_pg_service(service)
     else:
@@ -396,9 +628,50 @@ def stream(
     if source_path and source_path.startswith("postgresql://"):
         source_types = generate_dataclass_type_list_from_parameter(source_types, "source")
 
+    recorder = create_recorder(sync_recorder, config)
+    if checkpoint_ranges > 1 or checkpoint_seconds > 0:
+        recorder = CoalescingRecorder(recorder, flush_ranges=checkpoint_ranges, flush_seconds=checkpoint_seconds)
+
+    partition_manager = None
+    if pg_partition_size and "db_service" in config:
+        partition_manager = PartitionManager(config["db_service"], pg_partition_size)
+    if atomic_export:
+        export_recorder = recorder.recorder if isinstance(recorder, CoalescingRecorder) else recorder
+        if isinstance(export_recorder, PGSyncRecorder):
+            config["export_sync_recorder"] = export_recorder
+        else:
+            logging.warning("Sync record is only exported atomically with a pg sync recorder.")
+
+    call_cache = None
+    if eth_call_cache_size > 0:
+        immutable_calls = [name.strip() for name in eth_call_cache_immutable.split(",") if name.strip()]
+        call_cache = EthCallCache(
+            max_size=eth_call_cache_size,
+            block_window=eth_call_cache_blocks,
+            immutable_selectors=immutable_selectors(immutable_calls),
+            persist_uri=eth_call_cache_persist,
+        )
+
     job_scheduler = JobScheduler(
-        batch_web3_provider=ThreadLocalProxy(lambda: get_provider_from_uri(provider_uri, batch=True)),
-        batch_web3_debug_provider=ThreadLocalProxy(lambda: get_provider_from_uri(debug_provider_uri, batch=True)),
+        batch_web3_provider=ThreadLocalProxy(
+            lambda: get_provider_from_uri(
+                batch_provider_uri,
+                batch=True,
+                pool_size=rpc_pool_size,
+                max_inflight=rpc_max_inflight,
+                hedge_percentile=rpc_hedge_percentile,
+                call_cache=call_cache,
+            )
+        ),
+        batch_web3_debug_provider=ThreadLocalProxy(
+            lambda: get_provider_from_uri(
+                batch_debug_provider_uri,
+                batch=True,
+                pool_size=rpc_pool_size,
+                max_inflight=rpc_max_inflight,
+                hedge_percentile=rpc_hedge_percentile,
+            )
+        ),
         item_exporters=create_item_exporters(output, config),
         batch_size=batch_size,
         debug_batch_size=debug_batch_size,
@@ -410,17 +683,26 @@ def stream(
         auto_reorg=auto_reorg,
         multicall=multicall,
         force_filter_mode=force_filter_mode,
+        pipeline_depth=pipeline_depth,
+        job_concurrency=job_concurrency,
+        prefetch_ranges=prefetch_ranges,
+        log_first=log_first,
+        atomic_export=atomic_export,
+        export_batch_items=export_batch_items,
+        export_batch_seconds=export_batch_seconds,
+        call_cache=call_cache,
     )
 
     controller = StreamController(
         batch_web3_provider=ThreadLocalProxy(lambda: get_provider_from_uri(provider_uri, batch=False)),
         job_scheduler=job_scheduler,
-        sync_recorder=create_recorder(sync_recorder, config),
+        sync_recorder=recorder,
         limit_reader=create_limit_reader(
             source_path, ThreadLocalProxy(lambda: get_provider_from_uri(provider_uri, batch=False))
         ),
         retry_from_record=retry_from_record,
         delay=delay,
+        partition_manager=partition_manager,
     )
 
     controller.action(
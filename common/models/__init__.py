@@ -1,4 +1,6 @@
 from datetime import datetime, timezone
+from functools import lru_cache
+from operator import attrgetter
 from typing import Type
 
 from flask_sqlalchemy import SQLAlchemy
@@ -27,6 +29,9 @@ class HemeraModel(db.Model):
 
     __query_order__ = []
 
+    # Column the table may be range partitioned by, see indexer/utils/partition_manager.py
+    __partition_column__ = None
+
     @staticmethod
     def model_domain_mapping():
         pass
@@ -72,6 +77,130 @@ def general_converter(table: Type[HemeraModel], data: Domain, is_update=False):
     return converted_data
 
 
+def convert_bytea(value):
+    if isinstance(value, bytes):
+        return value
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:]) if value else None
+    if isinstance(value, int):
+        return value.to_bytes(32, byteorder="big")
+    return None
+
+
+def convert_timestamp(value):
+    return datetime.utcfromtimestamp(value)
+
+
+def convert_bytea_array(value):
+    return [bytes.fromhex(address[2:]) for address in value]
+
+
+def convert_json(value):
+    return Json(value)
+
+
+def convert_nullable_json(value):
+    return Json(value) if value is not None else None
+
+
+def convert_numeric(value):
+    return None if isinstance(value, str) else value
+
+
+def get_column_conversion(column_type):
+    # Same decisions as general_converter, taken once per column instead of once per value
+    if isinstance(column_type, BYTEA):
+        return convert_bytea
+    elif isinstance(column_type, TIMESTAMP):
+        return convert_timestamp
+    elif isinstance(column_type, ARRAY) and isinstance(column_type.item_type, BYTEA):
+        return convert_bytea_array
+    elif isinstance(column_type, JSONB):
+        return convert_json
+    elif isinstance(column_type, JSON):
+        return convert_nullable_json
+    elif isinstance(column_type, NUMERIC):
+        return convert_numeric
+    return None
+
+
+class RowConverter:
+    """
+    general_converter compiled for one table and one set of domain attributes. Column types are resolved once,
+    and convert() turns a batch of domains straight into row tuples ordered as "columns".
+    """
+
+    def __init__(self, table: Type[HemeraModel], keys, is_update=False):
+        columns = [key for key in keys if key in table.__table__.c]
+        self._getter = attrgetter(*columns) if len(columns) > 1 else None
+        self._attribute = columns[0] if len(columns) == 1 else None
+        self._conversions = []
+        for index, column in enumerate(columns):
+            conversion = get_column_conversion(get_column_type(table, column))
+            if conversion is not None:
+                self._conversions.append((index, conversion))
+
+        domain_width = len(columns)
+        self._update_time_index = None
+        self._reorg_index = None
+        if is_update:
+            if "update_time" not in columns:
+                columns.append("update_time")
+            self._update_time_index = columns.index("update_time")
+        if "reorg" in table.__table__.columns:
+            if "reorg" not in columns:
+                columns.append("reorg")
+            self._reorg_index = columns.index("reorg")
+        self._padding = [None] * (len(columns) - domain_width)
+        self.columns = columns
+
+    def _values(self, item):
+        if self._getter is not None:
+            return list(self._getter(item)) + self._padding
+        if self._attribute is not None:
+            return [getattr(item, self._attribute)] + self._padding
+        return list(self._padding)
+
+    def convert(self, items):
+        # A single update time for the whole batch, every row of an export is written together
+        update_time = datetime.utcfromtimestamp(datetime.now(timezone.utc).timestamp())
+        conversions = self._conversions
+        update_time_index = self._update_time_index
+        reorg_index = self._reorg_index
+        rows = []
+        for item in items:
+            values = self._values(item)
+            for index, conversion in conversions:
+                values[index] = conversion(values[index])
+            if update_time_index is not None:
+                values[update_time_index] = update_time
+            if reorg_index is not None:
+                values[reorg_index] = False
+            rows.append(tuple(values))
+        return rows
+
+
+@lru_cache(maxsize=None)
+def compile_row_converter(table: Type[HemeraModel], keys, is_update=False):
+    return RowConverter(table, keys, is_update)
+
+
+def convert_rows(table: Type[HemeraModel], items, is_update=False):
+    """
+    Converts domains of one type with general_converter semantics, returning (columns, rows), or None when
+    the domains do not all carry the same attributes and have to be converted one by one.
+    """
+    keys = tuple(items[0].__dict__.keys())
+    width = len(keys)
+    if any(len(item.__dict__) != width for item in items):
+        return None
+    converter = compile_row_converter(table, keys, is_update)
+    try:
+        return converter.columns, converter.convert(items)
+    except AttributeError:
+        return None
+
+
 def import_all_models():
     for name in __models_imports:
         if name != "ImportError":
@@ -84,7 +84,7 @@ def converter(
     is_update=False,
 ):
     converted_data = general_converter(table, data, is_update)
-    if isinstance(data, Block):
+    if isinstance(data, Block) and data.transactions_count is None:
         converted_data["transactions_count"] = len(data.transactions) if data.transactions else 0
 
     return converted_data
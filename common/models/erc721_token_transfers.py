@@ -26,6 +26,7 @@ class ERC721TokenTransfers(HemeraModel):
 
     __table_args__ = (PrimaryKeyConstraint("transaction_hash", "block_hash", "log_index"),)
     __query_order__ = [block_number, log_index]
+    __partition_column__ = "block_number"
 
     @staticmethod
     def model_domain_mapping():
@@ -54,6 +54,7 @@ class Transactions(HemeraModel):
     reorg = Column(BOOLEAN, server_default=text("false"))
 
     __query_order__ = [block_number, transaction_index]
+    __partition_column__ = "block_number"
 
     @staticmethod
     def model_domain_mapping():
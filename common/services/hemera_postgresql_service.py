@@ -21,7 +21,7 @@ class HemeraPostgreSQLService(object):
             connect_args={"application_name": "hemera_indexer"},
         )
         self.jdbc_url = jdbc_url
-        self.connection_pool = pool.SimpleConnectionPool(1, 10, jdbc_url)
+        self.connection_pool = pool.ThreadedConnectionPool(1, 10, jdbc_url)
 
         self.Session = sessionmaker(bind=self.engine)
 
@@ -30,7 +30,15 @@ class PostgreSQLService(object):
             cls._jdbc_instance[jdbc_url] = instance
         return cls._jdbc_instance[jdbc_url]
 
-    def __init__(self, jdbc_url, db_version="head", script_location="migrations", init_schema=False):
+    def __init__(
+        self,
+        jdbc_url,
+        db_version="head",
+        script_location="migrations",
+        init_schema=False,
+        max_connections=10,
+        partition_size=0,
+    ):
         if jdbc_url not in self._jdbc_initialized:
             self.db_version = db_version
             self.engine = create_engine(
@@ -42,7 +50,9 @@ class PostgreSQLService(object):
                 connect_args={"application_name": "hemera_indexer"},
             )
             self.jdbc_url = jdbc_url
-            self.connection_pool = pool.SimpleConnectionPool(1, 10, jdbc_url)
+            self.partition_size = partition_size
+            # Connections are taken from several exporter threads at once
+            self.connection_pool = pool.ThreadedConnectionPool(1, max_connections, jdbc_url)
 
             self.Session = sessionmaker(bind=self.engine)
             if init_schema:
@@ -57,6 +67,8 @@ class PostgreSQLService(object):
 
     def init_schema(self, script_location):
         alembic_cfg = Config()
+        # Read by the partitioned tables migration, tables stay unpartitioned when 0
+        alembic_cfg.attributes["partition_size"] = self.partition_size
         # Set script location and version path separator
         alembic_cfg.set_main_option("script_location", script_location)
         alembic_cfg.set_main_option("version_path_separator", os.pathsep)
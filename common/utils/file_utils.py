@@ -74,6 +74,23 @@ def write_to_file(file, content, mode="w"):
         file_handle.write(content)
 
 
+def write_to_file_atomically(file, content):
+    """Writes the file aside, syncs it and renames it over the old one, so a crash leaves either version intact."""
+    dirname = os.path.dirname(file) or "."
+    pathlib.Path(dirname).mkdir(parents=True, exist_ok=True)
+    temp_file = file + ".tmp"
+    with open(temp_file, "w") as file_handle:
+        file_handle.write(content)
+        file_handle.flush()
+        os.fsync(file_handle.fileno())
+    os.replace(temp_file, file)
+    dir_fd = os.open(dirname, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
 def scan_tmp_files(data_dir):
     paths = os.walk(data_dir)
     tmp_files = []
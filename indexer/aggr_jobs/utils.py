@@ -4,6 +4,7 @@ import click
 from web3 import Web3
 
 from common.models.sync_record import SyncRecord
+from indexer.utils.sync_recorder import parse_file_record
 
 
 def get_yesterday_date():
@@ -52,8 +53,7 @@ def convert_date_to_timestramp(date_string):
 def read_sync_record_from_file():
     try:
         with open("sync_record", "r") as file:
-            sync_record = file.read().strip()
-            return int(sync_record)
+            return parse_file_record(file.read().strip())[0]
     except FileNotFoundError:
         print("sync_record file not found.")
         return None
@@ -65,7 +65,8 @@ def read_sync_record_from_file():
 def read_sync_record_from_pg(db_service):
     try:
         session = db_service.Session()
-        latest_record = session.query(SyncRecord).first()
+        # Progress of the tracked jobs is recorded under "key:JobName" next to the record of the key
+        latest_record = session.query(SyncRecord).filter(SyncRecord.mission_sign.notlike("%:%")).first()
         record = latest_record.last_block_number
         return record
     except Exception:
@@ -1,25 +1,29 @@
 import logging
 import time
+from collections import defaultdict
 from datetime import datetime, timezone
 
-from sqlalchemy import and_, update
+import orjson
+from sqlalchemy import update
 from sqlalchemy.dialects.postgresql import insert
 
 from common.models.blocks import Blocks
 from common.models.fix_record import FixRecord
 from common.utils.exception_control import HemeraBaseException
-from common.utils.web3_utils import build_web3
 from indexer.controller.base_controller import BaseController
 from indexer.utils.exception_recorder import ExceptionRecorder
+from indexer.utils.json_rpc_requests import generate_get_block_by_number_json_rpc
+from indexer.utils.utils import rpc_response_batch_to_results
 
 exception_recorder = ExceptionRecorder()
 
 
 class ReorgController(BaseController):
 
-    def __init__(self, batch_web3_provider, job_scheduler, ranges, config, max_retries=5):
+    def __init__(self, batch_web3_provider, job_scheduler, ranges, config, max_retries=5, batch_size=100):
         self.ranges = ranges
-        self.web3 = build_web3(batch_web3_provider)
+        self.batch_web3_provider = batch_web3_provider
+        self.batch_size = batch_size
         self.db_service = config.get("db_service")
         self.job_scheduler = job_scheduler
         self.max_retries = max_retries
@@ -46,40 +50,41 @@ class ReorgController(BaseController):
 
         self.update_job_info(job_id, {"job_status": "running"})
 
-        offset, limit = 0, remains
+        limit = remains
+        lowest_block = max(block_number - limit + 1, 0)
         try:
-            while offset < limit:
-                fix_need = self.check_block_been_synced(block_number - offset) and self.check_block_need_fix(
-                    block_number - offset
-                )
-
-                if fix_need:
-                    logging.info(f"Reorging block No.{block_number - offset}")
-                    self._do_fixing(block_number - offset, retry_errors)
-                else:
-                    logging.info(
-                        f"Block No.{block_number - offset} is verified to be correct or has not been synced. "
-                        f"Skip to the next one."
+            fix_blocks = self.get_blocks_need_fix(lowest_block, block_number)
+            if fix_blocks:
+                # One run re-indexes every block between the lowest and the highest one to fix,
+                # blocks which were correct in between are simply exported again.
+                start_block, end_block = min(fix_blocks), max(fix_blocks)
+                logging.info(f"Reorging blocks [{start_block}, {end_block}], {len(fix_blocks)} blocks need fixing.")
+                self._do_fixing(start_block, end_block, retry_errors)
+                if start_block == lowest_block:
+                    logging.warning(
+                        f"The first checked block {lowest_block} needed fixing, "
+                        f"the reorg may go deeper than {limit} blocks."
                     )
-
-                if fix_need and offset == limit - 1:
-                    offset += 1
-
-                self.update_job_info(
-                    job_id,
-                    job_info={
-                        "last_fixed_block_number": block_number - offset,
-                        "remain_process": limit - offset - 1,
-                        "update_time": datetime.now(timezone.utc),
-                    },
+            else:
+                logging.info(
+                    f"Blocks [{lowest_block}, {block_number}] are verified to be correct or have not been synced."
                 )
-                offset += 1
+
+            self.update_job_info(
+                job_id,
+                job_info={
+                    "last_fixed_block_number": lowest_block,
+                    "remain_process": 0,
+                    "update_time": datetime.now(timezone.utc),
+                },
+            )
         except (Exception, KeyboardInterrupt, HemeraBaseException) as e:
+            # The range is fixed as a whole, an interrupted job starts over from its first block
             self.update_job_info(
                 job_id,
                 job_info={
-                    "last_fixed_block_number": block_number - offset + 1,
-                    "remain_process": limit - offset,
+                    "last_fixed_block_number": block_number + 1,
+                    "remain_process": limit,
                     "update_time": datetime.now(timezone.utc),
                     "job_status": "interrupt",
                 },
@@ -91,15 +96,15 @@ class ReorgController(BaseController):
 
         logging.info(f"Reorging mission start from block No.{block_number} and ranges {remains} has been completed.")
 
-    def _do_fixing(self, fix_block, retry_errors=True):
+    def _do_fixing(self, start_block, end_block, retry_errors=True):
         tries, tries_reset = 0, True
         while True:
             try:
                 # Main reorging logic
                 tries_reset = True
-                self.job_scheduler.run_jobs(fix_block, fix_block)
+                self.job_scheduler.run_jobs(start_block, end_block)
 
-                logging.info(f"Block No.{fix_block} and relative entities completely fixed .")
+                logging.info(f"Blocks [{start_block}, {end_block}] and relative entities completely fixed .")
                 break
 
             except HemeraBaseException as e:
@@ -195,31 +200,28 @@ class ReorgController(BaseController):
 
         return job
 
-    def check_block_been_synced(self, block_number):
+    def get_blocks_need_fix(self, start_block, end_block):
+        """Returns the synced blocks of [start_block, end_block] whose hash differs from the chain or are flagged."""
         session = self.db_service.get_service_session()
         try:
-            result = session.query(Blocks).filter(and_(Blocks.number == block_number)).first()
+            rows = (
+                session.query(Blocks.number, Blocks.hash, Blocks.reorg)
+                .filter(Blocks.number.between(start_block, end_block))
+                .all()
+            )
         finally:
             session.close()
-        return result is not None
 
-    def check_block_need_fix(self, block_number):
-        block = self.web3.eth.get_block(block_number)
-        block_hash = block.hash.hex()
+        synced_hashes = defaultdict(set)
+        for number, block_hash, reorg in rows:
+            synced_hashes[number].add(None if reorg else bytes(block_hash))
 
-        session = self.db_service.get_service_session()
-        try:
-            result = (
-                session.query(Blocks)
-                .filter(
-                    and_(
-                        Blocks.number == block_number,
-                        Blocks.hash == bytes.fromhex(block_hash[2:]),
-                        Blocks.reorg == False,
-                    )
-                )
-                .first()
-            )
-        finally:
-            session.close()
-        return result is None
+        numbers = sorted(synced_hashes.keys())
+        chain_hashes = {}
+        for i in range(0, len(numbers), self.batch_size):
+            block_number_rpc = list(generate_get_block_by_number_json_rpc(numbers[i : i + self.batch_size], False))
+            response = self.batch_web3_provider.make_request(params=orjson.dumps(block_number_rpc))
+            for block in rpc_response_batch_to_results(response):
+                chain_hashes[int(block["number"], 16)] = bytes.fromhex(block["hash"][2:])
+
+        return [number for number in numbers if chain_hashes.get(number) not in synced_hashes[number]]
@@ -1,26 +1,47 @@
 import logging
+import time
 from collections import defaultdict, deque
+from datetime import datetime
 from typing import List, Set, Type
 
 from pottery import RedisDict
 from redis.client import Redis
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
 
+from common.models.fix_record import FixRecord
 from common.models.tokens import Tokens
 from common.services.postgresql_service import session_scope
 from common.utils.module_loading import import_submodules
+from common.utils.web3_utils import build_web3
 from enumeration.record_level import RecordLevel
+from indexer.controller.scheduler.reorg_scheduler import ReorgScheduler
+from indexer.domain.block import Block
+from indexer.domain.block_ts_mapper import BlockTsMapper
+from indexer.executors.job_dag_executor import JobDAGExecutor
+from indexer.executors.range_pipeline_executor import RangePipelineExecutor
 from indexer.exporters.console_item_exporter import ConsoleItemExporter
+from indexer.exporters.deferred_item_exporter import DeferredItemExporter
+from indexer.exporters.postgres_item_exporter import deduplicate_by_conflict_key
 from indexer.jobs import CSVSourceJob
 from indexer.jobs.base_job import BaseExportJob, BaseJob, ExtensionJob, FilterTransactionDataJob
 from indexer.jobs.check_block_consensus_job import CheckBlockConsensusJob
 from indexer.jobs.export_blocks_job import ExportBlocksJob
+from indexer.jobs.export_transactions_and_logs_job import ExportTransactionsAndLogsJob
+from indexer.jobs.run_context import RunContext
+from indexer.jobs.source_job.log_source_job import LogSourceJob
 from indexer.jobs.source_job.pg_source_job import PGSourceJob
 from indexer.utils.abi import bytes_to_hex_str
+from indexer.utils.block_prefetcher import BlockPrefetcher
 from indexer.utils.exception_recorder import ExceptionRecorder
+from indexer.utils.multicall_hemera.planner import MulticallPlanner
 
 import_submodules("indexer.modules")
 exception_recorder = ExceptionRecorder()
 
+# Status of the fix records of ranges found on a fork by the consensus check, repaired by the stream itself
+AUTO_REPAIR_STATUS = "auto_submitted"
+
 
 def get_tokens_from_db(session):
     with session_scope(session) as s:
@@ -65,14 +86,53 @@ class JobScheduler:
         multicall=None,
         auto_reorg=True,
         force_filter_mode=False,
+        pipeline_depth=0,
+        job_concurrency=1,
+        prefetch_ranges=0,
+        log_first=False,
+        atomic_export=False,
+        export_batch_items=0,
+        export_batch_seconds=0,
+        call_cache=None,
     ):
         self.logger = logging.getLogger(__name__)
         self.auto_reorg = auto_reorg
         self.batch_web3_provider = batch_web3_provider
         self.batch_web3_debug_provider = batch_web3_debug_provider
         self.item_exporters = item_exporters
+        self.pipeline_depth = pipeline_depth
+        self.job_concurrency = job_concurrency
+        self.atomic_export = atomic_export
+        self._pipeline = None
+        self._deferred_exporter = None
+        # Consecutive ranges are exported together until one of the thresholds is reached,
+        # the sync record only moves once they are exported, so coalescing needs the export pipeline.
+        self.export_batch_items = export_batch_items
+        self.export_batch_seconds = export_batch_seconds
+        self._pending_export = None
+        # Block ranges found on a fork by the consensus check, repaired in process by the reorg jobs
+        self._pending_repairs = deque()
+        self._reorg_scheduler = None
+        if (export_batch_items > 0 or export_batch_seconds > 0) and pipeline_depth == 0:
+            pipeline_depth = 1
+        if pipeline_depth > 0:
+            self._pipeline = RangePipelineExecutor(pipeline_depth, name="ExportPipeline")
+        if pipeline_depth > 0 or job_concurrency > 1 or atomic_export:
+            # Jobs hand their outputs to the deferred exporter, the real exporters run once the range is processed,
+            # so exporters are never called from several jobs at the same time and export each range at once.
+            self._deferred_exporter = DeferredItemExporter()
+            self.job_item_exporters = [self._deferred_exporter]
+        else:
+            self.job_item_exporters = item_exporters
         self.batch_size = batch_size
         self._is_multicall = multicall
+        # eth_calls submitted by every job are packed together into multicalls grouped by block
+        self.call_planner = None
+        if multicall:
+            chain_id = build_web3(batch_web3_provider).eth.chain_id
+            self.call_planner = MulticallPlanner(
+                batch_web3_provider.make_request, chain_id, batch_size, max_workers, call_cache=call_cache
+            )
         self.debug_batch_size = debug_batch_size
         self.max_workers = max_workers
         self.config = config
@@ -80,10 +140,15 @@ class JobScheduler:
         self.required_source_types = required_source_types
         self.load_from_source = config.get("source_path") if "source_path" in config else None
         self.jobs = []
+        self.run_context = RunContext()
+        self.domain_readers = defaultdict(set)
+        self.job_dag = None
+        self.job_timings = {}
         self.job_classes = []
         self.job_map = defaultdict(list)
         self.dependency_map = defaultdict(list)
         self.pg_service = config.get("db_service") if "db_service" in config else None
+        self.is_log_first = False
 
         self.discover_and_register_job_classes()
         self.required_job_classes, self.is_pipeline_filter = self.get_required_job_classes(required_output_types)
@@ -91,7 +156,27 @@ class JobScheduler:
         if force_filter_mode:
             self.is_pipeline_filter = True
 
+        if log_first and not self.load_from_source:
+            if not self.is_pipeline_filter and self.is_log_only(self.required_job_classes):
+                self.is_log_first = True
+                self.job_classes = []
+                self.job_map = defaultdict(list)
+                self.dependency_map = defaultdict(list)
+                self.discover_and_register_job_classes()
+                self.required_job_classes, _ = self.get_required_job_classes(required_output_types)
+            else:
+                self.logger.warning("Requested output types need transactions or receipts, log first mode is ignored.")
+
         self.resolved_job_classes = self.resolve_dependencies(self.required_job_classes)
+        self.block_prefetcher = None
+        if prefetch_ranges > 0 and ExportBlocksJob in self.resolved_job_classes and not self.is_pipeline_filter:
+            self.block_prefetcher = BlockPrefetcher(
+                batch_web3_provider,
+                batch_size,
+                max_workers,
+                prefetch_ranges,
+                fetch_receipts=ExportTransactionsAndLogsJob in self.resolved_job_classes,
+            )
         token_dict_from_db = defaultdict()
         if self.pg_service is not None:
             token_dict_from_db = get_tokens_from_db(self.pg_service.get_service_session())
@@ -107,6 +192,11 @@ class JobScheduler:
                     self.logger.warning(f"Error connecting to redis cache: {e}, using memory cache instead")
                     BaseJob.init_token_cache(token_dict_from_db)
         self.instantiate_jobs()
+        self.resolve_domain_readers()
+        if self.auto_reorg:
+            self._load_repair_records()
+        if job_concurrency > 1:
+            self.job_dag = JobDAGExecutor(self.resolve_job_parents(), job_concurrency, name="JobDAG")
         self.logger.info("Export output types: %s", required_output_types)
 
     def get_required_job_classes(self, output_types) -> (List[Type[BaseJob]], bool):
@@ -127,10 +217,10 @@ class JobScheduler:
         return required_job_classes, is_filter
 
     def clear_data_buff(self):
-        BaseJob._data_buff.clear()
+        self.run_context.clear()
 
     def get_data_buff(self):
-        return BaseJob._data_buff
+        return self.run_context
 
     def discover_and_register_job_classes(self):
         if self.load_from_source:
@@ -150,6 +240,15 @@ class JobScheduler:
                 if not skip:
                     all_subclasses.append(export_job)
 
+        elif self.is_log_first:
+            # Jobs fetching blocks, transactions and receipts are replaced by the log source
+            source_output_types = set(LogSourceJob.output_types)
+            all_subclasses = [LogSourceJob] + [
+                export_job
+                for export_job in BaseExportJob.discover_jobs()
+                if not source_output_types & set(export_job.output_types)
+            ]
+
         else:
             all_subclasses = BaseExportJob.discover_jobs()
 
@@ -164,21 +263,36 @@ class JobScheduler:
                 f"Discovered job class {cls.__name__} with outputs {[output.type() for output in cls.output_types]}"
             )
 
+    def is_log_only(self, job_classes):
+        """Tells whether every type the jobs need, besides the types they produce themselves,
+        is produced by LogSourceJob, so the full block and receipt fetching can be skipped."""
+        fetch_job_classes = (ExportBlocksJob, ExportTransactionsAndLogsJob)
+        needed_types = set(self.required_output_types)
+        produced_types = set()
+        for job_class in job_classes:
+            if job_class in fetch_job_classes:
+                continue
+            needed_types.update(job_class.dependency_types + job_class.optional_dependency_types)
+            produced_types.update(job_class.output_types)
+        return needed_types - produced_types <= set(LogSourceJob.output_types)
+
     def instantiate_jobs(self):
         filters = []
         for job_class in self.resolved_job_classes:
-            if job_class is ExportBlocksJob or job_class is PGSourceJob:
+            if job_class is ExportBlocksJob or job_class is PGSourceJob or job_class is LogSourceJob:
                 continue
             job = job_class(
                 required_output_types=self.required_output_types,
                 batch_web3_provider=self.batch_web3_provider,
                 batch_web3_debug_provider=self.batch_web3_debug_provider,
-                item_exporters=self.item_exporters,
+                item_exporters=self.job_item_exporters,
                 batch_size=self.batch_size,
                 multicall=self._is_multicall,
                 debug_batch_size=self.debug_batch_size,
                 max_workers=self.max_workers,
                 config=self.config,
+                block_prefetcher=self.block_prefetcher,
+                call_planner=self.call_planner,
             )
             if isinstance(job, FilterTransactionDataJob):
                 filters.append(job.get_filter())
@@ -190,7 +304,7 @@ class JobScheduler:
                 required_output_types=self.required_output_types,
                 batch_web3_provider=self.batch_web3_provider,
                 batch_web3_debug_provider=self.batch_web3_debug_provider,
-                item_exporters=self.item_exporters,
+                item_exporters=self.job_item_exporters,
                 batch_size=self.batch_size,
                 multicall=self._is_multicall,
                 debug_batch_size=self.debug_batch_size,
@@ -198,14 +312,35 @@ class JobScheduler:
                 config=self.config,
                 is_filter=self.is_pipeline_filter,
                 filters=filters,
+                block_prefetcher=self.block_prefetcher,
             )
             self.jobs.insert(0, export_blocks_job)
+        elif self.is_log_first:
+            header_types = {Block, BlockTsMapper}
+            full_headers = self.auto_reorg or bool(header_types & set(self.required_output_types))
+            for job_class in self.resolved_job_classes:
+                if job_class is not LogSourceJob:
+                    read_types = set(job_class.dependency_types + job_class.optional_dependency_types)
+                    full_headers |= bool(header_types & read_types)
+            log_source_job = LogSourceJob(
+                required_output_types=self.required_output_types,
+                batch_web3_provider=self.batch_web3_provider,
+                batch_web3_debug_provider=self.batch_web3_debug_provider,
+                item_exporters=self.job_item_exporters,
+                batch_size=self.batch_size,
+                multicall=self._is_multicall,
+                debug_batch_size=self.debug_batch_size,
+                max_workers=self.max_workers,
+                config=self.config,
+                full_headers=full_headers,
+            )
+            self.jobs.insert(0, log_source_job)
         else:
             pg_source_job = PGSourceJob(
                 required_output_types=self.required_output_types,
                 batch_web3_provider=self.batch_web3_provider,
                 batch_web3_debug_provider=self.batch_web3_debug_provider,
-                item_exporters=self.item_exporters,
+                item_exporters=self.job_item_exporters,
                 batch_size=self.batch_size,
                 multicall=self._is_multicall,
                 debug_batch_size=self.debug_batch_size,
@@ -221,32 +356,297 @@ class JobScheduler:
                 required_output_types=self.required_output_types,
                 batch_web3_provider=self.batch_web3_provider,
                 batch_web3_debug_provider=self.batch_web3_debug_provider,
-                item_exporters=self.item_exporters,
+                item_exporters=self.job_item_exporters,
                 batch_size=self.batch_size,
                 multicall=self._is_multicall,
                 debug_batch_size=self.debug_batch_size,
                 max_workers=self.max_workers,
                 config=self.config,
                 filters=filters,
+                reorg_handler=self.schedule_reorg_repair,
             )
             self.jobs.append(check_job)
 
+    def resolve_domain_readers(self):
+        # Jobs reading each domain type. A job may also extend an output type another job
+        # has already collected, so outputs count as reads. Required outputs are always kept.
+        self.domain_readers = defaultdict(set)
+        for index, job in enumerate(self.jobs):
+            for domain in job.dependency_types + job.optional_dependency_types + job.output_types:
+                self.domain_readers[domain.type()].add(index)
+
+    def resolve_job_parents(self):
+        # The source job feeds every other job. Any other job waits for the earlier jobs producing a type it reads,
+        # so each job sees the same data it would see when jobs run one after another.
+        parents = []
+        for index, job in enumerate(self.jobs):
+            reads = set(domain.type() for domain in job.dependency_types + job.optional_dependency_types)
+            reads.update(domain.type() for domain in job.output_types)
+            job_parents = set()
+            for parent_index, parent in enumerate(self.jobs[:index]):
+                if parent_index == 0 or reads & set(domain.type() for domain in parent.output_types):
+                    job_parents.add(parent_index)
+            parents.append(job_parents)
+        return parents
+
+    def release_consumed_domains(self, run_context, finished_jobs):
+        required_types = set(output_type.type() for output_type in self.required_output_types)
+        for key in list(run_context.keys()):
+            if key not in required_types and self.domain_readers.get(key, set()) <= finished_jobs:
+                run_context.drop(key)
+
+    def _run_job_graph(self, start_block, end_block, run_context):
+        finished_jobs = set()
+
+        def run_job(index):
+            self.jobs[index].run(start_block=start_block, end_block=end_block, run_context=run_context)
+
+        def on_finished(index):
+            finished_jobs.add(index)
+            self.release_consumed_domains(run_context, finished_jobs)
+
+        start_time = time.time()
+        timings = self.job_dag.execute(run_job, on_finished)
+        wall_time = time.time() - start_time
+
+        self.job_timings = {self.jobs[index].job_name: end - start for index, (start, end) in timings.items()}
+        path, path_duration = self.job_dag.critical_path(timings)
+        self.logger.info(
+            f"Jobs took {wall_time:.3f}s with {self.job_concurrency} workers, "
+            f"critical path {' -> '.join(self.jobs[index].job_name for index in path)} took {path_duration:.3f}s"
+        )
+
+    @property
+    def exports_in_background(self):
+        return self._pipeline is not None
+
     def run_jobs(self, start_block, end_block):
-        self.clear_data_buff()
+        self.run_jobs_with_background_export(start_block, end_block)
+        if self.exports_in_background:
+            self.wait_for_background_export()
+
+    def run_jobs_with_background_export(self, start_block, end_block):
+        """
+        Runs every job for the given range. With background export, only the export of the range is
+        handed to the export pipeline and this call returns as soon as the range has been processed,
+        blocking only while pipeline_depth ranges are still waiting to be exported.
+        Collecting and processing are not pipelined, the jobs of the next range start once this call returns.
+        """
+        run_context = RunContext(start_block, end_block)
+        self.run_context = run_context
         try:
-            for job in self.jobs:
-                job.run(start_block=start_block, end_block=end_block)
-
-            for key, value in self.get_data_buff().items():
-                message = f"{key}: {len(value)}"
+            if self.job_dag is not None:
+                self._run_job_graph(start_block, end_block, run_context)
+            else:
+                finished_jobs = set()
+                for index, job in enumerate(self.jobs):
+                    job.run(start_block=start_block, end_block=end_block, run_context=run_context)
+                    finished_jobs.add(index)
+                    self.release_consumed_domains(run_context, finished_jobs)
+
+            for key, count in run_context.item_counts().items():
+                message = f"{key}: {count}"
                 self.logger.info(message)
                 exception_recorder.log(
                     block_number=-1, dataclass=key, message_type="item_counter", message=message, level=RecordLevel.INFO
                 )
+
+            if self.exports_in_background:
+                self._queue_export(start_block, end_block, self._deferred_exporter.take_items())
+            elif self._deferred_exporter is not None:
+                self._export_range(start_block, end_block, self._deferred_exporter.take_items())
         except Exception as e:
+            if self._deferred_exporter is not None:
+                self._deferred_exporter.take_items()
+            if self.block_prefetcher is not None:
+                self.block_prefetcher.invalidate()
             raise e
         finally:
-            exception_recorder.force_to_flush()
+            if self.block_prefetcher is not None:
+                self.block_prefetcher.release(end_block)
+            exception_recorder.force_to_flush(wait=False)
+
+    def _queue_export(self, start_block, end_block, items):
+        if self._pending_export is None:
+            self._pending_export = (start_block, end_block, items, time.time(), 1)
+        else:
+            pending_start_block, _, pending_items, since, ranges = self._pending_export
+            pending_items.extend(items)
+            self._pending_export = (pending_start_block, end_block, pending_items, since, ranges + 1)
+
+        _, _, pending_items, since, _ = self._pending_export
+        if (
+            (self.export_batch_items <= 0 and self.export_batch_seconds <= 0)
+            or (self.export_batch_items > 0 and len(pending_items) >= self.export_batch_items)
+            or (self.export_batch_seconds > 0 and time.time() - since >= self.export_batch_seconds)
+        ):
+            self._flush_export()
+
+    def _flush_expired_export(self):
+        if self._pending_export is None or self.export_batch_seconds <= 0:
+            return
+        if time.time() - self._pending_export[3] >= self.export_batch_seconds:
+            self._flush_export()
+
+    def _flush_export(self):
+        if self._pending_export is None:
+            return
+        start_block, end_block, items, _, ranges = self._pending_export
+        self._pending_export = None
+        if ranges > 1:
+            # Coalesced ranges repeat the keys of current state tables
+            items = deduplicate_by_conflict_key(items)
+        self._pipeline.submit(start_block, end_block, self._export_range, start_block, end_block, items)
+
+    def _export_range(self, start_block, end_block, items):
+        start_time = datetime.now()
+        for item_exporter in self.item_exporters:
+            item_exporter.open()
+            if self.atomic_export:
+                item_exporter.export_range(start_block, end_block, items)
+            else:
+                item_exporter.export_items(items)
+            item_exporter.close()
+        self.logger.info(
+            f"Range [{start_block}, {end_block}] exported {len(items)} items. Took {datetime.now() - start_time}"
+        )
+
+    def prefetch_blocks(self, start_block, steps, head_block):
+        """Lets the block prefetcher fetch the ranges following start_block while the current one is processed."""
+        if self.block_prefetcher is not None:
+            self.block_prefetcher.prefetch(start_block, steps, head_block)
+
+    def poll_committed_block(self):
+        """
+        Returns the end block of the newest range that has been exported together with every range before it,
+        or None if nothing new has been committed. Re-raises the error of a failed export.
+        """
+        if not self.exports_in_background:
+            return None
+        self._flush_expired_export()
+        return self._pipeline.poll_committed()
+
+    def wait_for_background_export(self):
+        if not self.exports_in_background:
+            return None
+        self._flush_export()
+        return self._pipeline.wait()
+
+    def recover_background_export(self):
+        """
+        Discards ranges which are not committed after a failure, returning the end block of the last committed one.
+        """
+        if not self.exports_in_background:
+            return None
+        self._pending_export = None
+        return self._pipeline.recover()
+
+    def close(self):
+        """Shuts down the executors of the scheduler, waiting for the ranges still running."""
+        if self._pipeline is not None:
+            self._pipeline.shutdown(wait=True)
+        if self.job_dag is not None:
+            self.job_dag.shutdown(wait=True)
+        if self.block_prefetcher is not None:
+            self.block_prefetcher.shutdown()
+
+    def schedule_reorg_repair(self, start_block, end_block):
+        """
+        Schedules the repair of a block range left on a fork. With postgres the range is recorded in fix_record
+        first and only marked completed once repaired, ranges still pending are loaded again on restart.
+        """
+        # Jobs deriving the running range from state built on the reorged blocks have it repaired as well
+        if any([job.handle_reorg(start_block, end_block) for job in self.jobs]) and self.run_context.end_block:
+            end_block = max(end_block, self.run_context.end_block)
+        job_id = self._submit_repair_record(start_block, end_block)
+        self.logger.info(f"Blocks [{start_block}, {end_block}] are scheduled to be repaired.")
+        self._pending_repairs.append((start_block, end_block, job_id))
+
+    def _submit_repair_record(self, start_block, end_block):
+        if self.pg_service is None:
+            return None
+        # Fix records hold the highest block to fix and the number of blocks below it, as the reorg command does
+        stmt = insert(FixRecord).values(
+            {
+                "start_block_number": end_block,
+                "last_fixed_block_number": end_block + 1,
+                "remain_process": end_block - start_block + 1,
+                "job_status": AUTO_REPAIR_STATUS,
+            }
+        )
+        session = self.pg_service.get_service_session()
+        try:
+            result = session.execute(stmt)
+            session.commit()
+        finally:
+            session.close()
+        return result.inserted_primary_key[0]
+
+    def _complete_repair_record(self, job_id):
+        if job_id is None:
+            return
+        session = self.pg_service.get_service_session()
+        try:
+            session.execute(
+                update(FixRecord)
+                .where(FixRecord.job_id == job_id)
+                .values({"job_status": "completed", "update_time": datetime.utcnow()})
+            )
+            session.commit()
+        finally:
+            session.close()
+
+    def _load_repair_records(self):
+        if self.pg_service is None:
+            return
+        session = self.pg_service.get_service_session()
+        try:
+            records = (
+                session.query(FixRecord)
+                .filter(FixRecord.job_status == AUTO_REPAIR_STATUS)
+                .order_by(FixRecord.create_time)
+                .all()
+            )
+        finally:
+            session.close()
+        for record in records:
+            start_block = record.start_block_number - record.remain_process + 1
+            self.logger.info(f"Blocks [{start_block}, {record.start_block_number}] are still to be repaired.")
+            self._pending_repairs.append((start_block, record.start_block_number, record.job_id))
+
+    def has_pending_repairs(self):
+        return len(self._pending_repairs) > 0
+
+    def repair_reorgs(self):
+        """
+        Re-syncs the block ranges left on a fork with the reorg jobs, which replace their rows in postgres.
+        Ranges stay scheduled until they are repaired, so a failed repair is retried on the next call.
+        Exports of earlier ranges must be finished before, the repair would be overwritten otherwise.
+        """
+        if not self._pending_repairs:
+            return
+        if self._reorg_scheduler is None:
+            # The reorg scheduler loads its own token cache, the one of the running jobs is kept
+            tokens = BaseJob.tokens
+            self._reorg_scheduler = ReorgScheduler(
+                batch_web3_provider=self.batch_web3_provider,
+                batch_web3_debug_provider=self.batch_web3_debug_provider,
+                batch_size=self.batch_size,
+                debug_batch_size=self.debug_batch_size,
+                max_workers=self.max_workers,
+                config=self.config,
+                required_output_types=self.required_output_types,
+                multicall=self._is_multicall,
+            )
+            BaseJob.init_token_cache(tokens)
+
+        while self._pending_repairs:
+            start_block, end_block, job_id = self._pending_repairs[0]
+            start_time = datetime.now()
+            self._reorg_scheduler.run_jobs(start_block, end_block)
+            self._complete_repair_record(job_id)
+            self._pending_repairs.popleft()
+            self.logger.info(f"Blocks [{start_block}, {end_block}] repaired. Took {datetime.now() - start_time}")
 
     def resolve_dependencies(self, required_jobs: Set[Type[BaseJob]]) -> List[Type[BaseJob]]:
         sorted_order = []
@@ -12,6 +12,7 @@ from indexer.jobs import FilterTransactionDataJob
 from indexer.jobs.base_job import BaseExportJob, BaseJob, ExtensionJob
 from indexer.jobs.export_blocks_job import ExportBlocksJob
 from indexer.jobs.export_reorg_job import ExportReorgJob
+from indexer.jobs.run_context import RunContext
 from indexer.utils.abi import bytes_to_hex_str
 
 import_submodules("indexer.modules")
@@ -58,6 +59,7 @@ class ReorgScheduler:
         self.config = config
         self.required_output_types = required_output_types
         self.jobs = []
+        self.run_context = RunContext()
         self.job_classes = []
         self.job_map = defaultdict(list)
         self.dependency_map = defaultdict(list)
@@ -83,13 +85,11 @@ class ReorgScheduler:
                     BaseJob.init_token_cache(token_dict_from_db)
         self.instantiate_jobs()
 
-    @staticmethod
-    def get_data_buff():
-        return BaseJob._data_buff
+    def get_data_buff(self):
+        return self.run_context
 
-    @staticmethod
-    def clear_data_buff():
-        BaseJob._data_buff.clear()
+    def clear_data_buff(self):
+        self.run_context.clear()
 
     def discover_and_register_job_classes(self):
         all_subclasses = BaseExportJob.discover_jobs()
@@ -159,9 +159,9 @@ class ReorgScheduler:
         self.jobs.append(export_reorg_job)
 
     def run_jobs(self, start_block, end_block):
-        self.clear_data_buff()
+        self.run_context = RunContext(start_block, end_block)
         for job in self.jobs:
-            job.run(start_block=start_block, end_block=end_block)
+            job.run(start_block=start_block, end_block=end_block, run_context=self.run_context)
 
     def get_required_job_classes(self, output_types):
         required_job_classes = set()
@@ -25,15 +25,19 @@ class StreamController(BaseController):
         max_retries=5,
         retry_from_record=False,
         delay=0,
+        partition_manager=None,
     ):
         self.entity_types = 1
         self.sync_recorder = sync_recorder
+        self.sync_recorder.track_jobs([job.job_name for job in job_scheduler.jobs])
         self.web3 = build_web3(batch_web3_provider)
         self.job_scheduler = job_scheduler
         self.limit_reader = limit_reader
         self.max_retries = max_retries
         self.retry_from_record = retry_from_record
         self.delay = delay
+        self.partition_manager = partition_manager
+        self._committed_block = None
 
     def action(
         self,
@@ -52,15 +56,19 @@ class StreamController(BaseController):
             self._do_stream(start_block, end_block, block_batch_size, retry_errors, period_seconds)
 
         finally:
-            if pid_file is not None:
-                logging.info("Deleting pid file {}".format(pid_file))
-                delete_file(pid_file)
+            try:
+                self.job_scheduler.close()
+            finally:
+                self.sync_recorder.flush()
+                if pid_file is not None:
+                    logging.info("Deleting pid file {}".format(pid_file))
+                    delete_file(pid_file)
 
     def _shutdown(self):
         pass
 
     def _do_stream(self, start_block, end_block, steps, retry_errors, period_seconds):
-        last_synced_block = self.sync_recorder.get_last_synced_block()
+        last_synced_block = self.sync_recorder.get_resume_block()
         if start_block is not None:
             if (
                 not self.retry_from_record
@@ -68,6 +76,7 @@ class StreamController(BaseController):
                 or (end_block is not None and last_synced_block > end_block)
             ):
                 last_synced_block = start_block - 1
+        self._committed_block = last_synced_block
 
         tries, tries_reset = 0, True
         while True and (end_block is None or last_synced_block < end_block):
@@ -90,17 +99,39 @@ class StreamController(BaseController):
                         current_block, target_block, last_synced_block, synced_blocks
                     )
                 )
-
                 if synced_blocks != 0:
+                    self.job_scheduler.prefetch_blocks(target_block + 1, steps, current_block - self.delay)
+                    if self.partition_manager is not None:
+                        self.partition_manager.ensure_partitions(target_block)
+
+                if self.job_scheduler.exports_in_background:
+                    if synced_blocks != 0:
+                        # ETL program's main logic, the range is exported in background
+                        self.job_scheduler.run_jobs_with_background_export(last_synced_block + 1, target_block)
+                        last_synced_block = target_block
+
+                    # Only ranges exported together with all their predecessors move the sync record forward
+                    if synced_blocks == 0 or (end_block is not None and last_synced_block >= end_block):
+                        self._record_committed_block(self.job_scheduler.wait_for_background_export())
+                    else:
+                        self._record_committed_block(self.job_scheduler.poll_committed_block())
+
+                elif synced_blocks != 0:
                     # ETL program's main logic
                     self.job_scheduler.run_jobs(last_synced_block + 1, target_block)
 
-                    logging.info("Writing last synced block {}".format(target_block))
-                    self.sync_recorder.set_last_synced_block(target_block)
+                    self._record_committed_block(target_block)
                     last_synced_block = target_block
 
+                if self.job_scheduler.has_pending_repairs():
+                    # Ranges left on a fork are repaired once every range before them is exported
+                    if self.job_scheduler.exports_in_background:
+                        self._record_committed_block(self.job_scheduler.wait_for_background_export())
+                    self.job_scheduler.repair_reorgs()
+
             except HemeraBaseException as e:
                 logging.exception(f"An rpc response exception occurred while syncing block data. error: {e}")
+                last_synced_block = self._rewind_background_export(last_synced_block)
                 if e.crashable:
                     logging.exception("Mission will crash immediately.")
                     raise e
@@ -119,6 +150,7 @@ class StreamController(BaseController):
 
             except Exception as e:
                 logging.exception("An exception occurred while syncing block data.")
+                last_synced_block = self._rewind_background_export(last_synced_block)
                 tries += 1
                 tries_reset = False
                 if not retry_errors or tries >= self.max_retries:
@@ -133,9 +165,28 @@ class StreamController(BaseController):
                     tries = 0
 
             if synced_blocks <= 0:
+                # Coalesced records are written while idle at the chain head
+                self.sync_recorder.flush()
                 logging.info("Nothing to sync. Sleeping for {} seconds...".format(period_seconds))
                 time.sleep(period_seconds)
 
+    def _record_committed_block(self, block_number):
+        if block_number is None:
+            return
+        logging.info("Writing last synced block {}".format(block_number))
+        self.sync_recorder.set_last_synced_block(block_number)
+        self._committed_block = block_number
+
+    def _rewind_background_export(self, last_synced_block):
+        if not self.job_scheduler.exports_in_background:
+            return last_synced_block
+
+        self._record_committed_block(self.job_scheduler.recover_background_export())
+        logging.info(
+            f"Background export recovered, sync will restart after last committed block {self._committed_block}."
+        )
+        return self._committed_block
+
     def _get_current_block_number(self):
         return int(self.web3.eth.block_number)
 
@@ -30,6 +30,8 @@ class Block(Domain):
     total_difficulty: Optional[int] = None
     extra_data: Optional[str] = None
     withdrawals_root: Optional[str] = None
+    # Set when the block is built from a header whose transactions are not loaded
+    transactions_count: Optional[int] = None
 
     @staticmethod
     def from_rpc(block_dict: dict):
@@ -0,0 +1,121 @@
+import threading
+
+from requests.exceptions import HTTPError
+from requests.exceptions import Timeout as RequestsTimeout
+from web3._utils.threads import Timeout as Web3Timeout
+
+OVERLOAD_STATUS_CODES = (413, 429, 503)
+# JSON-RPC "limit exceeded" error code of EIP-1474
+OVERLOAD_RPC_ERROR_CODES = (-32005,)
+OVERLOAD_MESSAGES = (
+    "too many requests",
+    "service unavailable",
+    "rate limit",
+    "too large",
+    "limit exceeded",
+    "response size",
+    "request entity",
+    "timeout",
+    "timed out",
+)
+
+# Latency gradient step is smoothed and bounded, so a single outlier can not swing the batch size.
+GRADIENT_SMOOTHING = 0.5
+MAX_GROWTH_FACTOR = 2
+DECREASE_FACTOR = 0.5
+# Number of consecutive batches under the target latency before one more worker is allowed.
+CONCURRENCY_INCREASE_STREAK = 5
+
+
+def is_overload_error(e):
+    """Tells whether an exception signals the endpoint is overloaded, rather than a transient network failure."""
+    if isinstance(e, (RequestsTimeout, Web3Timeout, TimeoutError)):
+        return True
+    if isinstance(e, HTTPError) and e.response is not None and e.response.status_code in OVERLOAD_STATUS_CODES:
+        return True
+    # aiohttp.ClientResponseError and similar errors carry the status of the response
+    if getattr(e, "status", None) in OVERLOAD_STATUS_CODES:
+        return True
+    if any(isinstance(arg, dict) and arg.get("code") in OVERLOAD_RPC_ERROR_CODES for arg in e.args):
+        return True
+    message = str(e).lower()
+    return any(overload_message in message for overload_message in OVERLOAD_MESSAGES)
+
+
+class AdaptiveBatchController:
+    """
+    Tunes the batch size and the number of concurrent batches of a BatchWorkExecutor.
+
+    The batch size follows the latency gradient towards the target latency per batch, and is halved on
+    overload errors such as 429 or payload too large. Concurrency is increased by one after a streak of
+    batches under the target and halved on overload errors (AIMD).
+    """
+
+    def __init__(self, starting_batch_size, max_batch_size, max_workers, target_latency):
+        self.target_latency = target_latency
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_concurrency = max_workers
+        self._batch_size = float(min(max(1, starting_batch_size), self.max_batch_size))
+        self.concurrency = max_workers
+        self.latency = None
+        self.batches = 0
+        self.overloads = 0
+        self._streak = 0
+        self._inflight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def batch_size(self):
+        return max(1, int(self._batch_size))
+
+    def acquire(self):
+        with self._condition:
+            while self._inflight >= self.concurrency:
+                self._condition.wait()
+            self._inflight += 1
+
+    def release(self):
+        with self._condition:
+            self._inflight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, batch_size, latency):
+        with self._condition:
+            self.batches += 1
+            self.latency = latency if self.latency is None else (self.latency + latency) / 2
+            if latency <= 0:
+                return
+
+            desired = batch_size * self.target_latency / latency
+            desired = min(desired, self._batch_size * MAX_GROWTH_FACTOR, self.max_batch_size)
+            self._batch_size = max(1.0, self._batch_size + GRADIENT_SMOOTHING * (desired - self._batch_size))
+
+            if latency <= self.target_latency:
+                self._streak += 1
+                if self._streak >= CONCURRENCY_INCREASE_STREAK and self.concurrency < self.max_concurrency:
+                    self.concurrency += 1
+                    self._streak = 0
+                    self._condition.notify_all()
+            else:
+                self._streak = 0
+
+    def on_error(self, e):
+        """Returns True if the error was taken as an overload signal."""
+        if not is_overload_error(e):
+            return False
+        with self._condition:
+            self.overloads += 1
+            self._streak = 0
+            self._batch_size = max(1.0, self._batch_size * DECREASE_FACTOR)
+            self.concurrency = max(1, int(self.concurrency * DECREASE_FACTOR))
+        return True
+
+    def metrics(self):
+        return {
+            "batch_size": self.batch_size,
+            "concurrency": self.concurrency,
+            "latency": self.latency,
+            "target_latency": self.target_latency,
+            "batches": self.batches,
+            "overloads": self.overloads,
+        }
@@ -8,6 +8,7 @@ from requests.exceptions import TooManyRedirects
 from web3._utils.threads import Timeout as Web3Timeout
 
 from common.utils.exception_control import RetriableError
+from indexer.executors.adaptive_batch_controller import AdaptiveBatchController
 from indexer.executors.bounded_executor import BoundedExecutor
 from indexer.utils.progress_logger import ProgressLogger
 
@@ -23,6 +24,16 @@ RETRY_EXCEPTIONS = (
 
 BATCH_CHANGE_COOLDOWN_PERIOD_SECONDS = 2 * 60
 
+# (target_latency, max_batch_size_factor) once adaptive batching is enabled for the process.
+_adaptive_batching = None
+
+
+def enable_adaptive_batching(target_latency, max_batch_size_factor=8):
+    """Makes every BatchWorkExecutor created afterwards tune its batch size and concurrency towards
+    target_latency seconds per batch, up to max_batch_size_factor times its starting batch size."""
+    global _adaptive_batching
+    _adaptive_batching = (target_latency, max_batch_size_factor) if target_latency else None
+
 
 # Executes the given work in batches, reducing the batch size exponentially in case of errors.
 class BatchWorkExecutor:
@@ -41,6 +52,13 @@ class BatchWorkExecutor:
         # Using bounded executor prevents unlimited queue growth
         # and allows monitoring in-progress futures and failing fast in case of errors.
         self.executor = BoundedExecutor(1, self.max_workers)
+        self._controller = None
+        if _adaptive_batching is not None:
+            target_latency, max_batch_size_factor = _adaptive_batching
+            self._controller = AdaptiveBatchController(
+                starting_batch_size, starting_batch_size * max_batch_size_factor, max_workers, target_latency
+            )
+            self.batch_size = self._controller.batch_size
         self._futures = []
         self.retry_exceptions = retry_exceptions
         self.max_retries = max_retries
@@ -62,17 +80,30 @@ class BatchWorkExecutor:
 
     def _fail_safe_execute(self, work_handler, batch, custom_splitting):
         try:
-            work_handler(batch)
-            if not custom_splitting:
-                self._try_increase_batch_size(len(batch))
+            if self._controller is None:
+                work_handler(batch)
+                if not custom_splitting:
+                    self._try_increase_batch_size(len(batch))
+            else:
+                self._adaptive_execute(work_handler, batch, custom_splitting)
         except self.retry_exceptions as e:
             self.logger.exception("An exception occurred while executing work_handler.")
             if not custom_splitting and len(batch) > 1:
-                self._try_decrease_batch_size(len(batch))
+                if self._controller is None:
+                    self._try_decrease_batch_size(len(batch))
+                    retry_batch_size = self.batch_size
+                else:
+                    if self._controller.on_error(e):
+                        self.batch_size = self._controller.batch_size
+                        self.logger.info("Overload detected, adaptive batching state {}.".format(self.metrics()))
+                    # Always split the failed batch, so a persistent error ends up on single items.
+                    retry_batch_size = min(self.batch_size, max(1, len(batch) // 2))
                 self.logger.info("The batch of size {} will be retried one item at a time.".format(len(batch)))
-                for sub_batch in dynamic_batch_iterator(batch, lambda: self.batch_size):
+                for sub_batch in dynamic_batch_iterator(batch, lambda: retry_batch_size):
                     self._fail_safe_execute(work_handler, sub_batch, custom_splitting)
             else:
+                if self._controller is not None:
+                    self._controller.on_error(e)
                 execute_with_retries(
                     work_handler,
                     batch,
@@ -82,6 +113,23 @@ class BatchWorkExecutor:
 
         self.progress_logger.track(len(batch))
 
+    def _adaptive_execute(self, work_handler, batch, custom_splitting):
+        self._controller.acquire()
+        try:
+            start_time = time.time()
+            work_handler(batch)
+            latency = time.time() - start_time
+        finally:
+            self._controller.release()
+        if not custom_splitting:
+            self._controller.on_success(len(batch), latency)
+            self.batch_size = self._controller.batch_size
+
+    def metrics(self):
+        if self._controller is None:
+            return {"batch_size": self.batch_size, "concurrency": self.max_workers}
+        return self._controller.metrics()
+
     # Some acceptable race conditions are possible
     def _try_decrease_batch_size(self, current_batch_size):
         batch_size = self.batch_size
@@ -109,6 +157,8 @@ class BatchWorkExecutor:
         self._check_completed_futures()
         assert len(self._futures) == 0
 
+        if self._controller is not None:
+            self.logger.info("Adaptive batching state {}.".format(self.metrics()))
         self.progress_logger.finish()
 
     def shutdown(self):
@@ -0,0 +1,96 @@
+import logging
+import time
+from collections import deque
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobDAGExecutor:
+    """JobDAGExecutor runs the nodes of a dependency graph on a shared thread pool,
+    starting each node as soon as all of its parents have finished.
+    :param parents: List of sets - parents[i] holds the indexes of the nodes node i waits for
+    :param max_workers: Integer - the maximum number of nodes running at the same time
+    """
+
+    def __init__(self, parents, max_workers, name="JobDAGExecutor"):
+        self.parents = parents
+        self.children = [[] for _ in parents]
+        for index, node_parents in enumerate(parents):
+            for parent in node_parents:
+                self.children[parent].append(index)
+        self.max_workers = max_workers
+        self._delegate = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.logger = logging.getLogger(name)
+
+    def execute(self, work_handler, on_finished=None):
+        """Calls work_handler(index) for every node and on_finished(index) on the calling thread once a node is done.
+        Returns {index: (start_time, end_time)}. After a failure no new node is started,
+        running nodes are awaited and the first exception is raised."""
+        waiting_parents = [len(node_parents) for node_parents in self.parents]
+        ready = deque(index for index, count in enumerate(waiting_parents) if count == 0)
+        running = {}
+        timings = {}
+        error = None
+
+        while ready or running:
+            while ready and error is None:
+                index = ready.popleft()
+                running[self._delegate.submit(self._timed_execute, work_handler, index)] = index
+
+            if not running:
+                break
+
+            done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                try:
+                    timings[index] = future.result()
+                except Exception as e:
+                    if error is None:
+                        error = e
+                    continue
+
+                if on_finished is not None:
+                    on_finished(index)
+                for child in self.children[index]:
+                    waiting_parents[child] -= 1
+                    if waiting_parents[child] == 0:
+                        ready.append(child)
+
+        if error is not None:
+            raise error
+
+        return timings
+
+    @staticmethod
+    def _timed_execute(work_handler, index):
+        start_time = time.time()
+        work_handler(index)
+        return start_time, time.time()
+
+    def critical_path(self, timings):
+        """Returns the chain of nodes with the longest summed duration and that duration in seconds."""
+        path_duration = {}
+        path_parent = {}
+        # Parents always finish before their children start, so start time is a topological order.
+        for index in sorted(timings, key=lambda x: timings[x][0]):
+            start_time, end_time = timings[index]
+            parents = [parent for parent in self.parents[index] if parent in path_duration]
+            parent = max(parents, key=lambda x: path_duration[x]) if parents else None
+            path_duration[index] = end_time - start_time + (path_duration[parent] if parent is not None else 0)
+            path_parent[index] = parent
+
+        if not path_duration:
+            return [], 0
+
+        index = max(path_duration, key=lambda x: path_duration[x])
+        duration = path_duration[index]
+        path = []
+        while index is not None:
+            path.append(index)
+            index = path_parent[index]
+        path.reverse()
+        return path, duration
+
+    def shutdown(self, wait=True):
+        self._delegate.shutdown(wait)
@@ -0,0 +1,83 @@
+import logging
+from collections import deque
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+
+
+class RangePipelineExecutor:
+    """RangePipelineExecutor runs the trailing stage of consecutive block ranges in the background,
+    so the caller can move on to the next range while the previous one is still being exported.
+
+    The trailing stage is executed by a single worker, which keeps the ranges committing in the same
+    order they were submitted. Calls to submit() block once "max_inflight_ranges" ranges are waiting
+    for or running their trailing stage.
+    :param max_inflight_ranges: Integer - the maximum number of ranges not committed yet
+    """
+
+    def __init__(self, max_inflight_ranges, name="RangePipelineExecutor"):
+        self.max_inflight_ranges = max_inflight_ranges
+        self._delegate = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._semaphore = BoundedSemaphore(max_inflight_ranges)
+        self._inflight = deque()
+        self._unreported_block = None
+        self.logger = logging.getLogger(name)
+
+    def submit(self, start_block, end_block, fn, *args, **kwargs):
+        self._semaphore.acquire()
+        try:
+            future = self._delegate.submit(fn, *args, **kwargs)
+        except Exception as e:
+            self._semaphore.release()
+            raise e
+        else:
+            future.add_done_callback(lambda x: self._semaphore.release())
+            self._inflight.append((start_block, end_block, future))
+            return future
+
+    def inflight_ranges(self):
+        return [(start_block, end_block) for start_block, end_block, _ in self._inflight]
+
+    def poll_committed(self):
+        """Returns the end block of the last range for which the range itself and every range
+        submitted before it have committed, or None if no new range has committed since the last call.
+        Raises the exception of the first failed range."""
+        while self._inflight and self._inflight[0][2].done():
+            start_block, end_block, future = self._inflight[0]
+            # Will throw an exception here if the range failed, keeping it at the head of the queue.
+            # Ranges committed before it are reported by the following recover() call.
+            future.result()
+            self._inflight.popleft()
+            self._unreported_block = end_block
+
+        committed_block, self._unreported_block = self._unreported_block, None
+        return committed_block
+
+    def wait(self):
+        futures.wait([future for _, _, future in self._inflight])
+        return self.poll_committed()
+
+    def recover(self):
+        """Drops every range which has not committed after a failure. Ranges not started yet are cancelled,
+        the running one is awaited. Returns the end block of the last committed range, as poll_committed does.
+        """
+        for _, _, future in self._inflight:
+            future.cancel()
+        futures.wait([future for _, _, future in self._inflight])
+
+        committed_block, self._unreported_block = self._unreported_block, None
+        while self._inflight:
+            start_block, end_block, future = self._inflight.popleft()
+            if future.cancelled() or future.exception() is not None:
+                self.logger.warning(f"Range [{start_block}, {end_block}] was not committed and will be re-synced.")
+                break
+            committed_block = end_block
+
+        for start_block, end_block, _ in self._inflight:
+            self.logger.warning(f"Range [{start_block}, {end_block}] was not committed and will be re-synced.")
+        self._inflight.clear()
+
+        return committed_block
+
+    def shutdown(self, wait=True):
+        self._delegate.shutdown(wait)
@@ -17,6 +17,9 @@ class BaseExporter(object):
     def export_item(self, item):
         pass
 
+    def export_range(self, start_block, end_block, items):
+        self.export_items(items)
+
     def batch_finish(self):
         pass
 
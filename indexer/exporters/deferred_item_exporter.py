@@ -0,0 +1,27 @@
+import threading
+
+from indexer.exporters.base_exporter import BaseExporter
+
+
+class DeferredItemExporter(BaseExporter):
+    """
+    Holds the items jobs export during a block range instead of writing them out,
+    so the scheduler can hand them to the real exporters once the whole range has been processed.
+    """
+
+    def __init__(self):
+        self._items = []
+        self._lock = threading.Lock()
+
+    def export_items(self, items):
+        with self._lock:
+            self._items.extend(items)
+
+    def export_item(self, item):
+        with self._lock:
+            self._items.append(item)
+
+    def take_items(self):
+        with self._lock:
+            items, self._items = self._items, []
+        return items
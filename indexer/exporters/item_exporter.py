@@ -16,7 +16,13 @@ def create_item_exporter(output, config):
     if item_exporter_type == ItemExporterType.CONSOLE:
         item_exporter = ConsoleItemExporter()
     elif item_exporter_type == ItemExporterType.POSTGRES:
-        item_exporter = PostgresItemExporter(config["db_service"])
+        item_exporter = PostgresItemExporter(
+            config["db_service"],
+            copy_min_items=config.get("pg_copy_min_items", 0),
+            synchronous_commit=config.get("pg_synchronous_commit", True),
+            sync_recorder=config.get("export_sync_recorder"),
+            export_workers=config.get("pg_export_workers", 1),
+        )
     elif item_exporter_type == ItemExporterType.JSONFILE:
         item_exporter = JSONFileItemExporter(output, config)
     elif item_exporter_type == ItemExporterType.CSVFILE:
@@ -0,0 +1,236 @@
+import io
+import json
+import struct
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Type
+
+from psycopg2.extras import Json
+
+from common.models import HemeraModel
+
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+NULL_FIELD = struct.pack(">i", -1)
+
+POSTGRES_EPOCH = datetime(2000, 1, 1)
+POSTGRES_EPOCH_UTC = datetime(2000, 1, 1, tzinfo=timezone.utc)
+POSTGRES_EPOCH_DATE = date(2000, 1, 1)
+
+NUMERIC_POSITIVE = 0x0000
+NUMERIC_NEGATIVE = 0x4000
+NUMERIC_NAN = 0xC000
+
+# Element type oids of the array types used by the models, checked by the server when receiving arrays
+ARRAY_ELEMENT_OIDS = {
+    "BOOLEAN": 16,
+    "BYTEA": 17,
+    "BIGINT": 20,
+    "SMALLINT": 21,
+    "INTEGER": 23,
+    "TEXT": 25,
+    "VARCHAR": 1043,
+    "TIMESTAMP": 1114,
+    "NUMERIC": 1700,
+}
+
+
+class UnsupportedCopyValue(TypeError):
+    pass
+
+
+def encode_bytea(value):
+    if not isinstance(value, (bytes, bytearray, memoryview)):
+        raise UnsupportedCopyValue(f"Expected bytes, got {type(value).__name__}")
+    return bytes(value)
+
+
+def encode_text(value):
+    return str(value).encode("utf-8")
+
+
+def encode_boolean(value):
+    return b"\x01" if value else b"\x00"
+
+
+def integer_encoder(fmt):
+    packer = struct.Struct(fmt)
+
+    def encode_integer(value):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise UnsupportedCopyValue(f"Expected int, got {type(value).__name__}")
+        return packer.pack(value)
+
+    return encode_integer
+
+
+def float_encoder(fmt):
+    packer = struct.Struct(fmt)
+
+    def encode_float(value):
+        return packer.pack(float(value))
+
+    return encode_float
+
+
+def timestamp_encoder(with_timezone):
+    def encode_timestamp(value):
+        if not isinstance(value, datetime):
+            raise UnsupportedCopyValue(f"Expected datetime, got {type(value).__name__}")
+        if value.tzinfo is not None:
+            delta = value - POSTGRES_EPOCH_UTC
+        elif with_timezone:
+            delta = value.replace(tzinfo=timezone.utc) - POSTGRES_EPOCH_UTC
+        else:
+            delta = value - POSTGRES_EPOCH
+        return struct.pack(">q", (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+    return encode_timestamp
+
+
+def encode_date(value):
+    if isinstance(value, datetime):
+        value = value.date()
+    if not isinstance(value, date):
+        raise UnsupportedCopyValue(f"Expected date, got {type(value).__name__}")
+    return struct.pack(">i", (value - POSTGRES_EPOCH_DATE).days)
+
+
+def encode_numeric(value):
+    if isinstance(value, bool) or not isinstance(value, (int, Decimal, float)):
+        raise UnsupportedCopyValue(f"Expected number, got {type(value).__name__}")
+    value = Decimal(repr(value)) if isinstance(value, float) else Decimal(value)
+    if value.is_nan():
+        return struct.pack(">hhHH", 0, 0, NUMERIC_NAN, 0)
+    if value.is_infinite():
+        raise UnsupportedCopyValue("Infinite numeric values are not supported")
+
+    sign, digits, exponent = value.as_tuple()
+    digits = "".join(map(str, digits))
+    if exponent > 0:
+        digits += "0" * exponent
+        exponent = 0
+    scale = -exponent
+
+    integer_digits = digits[: len(digits) - scale].lstrip("0")
+    fraction_digits = digits[len(digits) - scale :].rjust(scale, "0") if scale else ""
+
+    integer_digits = integer_digits.rjust((len(integer_digits) + 3) // 4 * 4, "0")
+    fraction_digits = fraction_digits.ljust((len(fraction_digits) + 3) // 4 * 4, "0")
+    groups = [int(integer_digits[i : i + 4]) for i in range(0, len(integer_digits), 4)]
+    weight = len(groups) - 1
+    groups += [int(fraction_digits[i : i + 4]) for i in range(0, len(fraction_digits), 4)]
+
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+        sign = 0
+
+    return struct.pack(
+        f">hhHH{len(groups)}H",
+        len(groups),
+        weight,
+        NUMERIC_NEGATIVE if sign else NUMERIC_POSITIVE,
+        scale,
+        *groups,
+    )
+
+
+def json_encoder(binary):
+    def encode_json(value):
+        text = json.dumps(value.adapted if isinstance(value, Json) else value).encode("utf-8")
+        return b"\x01" + text if binary else text
+
+    return encode_json
+
+
+def array_encoder(item_type):
+    element_name = item_type.__visit_name__.upper()
+    element_oid = ARRAY_ELEMENT_OIDS.get(element_name)
+    if element_oid is None:
+        raise UnsupportedCopyValue(f"Arrays of {element_name} are not supported")
+    encode_element = column_encoder(item_type)
+
+    def encode_array(value):
+        if not isinstance(value, (list, tuple)):
+            raise UnsupportedCopyValue(f"Expected list, got {type(value).__name__}")
+        if not value:
+            return struct.pack(">iiI", 0, 0, element_oid)
+        parts = [struct.pack(">iiIii", 1, int(any(v is None for v in value)), element_oid, len(value), 1)]
+        for element in value:
+            if element is None:
+                parts.append(NULL_FIELD)
+            else:
+                data = encode_element(element)
+                parts.append(struct.pack(">i", len(data)))
+                parts.append(data)
+        return b"".join(parts)
+
+    return encode_array
+
+
+def column_encoder(column_type):
+    """Returns the function encoding a value of the given column type in the binary COPY format."""
+    name = column_type.__visit_name__.upper()
+    if name in ("BYTEA", "LARGE_BINARY", "LARGEBINARY"):
+        return encode_bytea
+    if name in ("VARCHAR", "TEXT", "STRING", "CHAR", "UNICODE"):
+        return encode_text
+    if name == "BOOLEAN":
+        return encode_boolean
+    if name in ("SMALLINT", "SMALL_INTEGER"):
+        return integer_encoder(">h")
+    if name == "INTEGER":
+        return integer_encoder(">i")
+    if name in ("BIGINT", "BIG_INTEGER"):
+        return integer_encoder(">q")
+    if name == "REAL":
+        return float_encoder(">f")
+    if name in ("FLOAT", "DOUBLE_PRECISION", "DOUBLE"):
+        return float_encoder(">d")
+    if name == "NUMERIC":
+        return encode_numeric
+    if name in ("TIMESTAMP", "DATETIME"):
+        return timestamp_encoder(getattr(column_type, "timezone", False))
+    if name == "DATE":
+        return encode_date
+    if name == "JSONB":
+        return json_encoder(True)
+    if name == "JSON":
+        return json_encoder(False)
+    if name == "ARRAY":
+        return array_encoder(column_type.item_type)
+    raise UnsupportedCopyValue(f"Column type {name} is not supported")
+
+
+class BinaryCopyEncoder:
+    """Encodes rows of one table, as produced by its converter, into a COPY ... (FORMAT binary) stream."""
+
+    def __init__(self, model: Type[HemeraModel], columns):
+        self.columns = columns
+        self._encoders = [column_encoder(model.__table__.c[column].type) for column in columns]
+
+    def encode(self, rows):
+        buffer = io.BytesIO()
+        buffer.write(COPY_HEADER)
+        field_count = struct.pack(">h", len(self.columns))
+        pack_length = struct.Struct(">i").pack
+        for row in rows:
+            buffer.write(field_count)
+            for encode, value in zip(self._encoders, row):
+                if value is None:
+                    buffer.write(NULL_FIELD)
+                    continue
+                try:
+                    data = encode(value)
+                except (struct.error, TypeError, ValueError, OverflowError) as e:
+                    raise UnsupportedCopyValue(f"Can not encode {value!r}: {e}")
+                buffer.write(pack_length(len(data)))
+                buffer.write(data)
+        buffer.write(COPY_TRAILER)
+        buffer.seek(0)
+        return buffer
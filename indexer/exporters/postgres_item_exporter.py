@@ -1,4 +1,6 @@
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Type
 
@@ -7,55 +9,104 @@ from dateutil.tz import tzlocal
 from psycopg2.extras import execute_values
 
 from common.converter.pg_converter import domain_model_mapping
-from common.models import HemeraModel
+from common.models import HemeraModel, convert_rows, general_converter
+from common.utils.exception_control import RetriableError
 from indexer.exporters.base_exporter import BaseExporter, group_by_item_type
+from indexer.exporters.postgres_binary_copy import BinaryCopyEncoder, UnsupportedCopyValue
+from indexer.utils.partition_manager import conflict_columns, load_partitioned_tables
 
 logger = logging.getLogger(__name__)
 
 COMMIT_BATCH_SIZE = 500
+DEFAULT_SHARD_ITEMS = 50000
 
 
 class PostgresItemExporter(BaseExporter):
-    def __init__(self, service):
+    """
+    Upserts items into their tables. Item groups of at least "copy_min_items" items are loaded with
+    a binary COPY into a staging table and merged with a single INSERT ... SELECT, other groups and
+    groups the binary encoder can not handle use execute_values. 0 disables the COPY path.
+
+    export_items commits every table on its own. With "export_workers" above 1, tables are written in
+    parallel, each on its own connection. Item types sharing a table are written one after another in a single
+    transaction, the group of a table with a single item type is split by block range into shards written in
+    parallel when it has more than "shard_items" items carrying a block number.
+
+    export_range writes every table of a block range in a single transaction, together with the sync record
+    of "sync_recorder" when one is given, so a range is either entirely exported and recorded or not at all.
+    With "synchronous_commit" False these transactions do not wait for the WAL flush, a crash may lose the
+    last ranges but never part of one.
+    """
+
+    def __init__(
+        self,
+        service,
+        copy_min_items=0,
+        synchronous_commit=True,
+        sync_recorder=None,
+        export_workers=1,
+        shard_items=DEFAULT_SHARD_ITEMS,
+    ):
 
         self.service = service
+        self.copy_min_items = copy_min_items
+        self.synchronous_commit = synchronous_commit
+        self.sync_recorder = sync_recorder
+        self.export_workers = export_workers
+        self.shard_items = shard_items
+        self._recorded_block = None
+        self._partitions_loaded = False
+        self._executor = None
+        if export_workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=export_workers, thread_name_prefix="PostgresExport")
+
+    def open(self):
+        if not self._partitions_loaded:
+            # Conflict targets of partitioned tables include their partition column
+            load_partitioned_tables(self.service)
+            self._partitions_loaded = True
 
     def export_items(self, items):
+        if self._executor is not None:
+            self._export_shards(items)
+        else:
+            self._export_items(items)
+
+    def export_range(self, start_block, end_block, items):
+        self._export_items(items, start_block=start_block, end_block=end_block)
+
+    def _export_items(self, items, start_block=None, end_block=None):
         start_time = datetime.now(tzlocal())
+        atomic = end_block is not None
 
         conn = self.service.get_conn()
         try:
-            insert_stmt = ""
             items_grouped_by_type = group_by_item_type(items)
             tables = []
+            if atomic and not self.synchronous_commit:
+                conn.cursor().execute("SET LOCAL synchronous_commit TO OFF")
             for item_type in items_grouped_by_type.keys():
                 item_group = items_grouped_by_type.get(item_type)
 
                 if item_group:
-                    pg_config = domain_model_mapping[item_type.__name__]
-
-                    table = pg_config["table"]
-                    do_update = pg_config["conflict_do_update"]
-                    update_strategy = pg_config["update_strategy"]
-                    converter = pg_config["converter"]
-
-                    cur = conn.cursor()
-                    data = [converter(table, item, do_update) for item in item_group]
-
-                    columns = list(data[0].keys())
-                    values = [tuple(d.values()) for d in data]
-
-                    insert_stmt = sql_insert_statement(table, do_update, columns, where_clause=update_strategy)
+                    tables.append(self._export_group(conn, item_type, item_group))
+                    if not atomic:
+                        conn.commit()
 
-                    execute_values(cur, insert_stmt, values, page_size=COMMIT_BATCH_SIZE)
-                    conn.commit()
-                    tables.append(table.__tablename__)
+            if atomic:
+                if self.sync_recorder is not None:
+                    self._record_range(conn, start_block, end_block)
+                conn.commit()
+                if self.sync_recorder is not None:
+                    self._recorded_block = end_block
+                    self.sync_recorder.mark_written(end_block)
 
         except Exception as e:
             # print(e)
             logger.error(f"Error exporting items:{e}")
-            logger.error(f"{insert_stmt}")
             # print(item_type, insert_stmt, [i[-1] for i in data])
+            if atomic:
+                conn.rollback()
             raise Exception("Error exporting items")
         finally:
             self.service.release_conn(conn)
@@ -66,11 +117,170 @@ class PostgresItemExporter(BaseExporter):
             )
         )
 
+    def _export_shards(self, items):
+        start_time = datetime.now(tzlocal())
+        groups_by_table = {}
+        for item_type, item_group in group_by_item_type(items).items():
+            table_name = domain_model_mapping[item_type.__name__]["table"].__tablename__
+            groups_by_table.setdefault(table_name, []).append((item_type, item_group))
+
+        shards = []
+        for groups in groups_by_table.values():
+            if len(groups) == 1:
+                item_type, item_group = groups[0]
+                shards.extend([(item_type, shard)] for shard in self._split_group(item_group))
+            else:
+                # Item types sharing a table are written in their original order on a single connection,
+                # so updates of one type are never overtaken by inserts of another
+                shards.append(groups)
+
+        futures = [self._executor.submit(self._export_shard, groups) for groups in shards]
+        errors = [future.exception() for future in futures if future.exception() is not None]
+        if errors:
+            raise Exception("Error exporting items")
+
+        end_time = datetime.now(tzlocal())
+        logger.info(
+            "Exporting items to table {} end, Item count: {}, Shards: {}, Took {}".format(
+                ", ".join(sorted(set(future.result() for future in futures))),
+                len(items),
+                len(shards),
+                (end_time - start_time),
+            )
+        )
+
+    def _split_group(self, item_group):
+        shard_count = min(self.export_workers, -(-len(item_group) // self.shard_items))
+        if shard_count <= 1 or not hasattr(item_group[0], "block_number"):
+            return [item_group]
+
+        # Shards cover disjoint block ranges, so parallel upserts never touch the same rows
+        item_group = sorted(item_group, key=lambda item: item.block_number)
+        shard_size = -(-len(item_group) // shard_count)
+        shards = []
+        start = 0
+        while start < len(item_group):
+            end = min(start + shard_size, len(item_group))
+            while end < len(item_group) and item_group[end].block_number == item_group[end - 1].block_number:
+                end += 1
+            shards.append(item_group[start:end])
+            start = end
+        return shards
+
+    def _export_shard(self, groups):
+        start_time = time.time()
+        item_count = sum(len(item_group) for _, item_group in groups)
+        conn = self.service.get_conn()
+        try:
+            for item_type, item_group in groups:
+                table_name = self._export_group(conn, item_type, item_group)
+            conn.commit()
+        except Exception as e:
+            type_names = ", ".join(item_type.__name__ for item_type, _ in groups)
+            logger.error(f"Error exporting {item_count} {type_names} items:{e}")
+            conn.rollback()
+            raise e
+        finally:
+            self.service.release_conn(conn)
+
+        duration = time.time() - start_time
+        logger.info(
+            "Exported {} items to table {} in {:.3f}s, {:.0f} items/s".format(
+                item_count, table_name, duration, item_count / duration if duration > 0 else 0
+            )
+        )
+        return table_name
+
+    def _export_group(self, conn, item_type, item_group):
+        pg_config = domain_model_mapping[item_type.__name__]
+
+        table = pg_config["table"]
+        do_update = pg_config["conflict_do_update"]
+        update_strategy = pg_config["update_strategy"]
+        converter = pg_config["converter"]
+
+        cur = conn.cursor()
+        converted = None
+        if converter is general_converter:
+            # Column types are resolved once per group instead of once per value
+            converted = convert_rows(table, item_group, do_update)
+        if converted is not None:
+            columns, values = converted
+        else:
+            data = [converter(table, item, do_update) for item in item_group]
+            columns = list(data[0].keys())
+            values = [tuple(d.values()) for d in data]
+
+        copy_buffer = None
+        if self.copy_min_items and len(values) >= self.copy_min_items:
+            try:
+                copy_buffer = BinaryCopyEncoder(table, columns).encode(values)
+            except UnsupportedCopyValue as e:
+                logger.warning(f"Binary COPY is not possible for {table.__tablename__}, using INSERT: {e}")
+
+        insert_stmt = ""
+        try:
+            if copy_buffer is not None:
+                staging_table = f"staging_{table.__tablename__}"
+                cur.execute(sql_create_staging_statement(table, staging_table))
+                # Rows staged by an earlier group of the same transaction must not be merged again
+                cur.execute("TRUNCATE {}".format(staging_table))
+                cur.copy_expert(
+                    "COPY {} ({}) FROM STDIN (FORMAT binary)".format(staging_table, ", ".join(columns)),
+                    copy_buffer,
+                )
+                insert_stmt = sql_merge_statement(
+                    table, do_update, columns, staging_table, where_clause=update_strategy
+                )
+                cur.execute(insert_stmt)
+            else:
+                insert_stmt = sql_insert_statement(table, do_update, columns, where_clause=update_strategy)
+                execute_values(cur, insert_stmt, values, page_size=COMMIT_BATCH_SIZE)
+        except Exception as e:
+            logger.error(f"{insert_stmt}")
+            raise e
+        return table.__tablename__
+
+    def _record_range(self, conn, start_block, end_block):
+        # A range following a failed one must not move the record past the missing blocks
+        if self._recorded_block is not None and start_block != self._recorded_block + 1:
+            raise RetriableError(
+                f"Range [{start_block}, {end_block}] does not follow the last recorded block {self._recorded_block}."
+            )
+        conn.cursor().executemany(
+            self.sync_recorder.sql_upsert_statement(), self.sync_recorder.checkpoint_rows(end_block)
+        )
+
+
+def deduplicate_by_conflict_key(items):
+    """
+    Keeps a single item per conflict key of the item types upserted with DO UPDATE, the one of the highest block,
+    as a statement can not update a row twice. Items of several ranges exported together repeat the keys of
+    "current" tables. The order of the kept items is preserved.
+    """
+    latest = {}
+    for item_type, item_group in group_by_item_type(items).items():
+        pg_config = domain_model_mapping.get(item_type.__name__)
+        if pg_config is None or not pg_config["conflict_do_update"]:
+            continue
+        key_columns = conflict_columns(pg_config["table"])
+        if not all(hasattr(item_group[0], column) for column in key_columns):
+            continue
+        for item in item_group:
+            key = (item_type,) + tuple(getattr(item, column) for column in key_columns)
+            kept = latest.get(key)
+            if kept is None or getattr(item, "block_number", 0) >= getattr(kept, "block_number", 0):
+                latest[key] = item
+
+    if len(latest) == 0:
+        return items
+    kept_ids = set(id(item) for item in latest.values())
+    upserted_types = set(key[0] for key in latest)
+    return [item for item in items if item.__class__ not in upserted_types or id(item) in kept_ids]
+
 
 def sql_insert_statement(model: Type[HemeraModel], do_update: bool, columns, where_clause=None):
-    pk_list = []
-    for pk in model.__table__.primary_key.columns:
-        pk_list.append(pk.name)
+    pk_list = conflict_columns(model)
 
     update_list = list(set(columns) - set(pk_list))
 
@@ -91,3 +301,46 @@ def sql_insert_statement(model: Type[HemeraModel], do_update: bool, columns, whe
             ", ".join(columns),
         )
     return insert_stmt
+
+
+def sql_create_staging_statement(model: Type[HemeraModel], staging_table):
+    # Rows of a temporary staging table are emptied on commit, the table itself is kept for the connection
+    return "CREATE TEMPORARY TABLE IF NOT EXISTS {} (LIKE {}.{} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS".format(
+        staging_table,
+        model.schema(),
+        model.__tablename__,
+    )
+
+
+def sql_merge_statement(model: Type[HemeraModel], do_update: bool, columns, staging_table, where_clause=None):
+    pk_list = conflict_columns(model)
+
+    update_list = list(set(columns) - set(pk_list))
+
+    if do_update:
+        # A row can only be updated once per statement, the last staged row of each key wins
+        insert_stmt = (
+            "INSERT INTO {}.{} ({}) SELECT DISTINCT ON ({}) {} FROM {} ORDER BY {}, ctid DESC "
+            "ON CONFLICT ({}) DO UPDATE SET {}"
+        ).format(
+            model.schema(),
+            model.__tablename__,
+            ", ".join(columns),
+            ", ".join(pk_list),
+            ", ".join(columns),
+            staging_table,
+            ", ".join(pk_list),
+            ", ".join(pk_list),
+            ", ".join(["{} = EXCLUDED.{}".format(column, column) for column in update_list]),
+        )
+        if where_clause:
+            insert_stmt += " WHERE {}".format(where_clause)
+    else:
+        insert_stmt = "INSERT INTO {}.{} ({}) SELECT {} FROM {} ON CONFLICT DO NOTHING ".format(
+            model.schema(),
+            model.__tablename__,
+            ", ".join(columns),
+            ", ".join(columns),
+            staging_table,
+        )
+    return insert_stmt
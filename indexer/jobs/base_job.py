@@ -1,5 +1,4 @@
 import logging
-import threading
 from collections import defaultdict
 from datetime import datetime
 
@@ -10,6 +9,7 @@ from common.utils.exception_control import FastShutdownError
 from common.utils.format_utils import to_snake_case
 from indexer.domain import Domain
 from indexer.domain.transaction import Transaction
+from indexer.jobs.run_context import RunContext
 from indexer.utils.reorg import should_reorg
 
 
@@ -40,13 +40,12 @@ class BaseJobMeta(type):
 
 
 class BaseJob(metaclass=BaseJobMeta):
-    _data_buff = defaultdict(list)
-    locks = defaultdict(threading.Lock)
-
     tokens = None
 
     is_filter = False
     dependency_types = []
+    # Types read from the run context when another job produces them, without requiring that job to run.
+    optional_dependency_types = []
     output_types = []
     able_to_reorg = False
 
@@ -74,14 +73,22 @@ class BaseJob(metaclass=BaseJobMeta):
 
         self._chain_id = kwargs.get("chain_id") or (self._web3.eth.chain_id if self._batch_web3_provider else None)
 
+        self._run_context = RunContext()
         self._should_reorg = False
         self._should_reorg_type = set()
         self._service = kwargs["config"].get("db_service", None)
+        self._call_planner = kwargs.get("call_planner")
 
         job_name_snake = to_snake_case(self.job_name)
         self.user_defined_config = kwargs["config"][job_name_snake] if kwargs["config"].get(job_name_snake) else {}
 
+    @property
+    def _data_buff(self) -> RunContext:
+        return self._run_context
+
     def run(self, **kwargs):
+        if kwargs.get("run_context") is not None:
+            self._run_context = kwargs.pop("run_context")
         try:
             if self.able_to_reorg and self._reorg:
                 start_time = datetime.now()
@@ -93,11 +100,13 @@ class BaseJob(metaclass=BaseJobMeta):
                 start_time = datetime.now()
                 self.logger.info(f"Stage collect starting.")
                 self._collect(**kwargs)
+                self._run_context.merge()
                 self.logger.info(f"Stage collect finished. Took {datetime.now() - start_time}")
 
                 start_time = datetime.now()
                 self.logger.info(f"Stage process starting.")
                 self._process(**kwargs)
+                self._run_context.merge()
                 self.logger.info(f"Stage process finished. Took {datetime.now() - start_time}")
 
             if not self._reorg:
@@ -115,6 +124,7 @@ class BaseJob(metaclass=BaseJobMeta):
             raise FastShutdownError("PG Service is not set")
 
         reorg_block = int(kwargs["start_block"])
+        end_block = int(kwargs["end_block"])
 
         output_table = {}
         for domain in self.output_types:
@@ -122,7 +132,7 @@ class BaseJob(metaclass=BaseJobMeta):
             # output_table.add(domain_model_mapping[domain.__name__]["table"])
 
         for table in output_table.keys():
-            if should_reorg(reorg_block, table, self._service):
+            if should_reorg(reorg_block, table, self._service, end_block=end_block):
                 self._should_reorg_type.add(output_table[table])
                 self._should_reorg = True
 
@@ -132,6 +142,14 @@ class BaseJob(metaclass=BaseJobMeta):
                 if output.type() not in self._should_reorg_type and output.type() in self._data_buff.keys():
                     self._data_buff.pop(output.type())
 
+    def handle_reorg(self, start_block, end_block):
+        """
+        Called when blocks [start_block, end_block] are found on a fork while a later range is running.
+        Jobs keeping state across ranges drop what was derived from these blocks, and return True when the
+        outputs of the running range were derived from them too, so the running range is repaired with them.
+        """
+        return False
+
     def _collect(self, **kwargs):
         pass
 
@@ -139,16 +157,13 @@ class BaseJob(metaclass=BaseJobMeta):
         pass
 
     def _collect_item(self, key, data):
-        with self.locks[key]:
-            self._data_buff[key].append(data)
+        self._run_context.collect(key, data)
 
     def _collect_items(self, key, data_list):
-        with self.locks[key]:
-            self._data_buff[key].extend(data_list)
+        self._run_context.collect_many(key, data_list)
 
     def _collect_domain(self, domain):
-        with self.locks[domain.type()]:
-            self._data_buff[domain.type()].append(domain)
+        self._run_context.collect(domain.type(), domain)
 
     def _collect_domains(self, domains):
         for domain in domains:
@@ -169,8 +184,7 @@ class BaseJob(metaclass=BaseJobMeta):
     def _extract_from_buff(self, keys=None):
         items = []
         for key in keys:
-            with self.locks[key]:
-                items.extend(self._data_buff[key])
+            items.extend(self._data_buff[key])
 
         return items
 
@@ -1,30 +1,36 @@
 import logging
-import subprocess
 from typing import Union
 
+import orjson
 from sqlalchemy import and_
 
 from common.models.blocks import Blocks
+from common.utils.exception_control import RetriableError
 from common.utils.format_utils import as_dict
 from indexer.domain import dict_to_dataclass
 from indexer.domain.block import Block
 from indexer.jobs.base_job import BaseJob
+from indexer.utils.block_hash_ring import DEFAULT_RING_SIZE, BlockHashRing
+from indexer.utils.json_rpc_requests import generate_get_block_by_number_json_rpc
+from indexer.utils.utils import rpc_response_batch_to_results
 
 logger = logging.getLogger(__name__)
 
 
 class CheckBlockConsensusJob(BaseJob):
+    dependency_types = [Block]
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._config = kwargs["config"]
-        self._batch_web3_debug_provider = kwargs["batch_web3_debug_provider"]
-        self._batch_size = kwargs["batch_size"]
-        self._multicall = kwargs["multicall"]
-        self._debug_batch_size = kwargs["debug_batch_size"]
         self.db_service = self._config.get("db_service") if "db_service" in self._config else None
-        self._postgre_uri = self.db_service.get_service_uri() if self.db_service else None
+        # Called with the block range left on a fork, the scheduler repairs it once the current range is done
+        self._reorg_handler = kwargs.get("reorg_handler")
 
-        self.last_batch_end_block = None
+        self._hash_ring = BlockHashRing(
+            capacity=self.user_defined_config.get("ring_size", DEFAULT_RING_SIZE),
+            file_name=self.user_defined_config.get("ring_file"),
+        )
         self.check_switch = self._config.get("db_service", None) is not None
 
     def _process(self, **kwargs):
@@ -32,51 +38,55 @@ class CheckBlockConsensusJob(BaseJob):
             return
 
         batch_blocks = self._data_buff[Block.type()]
+        if not batch_blocks:
+            return
 
-        if self.last_batch_end_block:
-            batch_blocks = [self.last_batch_end_block] + batch_blocks
-        else:
-            last_block = self._query_last_block(batch_blocks[0])
+        first_block = min(batch_blocks, key=lambda x: x.number)
+        if len(self._hash_ring) == 0:
+            # Cold start without a saved ring, the previous block is read once
+            last_block = self._query_last_block(first_block)
             if last_block:
-                batch_blocks = [last_block] + batch_blocks
-
-        batch_blocks.reverse()
-        parent_hash = batch_blocks[0].parent_hash
-        for block in batch_blocks[1:]:
-            block_hash = block.hash
-            if block_hash != parent_hash:
-                # non-consensus detected
-                ranges = max(len(batch_blocks), 5)
-                command = [
-                    "python",
-                    "hemera.py",
-                    "reorg",
-                    "-p",
-                    self._batch_web3_provider.endpoint_uri,
-                    "-d",
-                    self._batch_web3_debug_provider.endpoint_uri,
-                    "-b",
-                    f"{self._batch_size}",
-                    "--debug-batch-size",
-                    f"{self._debug_batch_size}",
-                    "-m",
-                    f"{self._multicall}",
-                    "-pg",
-                    self._postgre_uri,
-                    "--block-number",
-                    f"{block.number}",
-                    "--ranges",
-                    f"{ranges}",
-                    "--log-file",
-                    f"./logs/auto_reorg_{block.number}_{ranges}.log",
-                ]
-                subprocess.Popen(command, start_new_session=True)
-                self.logger.info(f"Reorg process started with command: {command}")
-                break
-
-            parent_hash = block.parent_hash
-
-        self.last_batch_end_block = batch_blocks[0]
+                self._hash_ring.extend([(last_block.number, last_block.hash, last_block.parent_hash)])
+
+        mismatch_block = self._hash_ring.first_mismatch(batch_blocks)
+        if mismatch_block is not None and mismatch_block is not first_block:
+            # Blocks of the batch do not chain together, the chain moved while they were fetched
+            raise RetriableError(
+                f"Block {mismatch_block.number} does not chain to its parent in the same batch, "
+                f"the chain may have been reorged while fetching."
+            )
+
+        if mismatch_block is not None:
+            self._handle_fork(first_block)
+
+        self._hash_ring.extend([(block.number, block.hash, block.parent_hash) for block in batch_blocks])
+
+    def _handle_fork(self, first_block):
+        numbers = [number for number in self._hash_ring.numbers() if number < first_block.number]
+        chain_hashes = self._get_chain_hashes(numbers)
+        ancestor = self._hash_ring.common_ancestor(chain_hashes)
+        if ancestor is None:
+            ancestor = min(numbers) - 1
+            logger.warning(
+                f"No common ancestor found in the last {len(numbers)} blocks, "
+                f"blocks from {ancestor + 1} are reorged, deeper blocks should be checked with the reorg command."
+            )
+
+        start_block, end_block = ancestor + 1, first_block.number - 1
+        logger.info(f"Fork detected at block {first_block.number}, blocks [{start_block}, {end_block}] are reorged.")
+
+        # The repair is recorded before the ring forgets the orphaned blocks, so it survives a restart
+        if self._reorg_handler is not None:
+            self._reorg_handler(start_block, end_block)
+        else:
+            logger.warning(f"No reorg handler, blocks [{start_block}, {end_block}] have to be reorged manually.")
+        # Blocks above the ancestor are left out of the ring until the repaired range is synced again
+        self._hash_ring.rewind(ancestor)
+
+    def _get_chain_hashes(self, numbers):
+        block_number_rpc = list(generate_get_block_by_number_json_rpc(numbers, False))
+        response = self._batch_web3_provider.make_request(params=orjson.dumps(block_number_rpc))
+        return {int(block["number"], 16): block["hash"] for block in rpc_response_batch_to_results(response)}
 
     def _query_last_block(self, block: Block) -> Union[Block, None]:
         if block is None:
@@ -42,13 +42,13 @@ class ExportBlocksJob(BaseExportJob):
         self._is_filter = kwargs.get("is_filter", False)
         self._specification = AlwaysFalseSpecification() if self._is_filter else AlwaysTrueSpecification()
         self._reorg_jobs = kwargs.get("reorg_jobs", [])
+        self._block_prefetcher = kwargs.get("block_prefetcher")
 
     def _start(self, **kwargs):
         if self._service is None:
             raise FastShutdownError("PG Service is not set")
 
-        reorg_block = int(kwargs["start_block"])
-        set_reorg_sign(self._reorg_jobs, reorg_block, self._service)
+        set_reorg_sign(self._reorg_jobs, int(kwargs["start_block"]), int(kwargs["end_block"]), self._service)
         self._should_reorg_type.add(Block.type())
         self._should_reorg = True
 
@@ -90,7 +90,16 @@ class ExportBlocksJob(BaseExportJob):
         self._batch_work_executor.wait()
 
     def _collect_batch(self, block_number_batch):
-        results = blocks_rpc_requests(self._batch_web3_provider.make_request, block_number_batch, self._is_batch)
+        if self._block_prefetcher is None:
+            results = blocks_rpc_requests(self._batch_web3_provider.make_request, block_number_batch, self._is_batch)
+        else:
+            cached_blocks = self._block_prefetcher.take_blocks(block_number_batch)
+            missing_blocks = [block_number for block_number in block_number_batch if block_number not in cached_blocks]
+            results = list(cached_blocks.values())
+            if missing_blocks:
+                results.extend(
+                    blocks_rpc_requests(self._batch_web3_provider.make_request, missing_blocks, self._is_batch)
+                )
         for block_rpc_dict in results:
             block_entity = Block.from_rpc(block_rpc_dict)
             self._collect_item(Block.type(), block_entity)
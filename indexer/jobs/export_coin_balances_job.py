@@ -1,7 +1,7 @@
 import json
 import logging
 from dataclasses import dataclass
-from typing import List
+from typing import List, Optional
 
 from eth_utils import to_int
 
@@ -15,7 +15,7 @@ from indexer.executors.batch_work_executor import BatchWorkExecutor
 from indexer.jobs.base_job import BaseExportJob
 from indexer.utils.exception_recorder import ExceptionRecorder
 from indexer.utils.json_rpc_requests import generate_get_balance_json_rpc
-from indexer.utils.utils import rpc_response_to_result, zip_rpc_response
+from indexer.utils.utils import rpc_response_to_result, snapshot_collections_by_group, zip_rpc_response
 
 logger = logging.getLogger(__name__)
 exception_recorder = ExceptionRecorder()
@@ -31,6 +31,7 @@ class AddressRecord:
 # Exports coin balances
 class ExportCoinBalancesJob(BaseExportJob):
     dependency_types = [Block, ContractInternalTransaction]
+    optional_dependency_types = [Transaction]
     output_types = [CoinBalance]
     able_to_reorg = True
 
@@ -43,12 +44,16 @@ class ExportCoinBalancesJob(BaseExportJob):
             job_name=self.__class__.__name__,
         )
         self._is_batch = kwargs["batch_size"] > 1
+        # None fetches the balance at every block an address appears in, otherwise only at the last one
+        # in each window of that many blocks, 0 fetching the balance at the end of the range only.
+        self._snapshot_blocks = self.user_defined_config.get("balance_snapshot_blocks")
 
     def _collect(self, **kwargs):
         coin_addresses = distinct_addresses(
             self._data_buff[Block.type()],
             self._data_buff[Transaction.type()],
             self._data_buff[ContractInternalTransaction.type()],
+            snapshot_blocks=self._snapshot_blocks,
         )
         self._batch_work_executor.execute(coin_addresses, self._collect_batch, total_items=len(coin_addresses))
         self._batch_work_executor.wait()
@@ -65,7 +70,12 @@ class ExportCoinBalancesJob(BaseExportJob):
         self._data_buff[CoinBalance.type()].sort(key=lambda x: (x.block_number, x.address))
 
 
-def distinct_addresses(blocks: List[Block], transactions: List[Transaction], traces: List[ContractInternalTransaction]):
+def distinct_addresses(
+    blocks: List[Block],
+    transactions: List[Transaction],
+    traces: List[ContractInternalTransaction],
+    snapshot_blocks: Optional[int] = None,
+):
     unique_addresses = set()
     for block in blocks:
         unique_addresses.add(
@@ -112,6 +122,9 @@ def distinct_addresses(blocks: List[Block], transactions: List[Transaction], tra
                     block_timestamp=trace.block_timestamp,
                 )
             )
+
+    if snapshot_blocks is not None:
+        unique_addresses = snapshot_collections_by_group(unique_addresses, ["address"], snapshot_blocks)
     return [record.__dict__ for record in unique_addresses]
 
 
@@ -16,7 +16,8 @@ class ExportReorgJob(BaseJob):
         self._should_reorg = True
 
     def _process(self, **kwargs):
-        block_number = int(kwargs["start_block"])
+        start_block = int(kwargs["start_block"])
+        end_block = int(kwargs["end_block"])
         conn = self._service.get_conn()
         cur = conn.cursor()
 
@@ -46,7 +47,7 @@ class ExportReorgJob(BaseJob):
                     insert_stmt = sql_insert_statement(table, do_update, columns, where_clause=update_strategy)
 
                     if table.__tablename__ != "blocks":
-                        cur.execute(self._build_clean_sql(table.__tablename__, block_number))
+                        cur.execute(self._build_clean_sql(table.__tablename__), (start_block, end_block))
 
                     execute_values(cur, insert_stmt, values, page_size=500)
 
@@ -61,5 +62,5 @@ class ExportReorgJob(BaseJob):
         self._data_buff.clear()
 
     @staticmethod
-    def _build_clean_sql(table, block_number):
-        return f"DELETE FROM {table} WHERE block_number={block_number} AND reorg=TRUE"
+    def _build_clean_sql(table):
+        return f"DELETE FROM {table} WHERE block_number BETWEEN %s AND %s AND reorg=TRUE"
@@ -1,10 +1,14 @@
 import logging
+import random
 from dataclasses import dataclass
 from typing import List, Optional, Union
 
 from eth_utils import to_hex
 from hexbytes import HexBytes
+from sqlalchemy import tuple_
 
+from common.models.current_token_balances import CurrentTokenBalances
+from common.utils.format_utils import bytes_to_hex_str, hex_str_to_bytes
 from indexer.domain import dict_to_dataclass
 from indexer.domain.current_token_balance import CurrentTokenBalance
 from indexer.domain.token_balance import TokenBalance
@@ -15,8 +19,9 @@ from indexer.modules.bridge.signature import function_abi_to_4byte_selector_str
 from indexer.utils.abi import pad_address, uint256_to_bytes
 from indexer.utils.exception_recorder import ExceptionRecorder
 from indexer.utils.multicall_hemera.util import calculate_execution_time
+from indexer.utils.token_balance_ledger import DEFAULT_LEDGER_SIZE, TokenBalanceLedger
 from indexer.utils.token_fetcher import TokenFetcher
-from indexer.utils.utils import ZERO_ADDRESS, distinct_collections_by_group
+from indexer.utils.utils import ZERO_ADDRESS, distinct_collections_by_group, snapshot_collections_by_group
 
 logger = logging.getLogger(__name__)
 exception_recorder = ExceptionRecorder()
@@ -44,6 +49,13 @@ BALANCE_OF_WITH_TOKEN_ID_ABI_FUNCTION = {
     "type": "function",
 }
 
+# Balances derived from transfers, checked against balanceOf every BALANCE_SPOT_CHECK_INTERVAL ranges
+BALANCE_MODE_DELTA = "delta"
+BALANCE_MODE_ETH_CALL = "eth_call"
+BALANCE_SPOT_CHECK_INTERVAL = 10
+BALANCE_SPOT_CHECK_TOKENS = 20
+SEED_QUERY_SIZE = 1000
+
 balance_of_sig_prefix = function_abi_to_4byte_selector_str(BALANCE_OF_ABI_FUNCTION)
 balance_of_token_id_sig_prefix = function_abi_to_4byte_selector_str(BALANCE_OF_WITH_TOKEN_ID_ABI_FUNCTION)
 
@@ -76,16 +88,48 @@ class ExportTokenBalancesJob(BaseExportJob):
         self._is_multi_call = kwargs["multicall"]
         self.token_fetcher = TokenFetcher(self._web3, kwargs)
 
+        # In delta mode ERC20 and ERC1155 balances are seeded once per holder and follow the transfers after,
+        # ERC721 balances, reorgs and distrusted tokens still use balanceOf at every block.
+        self._balance_ledger = None
+        if self.user_defined_config.get("balance_mode", BALANCE_MODE_ETH_CALL) == BALANCE_MODE_DELTA:
+            self._balance_ledger = TokenBalanceLedger(
+                max_entries=self.user_defined_config.get("ledger_size", DEFAULT_LEDGER_SIZE),
+                untrusted_tokens=[address.lower() for address in self.user_defined_config.get("eth_call_tokens", [])],
+            )
+        self._spot_check_interval = self.user_defined_config.get("spot_check_interval", BALANCE_SPOT_CHECK_INTERVAL)
+        self._spot_check_tokens = self.user_defined_config.get("spot_check_tokens", BALANCE_SPOT_CHECK_TOKENS)
+        self._seed_from_db = self.user_defined_config.get("seed_from_db", True)
+        # Rows of reorged blocks may still be in postgres until they are repaired, the ledger is seeded with
+        # balanceOf for the range following a fork
+        self._seed_from_chain = False
+        self._delta_ranges = 0
+        # None exports a balance at every block a holder is moved, otherwise only the balance at the last block
+        # moving it in each window of that many blocks, 0 keeping the balance at the end of the range only.
+        self._snapshot_blocks = self.user_defined_config.get("balance_snapshot_blocks")
+
     @calculate_execution_time
     def _collect(self, **kwargs):
         token_transfers = self._collect_all_token_transfers()
-        parameters = extract_token_parameters(token_transfers)
+        if self._balance_ledger is not None and not self._reorg:
+            token_transfers = self._collect_by_delta(
+                token_transfers, int(kwargs["start_block"]), int(kwargs["end_block"])
+            )
+        parameters = extract_token_parameters(token_transfers, snapshot_blocks=self._snapshot_blocks)
         if self._is_multi_call:
             self._collect_batch(parameters)
         else:
             self._batch_work_executor.execute(parameters, self._collect_batch, total_items=len(parameters))
             self._batch_work_executor.wait()
 
+    def handle_reorg(self, start_block, end_block):
+        if self._balance_ledger is None or self._reorg:
+            return False
+        # Ledger balances include the transfers of the reorged blocks, and so do the balances of the running range
+        self.logger.info(f"Blocks [{start_block}, {end_block}] are reorged, the balance ledger is cleared.")
+        self._balance_ledger.clear()
+        self._seed_from_chain = True
+        return True
+
     @calculate_execution_time
     def _collect_batch(self, parameters):
         token_balances = self.token_fetcher.fetch_token_balance(parameters)
@@ -113,6 +157,150 @@ class ExportTokenBalancesJob(BaseExportJob):
                 max_key="block_number",
             )
 
+    @calculate_execution_time
+    def _collect_by_delta(self, token_transfers, start_block, end_block):
+        """
+        Collects the balances of the transfers the ledger can account for, returning the other transfers,
+        whose balances are read with balanceOf.
+        """
+        ledger = self._balance_ledger
+        ledger.start_range(start_block)
+        seed_from_db, self._seed_from_chain = self._seed_from_db and not self._seed_from_chain, False
+        delta_transfers, other_transfers = [], []
+        for transfer in token_transfers:
+            if isinstance(transfer, ERC721TokenTransfer) or transfer.token_address in ledger.untrusted_tokens:
+                other_transfers.append(transfer)
+            else:
+                delta_transfers.append(transfer)
+        if not delta_transfers:
+            return other_transfers
+
+        holder_keys = ledger.holder_keys(delta_transfers)
+        missing_keys = ledger.missing_keys(holder_keys)
+        # Tokens seeded without a balanceOf result may not implement it, they are checked in this range
+        check_tokens = set()
+        if missing_keys:
+            seeds = self._query_current_balances(missing_keys, start_block) if seed_from_db else {}
+            call_keys = [key for key in missing_keys if key not in seeds]
+            call_balances = self._fetch_balances({key: holder_keys[key] for key in call_keys}, start_block - 1)
+            for key in call_keys:
+                if call_balances.get(key) is None:
+                    check_tokens.add(key[0])
+                seeds[key] = call_balances.get(key) or 0
+            ledger.seed(seeds)
+
+        balances, failed_tokens = ledger.apply(delta_transfers, end_block)
+
+        self._delta_ranges += 1
+        touched_tokens = set(key[0] for key, _ in balances)
+        if self._spot_check_interval > 0 and self._delta_ranges % self._spot_check_interval == 0:
+            check_tokens.update(
+                random.sample(sorted(touched_tokens), min(len(touched_tokens), self._spot_check_tokens))
+            )
+        for token_address in self._spot_check(balances, holder_keys, check_tokens & touched_tokens):
+            ledger.distrust(token_address)
+            failed_tokens.add(token_address)
+        if failed_tokens:
+            self.logger.warning(f"Balances of tokens {sorted(failed_tokens)} do not follow their transfers.")
+
+        block_timestamps = {transfer.block_number: transfer.block_timestamp for transfer in delta_transfers}
+        token_balances = [
+            TokenBalance(
+                address=address,
+                token_id=token_id,
+                token_type=holder_keys[(token_address, address, token_id)],
+                token_address=token_address,
+                balance=balance,
+                block_number=block_number,
+                block_timestamp=block_timestamps[block_number],
+            )
+            for ((token_address, address, token_id), block_number), balance in balances.items()
+            if token_address not in failed_tokens
+        ]
+        if self._snapshot_blocks is not None:
+            token_balances = snapshot_collections_by_group(
+                token_balances, ["token_address", "address", "token_id"], self._snapshot_blocks
+            )
+        self._collect_items(TokenBalance.type(), token_balances)
+
+        other_transfers.extend(transfer for transfer in delta_transfers if transfer.token_address in failed_tokens)
+        return other_transfers
+
+    def _spot_check(self, balances, holder_keys, token_addresses):
+        """Compares the last derived balance of one holder of each token with balanceOf, returning the mismatches."""
+        latest = {}
+        for (key, block_number), balance in balances.items():
+            if key[0] in token_addresses and (key[0] not in latest or block_number >= latest[key[0]][1]):
+                latest[key[0]] = (key, block_number, balance)
+        if not latest:
+            return set()
+
+        mismatched = set()
+        for block_number in set(block_number for _, block_number, _ in latest.values()):
+            checks = [(key, balance) for key, number, balance in latest.values() if number == block_number]
+            chain_balances = self._fetch_balances({key: holder_keys[key] for key, _ in checks}, block_number)
+            mismatched.update(key[0] for key, balance in checks if chain_balances.get(key) != balance)
+        return mismatched
+
+    def _fetch_balances(self, keys, block_number):
+        """Reads balanceOf at the block for {balance key: token type}, returning {balance key: balance}."""
+        if not keys:
+            return {}
+        parameters = [
+            {
+                "address": address,
+                "token_address": token_address,
+                "token_id": token_id,
+                "token_type": token_type,
+                "param_to": token_address,
+                "param_data": encode_balance_abi_parameter(address, token_type, token_id),
+                "param_number": block_number,
+                "block_number": block_number,
+                "block_timestamp": None,
+            }
+            for (token_address, address, token_id), token_type in keys.items()
+        ]
+        return {
+            (balance["token_address"], balance["address"], balance["token_id"]): balance["balance"]
+            for balance in self.token_fetcher.fetch_token_balance(parameters)
+        }
+
+    def _query_current_balances(self, keys, start_block):
+        """Balances of current_token_balances last updated before the range, as {balance key: balance}."""
+        if self._service is None:
+            return {}
+
+        balances = {}
+        session = self._service.get_service_session()
+        try:
+            for i in range(0, len(keys), SEED_QUERY_SIZE):
+                # token_id is stored as -1 for ERC20 balances
+                chunk = [
+                    (hex_str_to_bytes(token_address), hex_str_to_bytes(address), -1 if token_id is None else token_id)
+                    for token_address, address, token_id in keys[i : i + SEED_QUERY_SIZE]
+                ]
+                result = (
+                    session.query(CurrentTokenBalances)
+                    .filter(
+                        tuple_(
+                            CurrentTokenBalances.token_address,
+                            CurrentTokenBalances.address,
+                            CurrentTokenBalances.token_id,
+                        ).in_(chunk)
+                    )
+                    .filter(CurrentTokenBalances.block_number < start_block)
+                    .all()
+                )
+                for row in result:
+                    if row.balance is None:
+                        continue
+                    token_id = None if row.token_id == -1 else int(row.token_id)
+                    key = (bytes_to_hex_str(row.token_address), bytes_to_hex_str(row.address), token_id)
+                    balances[key] = int(row.balance)
+        finally:
+            session.close()
+        return balances
+
     @calculate_execution_time
     def _collect_all_token_transfers(self):
         token_transfers = []
@@ -141,6 +329,7 @@ def encode_balance_abi_parameter(address, token_type, token_id):
 def extract_token_parameters(
     token_transfers: List[Union[ERC20TokenTransfer, ERC721TokenTransfer, ERC1155TokenTransfer]],
     block_number: Union[Optional[int], str] = None,
+    snapshot_blocks: Optional[int] = None,
 ):
     origin_parameters = set()
     token_parameters = []
@@ -157,6 +346,11 @@ def extract_token_parameters(
         if transfer.to_address != ZERO_ADDRESS:
             origin_parameters.add(TokenBalanceParam(address=transfer.to_address, **common_params))
 
+    if snapshot_blocks is not None and block_number is None:
+        origin_parameters = snapshot_collections_by_group(
+            origin_parameters, ["address", "token_address", "token_id"], snapshot_blocks
+        )
+
     for parameter in origin_parameters:
         token_parameters.append(
             {
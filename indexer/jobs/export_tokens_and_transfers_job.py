@@ -104,6 +104,16 @@ abi_mapping = {
     "tokenURI": TOKEN_URI_ABI_FUNCTION,
 }
 
+# Functions called on new tokens with their arguments, ownerOf and tokenURI telling ERC721 tokens apart
+TOKEN_INFO_FUNCTION_CALLS = {
+    "name": [],
+    "symbol": [],
+    "decimals": [],
+    "totalSupply": [],
+    "ownerOf": [1],
+    "tokenURI": [1],
+}
+
 
 class ExportTokensAndTransfersJob(FilterTransactionDataJob):
     output_transfer_types = [
@@ -236,12 +246,20 @@ class ExportTokensAndTransfersJob(FilterTransactionDataJob):
             self._collect_domain(transfer.to_specific_transfer())
 
     def _export_token_info_batch(self, tokens):
-        new_tokens = tokens_info_rpc_requests(self._batch_web3_provider.make_request, tokens, self._is_batch)
+        if self._call_planner is not None:
+            new_tokens = planned_tokens_info_rpc_requests(self._call_planner, tokens)
+        else:
+            new_tokens = tokens_info_rpc_requests(self._batch_web3_provider.make_request, tokens, self._is_batch)
         for token in new_tokens:
             self._collect_item(Token.type(), dict_to_dataclass(token, Token))
 
     def _export_token_total_supply_batch(self, tokens):
-        token_updates = tokens_total_supply_rpc_requests(self._batch_web3_provider.make_request, tokens, self._is_batch)
+        if self._call_planner is not None:
+            token_updates = planned_tokens_total_supply_rpc_requests(self._call_planner, tokens)
+        else:
+            token_updates = tokens_total_supply_rpc_requests(
+                self._batch_web3_provider.make_request, tokens, self._is_batch
+            )
         for token in token_updates:
             if token.get("total_supply") is not None:
                 self._collect_item(UpdateToken.type(), dict_to_dataclass(token, UpdateToken))
@@ -307,15 +325,57 @@ def tokens_total_supply_rpc_requests(make_requests, tokens, is_batch):
     return tokens
 
 
+def planned_signature(fn_name):
+    """Returns the multicall signature of a token function, such as decimals()(uint8)."""
+    function_abi = abi_mapping[fn_name]
+    input_types = ",".join(item["type"] for item in function_abi["inputs"])
+    output_types = ",".join(item["type"] for item in function_abi["outputs"])
+    return f"{fn_name}({input_types})({output_types})"
+
+
+def planned_tokens_total_supply_rpc_requests(call_planner, tokens):
+    signature = planned_signature("totalSupply")
+    # Called at the latest block, as generate_eth_call_json_rpc_without_block_number does
+    planned_calls = [(token, call_planner.submit(token["address"], signature, block_id="latest")) for token in tokens]
+    for token, planned in planned_calls:
+        value = planned.result()
+        token["total_supply"] = value[0] if isinstance(value, tuple) else value
+    return tokens
+
+
+def planned_tokens_info_rpc_requests(call_planner, tokens):
+    """Same as tokens_info_rpc_requests, the calls being packed with the calls of other jobs by the planner."""
+    planned_calls = [
+        (
+            token,
+            fn_name,
+            call_planner.submit(token["address"], planned_signature(fn_name), arguments, "latest"),
+        )
+        for token in tokens
+        for fn_name, arguments in TOKEN_INFO_FUNCTION_CALLS.items()
+    ]
+    for token, fn_name, planned in planned_calls:
+        value = planned.result()
+        value = value[0] if isinstance(value, tuple) else value
+        if isinstance(value, str) and abi_mapping[fn_name]["outputs"][0]["type"] == "string":
+            value = value.replace("\u0000", "")
+        token[to_snake_case(fn_name)] = value
+
+    return classify_token_types(tokens)
+
+
+def classify_token_types(tokens):
+    for token in tokens:
+        if token["token_type"] != TokenType.ERC1155.value:
+            if token.get("token_uri") is not None or token.get("owner_of") is not None or token.get("decimals") is None:
+                token["token_type"] = TokenType.ERC721.value
+            else:
+                token["token_type"] = TokenType.ERC20.value
+    return tokens
+
+
 def tokens_info_rpc_requests(make_requests, tokens, is_batch):
-    function_call = {
-        "name": [],
-        "symbol": [],
-        "decimals": [],
-        "totalSupply": [],
-        "ownerOf": [1],
-        "tokenURI": [1],
-    }
+    function_call = TOKEN_INFO_FUNCTION_CALLS
 
     for fn_name in function_call.keys():
         token_name_rpc = list(
@@ -360,11 +420,4 @@ def tokens_info_rpc_requests(make_requests, tokens, is_batch):
 
                 token[key] = None
 
-    for token in tokens:
-        if token["token_type"] != TokenType.ERC1155.value:
-            if token.get("token_uri") is not None or token.get("owner_of") is not None or token.get("decimals") is None:
-                token["token_type"] = TokenType.ERC721.value
-            else:
-                token["token_type"] = TokenType.ERC20.value
-
-    return tokens
+    return classify_token_types(tokens)
@@ -1,19 +1,25 @@
 import logging
+from collections import defaultdict
 from typing import List
 
 import orjson
 
+from common.utils.exception_control import RetriableError
 from indexer.domain.block import Block
 from indexer.domain.log import Log
 from indexer.domain.receipt import Receipt
 from indexer.domain.transaction import Transaction
 from indexer.executors.batch_work_executor import BatchWorkExecutor
 from indexer.jobs.base_job import BaseExportJob
-from indexer.utils.json_rpc_requests import generate_get_receipt_json_rpc
-from indexer.utils.utils import rpc_response_batch_to_results
+from indexer.utils.json_rpc_requests import generate_get_block_receipts_json_rpc, generate_get_receipt_json_rpc
+from indexer.utils.utils import rpc_response_batch_to_results, rpc_response_to_result
 
 logger = logging.getLogger(__name__)
 
+RECEIPTS_BY_TRANSACTION = "transaction"
+RECEIPTS_BY_BLOCK = "block"
+METHOD_NOT_FOUND_CODE = -32601
+
 
 # Exports transactions and logs
 class ExportTransactionsAndLogsJob(BaseExportJob):
@@ -30,33 +36,114 @@ class ExportTransactionsAndLogsJob(BaseExportJob):
             job_name=self.__class__.__name__,
         )
         self._is_batch = kwargs["batch_size"] > 1
+        self._block_prefetcher = kwargs.get("block_prefetcher")
+        # "block" fetches all receipts of a block with eth_getBlockReceipts, falling back to
+        # eth_getTransactionReceipt when the provider does not support it.
+        self._receipt_fetch_mode = self.user_defined_config.get("receipt_fetch_mode", RECEIPTS_BY_TRANSACTION)
 
     def _collect(self, **kwargs):
 
         transactions: List[Transaction] = self._data_buff.get(Transaction.type(), [])
-        self._batch_work_executor.execute(transactions, self._collect_batch, total_items=len(transactions))
+        if self._receipt_fetch_mode == RECEIPTS_BY_BLOCK:
+            block_transactions = defaultdict(list)
+            for transaction in transactions:
+                block_transactions[transaction.block_number].append(transaction)
+            blocks = list(block_transactions.values())
+            self._batch_work_executor.execute(blocks, self._collect_block_batch, total_items=len(blocks))
+        else:
+            self._batch_work_executor.execute(transactions, self._collect_batch, total_items=len(transactions))
         self._batch_work_executor.wait()
 
+    def _collect_block_batch(self, block_transactions_batch: List[List[Transaction]]):
+        # Receipts are only filled once every block of the batch matches its transactions, so a batch retried
+        # after a mismatch does not collect the receipts and logs of its other blocks twice
+        matched_receipts = []
+        if self._block_prefetcher is not None:
+            cached_receipts = self._block_prefetcher.take_receipts(
+                [transaction for transactions in block_transactions_batch for transaction in transactions]
+            )
+            missing_block_transactions = []
+            for transactions in block_transactions_batch:
+                missing_transactions = []
+                for transaction in transactions:
+                    receipt = cached_receipts.get(transaction.hash)
+                    if receipt is None:
+                        missing_transactions.append(transaction)
+                    else:
+                        matched_receipts.append((transaction, receipt))
+                if missing_transactions:
+                    missing_block_transactions.append(missing_transactions)
+            block_transactions_batch = missing_block_transactions
+
+        block_receipts = None
+        if block_transactions_batch and self._receipt_fetch_mode == RECEIPTS_BY_BLOCK:
+            block_receipts = block_receipts_rpc_requests(
+                self._batch_web3_provider.make_request,
+                [transactions[0].block_number for transactions in block_transactions_batch],
+                self._is_batch,
+            )
+            if block_receipts is None:
+                logger.warning("eth_getBlockReceipts is not supported by the provider, using eth_getTransactionReceipt")
+                self._receipt_fetch_mode = RECEIPTS_BY_TRANSACTION
+
+        if block_receipts is None:
+            if block_transactions_batch:
+                self._collect_batch(
+                    [transaction for transactions in block_transactions_batch for transaction in transactions]
+                )
+            block_transactions_batch = []
+
+        for transactions in block_transactions_batch:
+            receipts = block_receipts.get(transactions[0].block_number) or []
+            for transaction in transactions:
+                # Block receipts are ordered by transaction index
+                index = transaction.transaction_index
+                receipt = receipts[index] if index < len(receipts) else None
+                if receipt is None or receipt["transactionHash"] != transaction.hash:
+                    raise RetriableError(
+                        f"Receipts of block {transaction.block_number} do not match its transactions, "
+                        f"the block may have been reorged."
+                    )
+                matched_receipts.append((transaction, receipt))
+
+        for transaction, receipt in matched_receipts:
+            self._fill_receipt(transaction, receipt)
+
     def _collect_batch(self, transactions: List[Transaction]):
         transaction_hash_mapper = {transaction.hash: transaction for transaction in transactions}
-        results = receipt_rpc_requests(
-            self._batch_web3_provider.make_request,
-            transaction_hash_mapper.keys(),
-            self._is_batch,
-        )
+        if self._block_prefetcher is None:
+            results = receipt_rpc_requests(
+                self._batch_web3_provider.make_request,
+                transaction_hash_mapper.keys(),
+                self._is_batch,
+            )
+        else:
+            cached_receipts = self._block_prefetcher.take_receipts(transactions)
+            missing_hashes = [
+                transaction_hash
+                for transaction_hash in transaction_hash_mapper
+                if transaction_hash not in cached_receipts
+            ]
+            results = list(cached_receipts.values())
+            if missing_hashes:
+                results.extend(
+                    receipt_rpc_requests(self._batch_web3_provider.make_request, missing_hashes, self._is_batch)
+                )
 
         for receipt in results:
-            transaction = transaction_hash_mapper[receipt["transactionHash"]]
-            receipt_entity = Receipt.from_rpc(
-                receipt,
-                transaction.block_timestamp,
-                transaction.block_hash,
-                transaction.block_number,
-            )
-            transaction.fill_with_receipt(receipt_entity)
+            self._fill_receipt(transaction_hash_mapper[receipt["transactionHash"]], receipt)
+
+    def _fill_receipt(self, transaction: Transaction, receipt: dict):
+        receipt_entity = Receipt.from_rpc(
+            receipt,
+            transaction.block_timestamp,
+            transaction.block_hash,
+            transaction.block_number,
+        )
+        transaction.fill_with_receipt(receipt_entity)
 
-            for log in transaction.receipt.logs:
-                self._collect_item(Log.type(), log)
+        for log in transaction.receipt.logs:
+            self._collect_item(Log.type(), log)
 
     def _process(self, **kwargs):
         self._data_buff[Log.type()].sort(key=lambda x: (x.block_number, x.log_index))
@@ -72,3 +159,26 @@ def receipt_rpc_requests(make_request, transaction_hashes, is_batch):
 
     results = rpc_response_batch_to_results(response)
     return results
+
+
+def block_receipts_rpc_requests(make_request, block_numbers, is_batch):
+    """Returns {block_number: [receipt]}, or None if the provider does not support eth_getBlockReceipts."""
+    block_receipts_rpc = list(generate_get_block_receipts_json_rpc(block_numbers))
+
+    if is_batch:
+        response = make_request(params=orjson.dumps(block_receipts_rpc))
+    else:
+        response = [make_request(params=orjson.dumps(block_receipts_rpc[0]))]
+
+    block_receipts = {}
+    for response_item in response:
+        error = response_item.get("error")
+        if error is None:
+            block_receipts[response_item["id"]] = rpc_response_to_result(response_item)
+            continue
+        message = error.get("message", "").lower()
+        if error.get("code") == METHOD_NOT_FOUND_CODE or "method not found" in message or "not supported" in message:
+            return None
+        # Any other error, such as a block the node has not synced yet, is transient
+        raise RetriableError(f"eth_getBlockReceipts of block {response_item.get('id')} failed: {error}")
+    return block_receipts
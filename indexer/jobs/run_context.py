@@ -0,0 +1,122 @@
+import threading
+from collections import defaultdict
+
+
+class RunContext(dict):
+    """
+    Data buffer of a single scheduler run over one block range, keyed by domain type.
+
+    Items collected by worker threads are appended to a shard owned by that thread, so collecting
+    takes no lock. Shards are merged into the buffer at the end of each job stage, or before any read
+    of the buffer while appends are pending. Buffers of different runs are independent, which allows
+    several ranges to be processed in one process at the same time.
+    """
+
+    def __init__(self, start_block=None, end_block=None):
+        super().__init__()
+        self.start_block = start_block
+        self.end_block = end_block
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        self._pending = False
+        self._dropped_counts = {}
+
+    def __missing__(self, key):
+        value = []
+        dict.__setitem__(self, key, value)
+        return value
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = defaultdict(list)
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def collect(self, key, item):
+        self._shard()[key].append(item)
+        self._pending = True
+
+    def collect_many(self, key, items):
+        self._shard()[key].extend(items)
+        self._pending = True
+
+    def merge(self):
+        with self._shards_lock:
+            self._pending = False
+            for shard in self._shards:
+                # Only the owner thread appends to a shard, consumed items are removed by slicing,
+                # so appends racing with the merge are kept for the next one.
+                for key, items in list(shard.items()):
+                    size = len(items)
+                    if size > 0:
+                        dict.__getitem__(self, key).extend(items[:size])
+                        del items[:size]
+
+    def drop(self, key):
+        """Releases the items of a domain type nothing will read anymore, keeping its item count."""
+        items = self.pop(key, None)
+        if items is not None:
+            self._dropped_counts[key] = self._dropped_counts.get(key, 0) + len(items)
+
+    def item_counts(self):
+        counts = dict(self._dropped_counts)
+        for key, items in self.items():
+            counts[key] = counts.get(key, 0) + len(items)
+        return counts
+
+    def __getitem__(self, key):
+        if self._pending:
+            self.merge()
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        if self._pending:
+            self.merge()
+        return super().__contains__(key)
+
+    def __iter__(self):
+        if self._pending:
+            self.merge()
+        return super().__iter__()
+
+    def __len__(self):
+        if self._pending:
+            self.merge()
+        return super().__len__()
+
+    def get(self, key, default=None):
+        if self._pending:
+            self.merge()
+        return super().get(key, default)
+
+    def keys(self):
+        if self._pending:
+            self.merge()
+        return super().keys()
+
+    def values(self):
+        if self._pending:
+            self.merge()
+        return super().values()
+
+    def items(self):
+        if self._pending:
+            self.merge()
+        return super().items()
+
+    def pop(self, key, *args):
+        if self._pending:
+            self.merge()
+        return super().pop(key, *args)
+
+    def clear(self):
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.clear()
+            self._pending = False
+        self._dropped_counts.clear()
+        super().clear()
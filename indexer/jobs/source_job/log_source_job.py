@@ -0,0 +1,146 @@
+import logging
+
+import orjson
+
+from common.utils.exception_control import RetriableError
+from indexer.domain.block import Block
+from indexer.domain.block_ts_mapper import BlockTsMapper
+from indexer.domain.log import Log
+from indexer.executors.batch_work_executor import BatchWorkExecutor
+from indexer.jobs.base_job import BaseSourceJob
+from indexer.utils.json_rpc_requests import generate_get_block_by_number_json_rpc, generate_json_rpc
+from indexer.utils.utils import rpc_response_batch_to_results
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_CHUNK_SIZE = 1000
+LOG_LIMIT_ERROR_CODE = -32005
+LOG_LIMIT_MESSAGES = (
+    "more than",
+    "too many",
+    "limit exceeded",
+    "response size",
+    "range is too large",
+    "block range",
+    "query timeout",
+)
+
+
+# Exports logs with eth_getLogs and only the block headers they need, when no job needs transactions or receipts
+class LogSourceJob(BaseSourceJob):
+    output_types = [Block, BlockTsMapper, Log]
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        self._batch_work_executor = BatchWorkExecutor(
+            kwargs["batch_size"],
+            kwargs["max_workers"],
+            job_name=self.__class__.__name__,
+        )
+        # Every header of the range is needed when blocks are exported or checked for consensus,
+        # otherwise only the headers of blocks with logs are fetched for their timestamps.
+        self._full_headers = kwargs.get("full_headers", True)
+        self._chunk_size = self.user_defined_config.get("log_chunk_size", DEFAULT_LOG_CHUNK_SIZE)
+        self._max_chunk_size = self._chunk_size
+        self._blocks = {}
+
+    def _collect(self, **kwargs):
+        start_block = int(kwargs["start_block"])
+        end_block = int(kwargs["end_block"])
+
+        chunks = []
+        for chunk_start in range(start_block, end_block + 1, self._chunk_size):
+            chunks.append((chunk_start, min(chunk_start + self._chunk_size - 1, end_block)))
+        self._batch_work_executor.execute(chunks, self._collect_log_chunks, total_items=len(chunks))
+        self._batch_work_executor.wait()
+
+        logs = self._data_buff[Log.type()]
+        if self._full_headers:
+            block_numbers = list(range(start_block, end_block + 1))
+        else:
+            block_numbers = sorted(set(log.block_number for log in logs))
+
+        self._blocks = {}
+        self._batch_work_executor.execute(block_numbers, self._collect_headers, total_items=len(block_numbers))
+        self._batch_work_executor.wait()
+
+        for log in logs:
+            block = self._blocks.get(log.block_number)
+            if block is None or block.hash != log.block_hash:
+                raise RetriableError(
+                    f"Logs of block {log.block_number} do not match its header, the block may have been reorged."
+                )
+            log.block_timestamp = block.timestamp
+
+        if self._full_headers:
+            self._collect_items(Block.type(), list(self._blocks.values()))
+
+    def _collect_log_chunks(self, chunks):
+        get_logs_rpc = [
+            generate_json_rpc(
+                method="eth_getLogs",
+                params=[{"fromBlock": hex(chunk_start), "toBlock": hex(chunk_end)}],
+                request_id=idx,
+            )
+            for idx, (chunk_start, chunk_end) in enumerate(chunks)
+        ]
+        response = self._batch_web3_provider.make_request(params=orjson.dumps(get_logs_rpc))
+
+        split_chunks = []
+        for response_item in response:
+            chunk_start, chunk_end = chunks[response_item["id"]]
+            error = response_item.get("error")
+            if error is not None and is_log_limit_error(error) and chunk_start < chunk_end:
+                middle = (chunk_start + chunk_end) // 2
+                split_chunks.extend([(chunk_start, middle), (middle + 1, chunk_end)])
+                continue
+
+            for result in rpc_response_batch_to_results([response_item]):
+                for log_dict in result or []:
+                    if log_dict.get("removed"):
+                        continue
+                    log = Log.from_rpc(
+                        log_dict, block_hash=log_dict["blockHash"], block_number=int(log_dict["blockNumber"], 16)
+                    )
+                    self._collect_item(Log.type(), log)
+
+        if split_chunks:
+            # Ranges of the following runs start from the reduced size, and grow back once the provider allows it
+            self._chunk_size = max(1, min(self._chunk_size, split_chunks[0][1] - split_chunks[0][0] + 1))
+            logger.info(f"Log result limit reached, splitting {len(split_chunks) // 2} chunks in halves.")
+            self._collect_log_chunks(split_chunks)
+        elif self._chunk_size < self._max_chunk_size:
+            self._chunk_size = min(self._chunk_size * 2, self._max_chunk_size)
+
+    def _collect_headers(self, block_number_batch):
+        block_number_rpc = list(generate_get_block_by_number_json_rpc(block_number_batch, False))
+        response = self._batch_web3_provider.make_request(params=orjson.dumps(block_number_rpc))
+        for block_dict in rpc_response_batch_to_results(response):
+            # Transactions are only hashes here, headers are all that is needed
+            block = Block.from_rpc(dict(block_dict, transactions=[]))
+            block.transactions_count = len(block_dict.get("transactions") or [])
+            self._blocks[block.number] = block
+
+    def _process(self, **kwargs):
+        self._data_buff[Log.type()].sort(key=lambda x: (x.block_number, x.log_index))
+        if not self._full_headers:
+            return
+
+        self._data_buff[Block.type()].sort(key=lambda x: x.number)
+        ts_dict = {}
+        for block in self._data_buff[Block.type()]:
+            timestamp = block.timestamp // 3600 * 3600
+            block_number = block.number
+
+            if timestamp not in ts_dict or block_number < ts_dict[timestamp]:
+                ts_dict[timestamp] = block_number
+
+        self._collect_items(BlockTsMapper.type(), [BlockTsMapper((ts, block)) for ts, block in ts_dict.items()])
+
+
+def is_log_limit_error(error):
+    message = error.get("message", "").lower()
+    return error.get("code") == LOG_LIMIT_ERROR_CODE or any(
+        limit_message in message for limit_message in LOG_LIMIT_MESSAGES
+    )
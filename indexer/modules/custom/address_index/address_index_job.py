@@ -308,6 +308,7 @@ def nft_transfers_to_address_nft_transfers(transfers: Union[List[ERC721TokenTran
 
 class AddressIndexerJob(ExtensionJob):
     dependency_types = [Transaction, ERC20TokenTransfer, ERC721TokenTransfer, ERC1155TokenTransfer]
+    optional_dependency_types = [ContractInternalTransaction]
     output_types = [
         TokenAddressNftInventory,
         AddressTransaction,
@@ -18,12 +18,52 @@ def get_chain_id(web3):
     return web3.eth.chain_id
 
 
+def function_signature(abi_list, fn_name):
+    """Returns the multicall signature of a function, such as token0()(address)."""
+    function_abi = next((abi for abi in abi_list if abi["name"] == fn_name and abi["type"] == "function"), None)
+    input_types = ",".join(item["type"] for item in function_abi.get("inputs", []))
+    output_types = ",".join(output["type"] for output in function_abi["outputs"])
+    return f"{fn_name}({input_types})({output_types})"
+
+
+def planned_get_rpc_requests(call_planner, requests, abi_list, fn_name, contract_address_key):
+    signature = function_signature(abi_list, fn_name)
+    planned_calls = [
+        (token, call_planner.submit(token[contract_address_key], signature, block_id=token["block_number"]))
+        for token in requests
+    ]
+
+    token_infos = []
+    for token, planned in planned_calls:
+        value = planned.result()
+        if isinstance(value, tuple):
+            value = value[0]
+        if value is None:
+            logger.error(f"Calling {fn_name} failed. token: {token}. fn: {fn_name}.")
+        else:
+            token[fn_name] = value
+        token_infos.append(token)
+    return token_infos
+
+
 def simple_get_rpc_requests(
-    web3, make_requests, requests, is_batch, abi_list, fn_name, contract_address_key, batch_size, max_worker
+    web3,
+    make_requests,
+    requests,
+    is_batch,
+    abi_list,
+    fn_name,
+    contract_address_key,
+    batch_size,
+    max_worker,
+    call_planner=None,
 ):
     if len(requests) == 0:
         return []
 
+    if call_planner is not None:
+        return planned_get_rpc_requests(call_planner, requests, abi_list, fn_name, contract_address_key)
+
     function_abi = next((abi for abi in abi_list if abi["name"] == fn_name and abi["type"] == "function"), None)
     outputs = function_abi["outputs"]
     output_types = [output["type"] for output in outputs]
@@ -25,6 +25,7 @@ AddressChangedTopic = "0x65412581168e88a1e60c6459d7f44ae83ad0832e670826c05a4e247
 
 class ExportCyberIDJob(FilterTransactionDataJob):
     dependency_types = [Transaction]
+    optional_dependency_types = [Log]
     output_types = [CyberAddressD, CyberIDRegisterD, CyberAddressChangedD]
     able_to_reorg = True
 
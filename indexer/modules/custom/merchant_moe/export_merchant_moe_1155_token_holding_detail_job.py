@@ -112,6 +112,7 @@ class ExportMerchantMoe1155LiquidityJob(FilterTransactionDataJob):
                 "address",
                 self._batch_size,
                 self._max_worker,
+                call_planner=self._call_planner,
             )
 
             if len(token0_infos) == 0 or "getTokenX" not in token0_infos[0] or token0_infos[0]["getTokenX"] is None:
@@ -126,6 +127,7 @@ class ExportMerchantMoe1155LiquidityJob(FilterTransactionDataJob):
                 "address",
                 self._batch_size,
                 self._max_worker,
+                call_planner=self._call_planner,
             )
             if len(token1_infos) == 0 or "getTokenY" not in token1_infos[0] or token1_infos[0]["getTokenY"] is None:
                 return
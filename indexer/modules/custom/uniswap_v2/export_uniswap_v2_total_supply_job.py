@@ -16,6 +16,7 @@ from indexer.domain.log import Log
 from indexer.executors.batch_work_executor import BatchWorkExecutor
 from indexer.jobs import FilterTransactionDataJob
 from indexer.modules.custom.all_features_value_record import AllFeatureValueRecordUniswapV2Info
+from indexer.modules.custom.common_utils import planned_get_rpc_requests
 from indexer.modules.custom.feature_type import FeatureType
 from indexer.modules.custom.uniswap_v2.constants import UNISWAP_V2_ABI, ThreadSafeList
 from indexer.modules.custom.uniswap_v2.domain.feature_uniswap_v2 import UniswapV2Pool
@@ -93,6 +94,7 @@ class ExportUniSwapV2InfoJob(FilterTransactionDataJob):
             self._web3,
             self._batch_web3_provider.make_request,
             self._is_batch,
+            call_planner=self._call_planner,
         )
         self._exist_pools.update(need_add_in_exists_pools)
 
@@ -112,6 +114,7 @@ class ExportUniSwapV2InfoJob(FilterTransactionDataJob):
             self._web3,
             self._batch_web3_provider.make_request,
             self._is_batch,
+            call_planner=self._call_planner,
         )
         self._collected_total_supply.add_items(pool_total_supply)
 
@@ -200,7 +203,17 @@ def get_exist_pools(db_service, factory_address):
 
 
 def update_exist_pools(
-    factory_address, exist_pools, create_topic0, mint_topic0, burn_topic0, logs, abi_list, web3, make_requests, is_batch
+    factory_address,
+    exist_pools,
+    create_topic0,
+    mint_topic0,
+    burn_topic0,
+    logs,
+    abi_list,
+    web3,
+    make_requests,
+    is_batch,
+    call_planner=None,
 ):
     need_add = {}
     active_pools = []
@@ -225,12 +238,16 @@ def update_exist_pools(
         elif mint_topic0 == current_topic0 or burn_topic0 == current_topic0:
             # if the address created by factory_address ,collect it
             active_pools.append({"address": address, "block_number": log.block_number})
-    swap_new_pools = collect_active_new_pools(factory_address, active_pools, abi_list, web3, make_requests, is_batch)
+    swap_new_pools = collect_active_new_pools(
+        factory_address, active_pools, abi_list, web3, make_requests, is_batch, call_planner
+    )
     need_add.update(swap_new_pools)
     return need_add
 
 
-def collect_pool_total_supply(target_topic0_list, exist_pools, logs, abi_list, web3, make_requests, is_batch):
+def collect_pool_total_supply(
+    target_topic0_list, exist_pools, logs, abi_list, web3, make_requests, is_batch, call_planner=None
+):
     need_collect = {}
 
     for log in logs:
@@ -242,7 +259,7 @@ def collect_pool_total_supply(target_topic0_list, exist_pools, logs, abi_list, w
     need_collect_list = list(need_collect.values())
     # call totalSupply
     total_supply_infos = simple_get_rpc_requests(
-        web3, make_requests, need_collect_list, is_batch, abi_list, "totalSupply", "address"
+        web3, make_requests, need_collect_list, is_batch, abi_list, "totalSupply", "address", call_planner
     )
     result = []
     for data in total_supply_infos:
@@ -260,8 +277,10 @@ def collect_pool_total_supply(target_topic0_list, exist_pools, logs, abi_list, w
     return result
 
 
-def collect_active_new_pools(factory_address, active_pools, abi_list, web3, make_requests, is_batch):
-    factory_infos = simple_get_rpc_requests(web3, make_requests, active_pools, is_batch, abi_list, "factory", "address")
+def collect_active_new_pools(factory_address, active_pools, abi_list, web3, make_requests, is_batch, call_planner=None):
+    factory_infos = simple_get_rpc_requests(
+        web3, make_requests, active_pools, is_batch, abi_list, "factory", "address", call_planner
+    )
     uniswap_pools = []
     need_add = {}
     for data in factory_infos:
@@ -274,8 +293,12 @@ def collect_active_new_pools(factory_address, active_pools, abi_list, web3, make
             )
     if len(uniswap_pools) == 0:
         return need_add
-    token0_infos = simple_get_rpc_requests(web3, make_requests, uniswap_pools, is_batch, abi_list, "token0", "address")
-    token1_infos = simple_get_rpc_requests(web3, make_requests, token0_infos, is_batch, abi_list, "token1", "address")
+    token0_infos = simple_get_rpc_requests(
+        web3, make_requests, uniswap_pools, is_batch, abi_list, "token0", "address", call_planner
+    )
+    token1_infos = simple_get_rpc_requests(
+        web3, make_requests, token0_infos, is_batch, abi_list, "token1", "address", call_planner
+    )
     for data in token1_infos:
         pool_address = data["address"]
         new_pool = {
@@ -289,9 +312,13 @@ def collect_active_new_pools(factory_address, active_pools, abi_list, web3, make
     return need_add
 
 
-def simple_get_rpc_requests(web3, make_requests, requests, is_batch, abi_list, fn_name, contract_address_key):
+def simple_get_rpc_requests(
+    web3, make_requests, requests, is_batch, abi_list, fn_name, contract_address_key, call_planner=None
+):
     if len(requests) == 0:
         return []
+    if call_planner is not None:
+        return planned_get_rpc_requests(call_planner, requests, abi_list, fn_name, contract_address_key)
     function_abi = next((abi for abi in abi_list if abi["name"] == fn_name and abi["type"] == "function"), None)
     outputs = function_abi["outputs"]
     output_types = [output["type"] for output in outputs]
@@ -160,6 +160,7 @@ class AgniPoolJob(FilterTransactionDataJob):
             self._abi_list,
             self._batch_size,
             self._max_worker,
+            call_planner=self._call_planner,
         )
         for data in pool_prices:
             detail = AgniV3PoolPrice(
@@ -270,10 +271,13 @@ def get_exist_pools(db_service, position_token_address):
     return history_pools
 
 
-def slot0_rpc_requests(web3, make_requests, requests, is_batch, abi_list, batch_size, max_worker):
+def slot0_rpc_requests(web3, make_requests, requests, is_batch, abi_list, batch_size, max_worker, call_planner=None):
     if len(requests) == 0:
         return []
     fn_name = "slot0"
+    if call_planner is not None:
+        return planned_slot0_rpc_requests(call_planner, requests, abi_list)
+
     function_abi = next((abi for abi in abi_list if abi["name"] == fn_name and abi["type"] == "function"), None)
     outputs = function_abi["outputs"]
     output_types = [output["type"] for output in outputs]
@@ -300,6 +304,23 @@ def slot0_rpc_requests(web3, make_requests, requests, is_batch, abi_list, batch_
     return token_infos
 
 
+def planned_slot0_rpc_requests(call_planner, requests, abi_list):
+    signature = common_utils.function_signature(abi_list, "slot0")
+    planned_calls = [
+        (pool, call_planner.submit(pool["pool_address"], signature, block_id=pool["block_number"])) for pool in requests
+    ]
+
+    pool_infos = []
+    for pool, planned in planned_calls:
+        value = planned.result()
+        if value is None:
+            logger.error(f"Calling slot0 failed. pool: {pool}.")
+        else:
+            pool["sqrtPriceX96"], pool["tick"] = value[0], value[1]
+        pool_infos.append(pool)
+    return pool_infos
+
+
 def get_price_and_tick_from_hex(hex_string):
     if hex_string.startswith("0x"):
         hex_string = hex_string[2:]
@@ -0,0 +1,54 @@
+import pytest
+from requests import HTTPError, Response
+
+from indexer.executors.adaptive_batch_controller import AdaptiveBatchController, is_overload_error
+
+
+def http_error(status_code):
+    response = Response()
+    response.status_code = status_code
+    return HTTPError(response=response)
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_batch_size_follows_target_latency():
+    controller = AdaptiveBatchController(10, 80, max_workers=4, target_latency=1.0)
+
+    for _ in range(10):
+        controller.on_success(controller.batch_size, controller.batch_size / 40)
+    assert 38 <= controller.batch_size <= 40
+
+    for _ in range(10):
+        controller.on_success(controller.batch_size, controller.batch_size / 5)
+    assert controller.batch_size == 5
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_overload_errors_decrease_batch_size_and_concurrency():
+    controller = AdaptiveBatchController(40, 80, max_workers=4, target_latency=1.0)
+
+    assert controller.on_error(http_error(429))
+    assert controller.metrics()["batch_size"] == 20
+    assert controller.metrics()["concurrency"] == 2
+
+    assert not controller.on_error(http_error(500))
+    assert controller.on_error(ValueError("Response size exceeded"))
+    assert controller.batch_size == 10
+    assert controller.concurrency == 1
+
+    for _ in range(5):
+        controller.on_success(10, 0.5)
+    assert controller.concurrency == 2
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_overload_errors_are_matched_on_codes_and_phrases():
+    assert is_overload_error(http_error(429))
+    assert not is_overload_error(http_error(500))
+    assert is_overload_error(ValueError({"code": -32005, "message": "query returned more than 10000 results"}))
+    assert is_overload_error(ValueError("Too Many Requests"))
+    # Numbers such as block numbers or hashes containing an overload status are not overloads
+    assert not is_overload_error(ValueError("header not found for block 4291503"))
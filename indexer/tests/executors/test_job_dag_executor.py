@@ -0,0 +1,47 @@
+import threading
+import time
+
+import pytest
+
+from indexer.executors.job_dag_executor import JobDAGExecutor
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_siblings_run_after_parent_and_concurrently():
+    # 0 -> (1, 2) -> 3
+    executor = JobDAGExecutor([set(), {0}, {0}, {1, 2}], max_workers=2)
+    both_running = threading.Barrier(2, timeout=5)
+    order = []
+
+    def run(index):
+        if index in (1, 2):
+            both_running.wait()
+            time.sleep(0.01 * index)
+        order.append(index)
+
+    finished = []
+    timings = executor.execute(run, finished.append)
+
+    assert order[0] == 0 and order[-1] == 3
+    assert sorted(finished) == [0, 1, 2, 3]
+    path, duration = executor.critical_path(timings)
+    assert path == [0, 2, 3]
+    assert duration > 0
+    executor.shutdown()
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_failure_stops_scheduling_children():
+    executor = JobDAGExecutor([set(), {0}], max_workers=2)
+    ran = []
+
+    def run(index):
+        ran.append(index)
+        raise ValueError("job failed")
+
+    with pytest.raises(ValueError):
+        executor.execute(run)
+    assert ran == [0]
+    executor.shutdown()
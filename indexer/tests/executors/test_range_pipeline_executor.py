@@ -0,0 +1,49 @@
+import threading
+
+import pytest
+
+from indexer.executors.range_pipeline_executor import RangePipelineExecutor
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_ranges_commit_in_submission_order():
+    executor = RangePipelineExecutor(2)
+    release = threading.Event()
+    exported = []
+
+    def export(end_block, block=False):
+        if block:
+            release.wait(5)
+        exported.append(end_block)
+
+    executor.submit(1, 10, export, 10, block=True)
+    executor.submit(11, 20, export, 20)
+    assert executor.poll_committed() is None
+
+    release.set()
+    assert executor.wait() == 20
+    assert exported == [10, 20]
+    assert executor.poll_committed() is None
+    executor.shutdown()
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_failed_range_stops_commit_and_recovers():
+    executor = RangePipelineExecutor(3)
+
+    def export(end_block):
+        if end_block == 20:
+            raise ValueError("export failed")
+
+    executor.submit(1, 10, export, 10)
+    executor.submit(11, 20, export, 20)
+    executor.submit(21, 30, export, 30)
+
+    with pytest.raises(ValueError):
+        executor.wait()
+
+    assert executor.recover() == 10
+    assert executor.inflight_ranges() == []
+    executor.shutdown()
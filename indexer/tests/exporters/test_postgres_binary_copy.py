@@ -0,0 +1,201 @@
+import json
+import struct
+from datetime import datetime, timedelta
+from decimal import Decimal, localcontext
+
+import pytest
+
+from common.models.tokens import Tokens
+from common.models.transactions import Transactions
+from indexer.domain.transaction import Transaction
+from indexer.exporters import postgres_item_exporter
+from indexer.exporters.postgres_binary_copy import (
+    COPY_HEADER,
+    BinaryCopyEncoder,
+    UnsupportedCopyValue,
+    column_encoder,
+    encode_numeric,
+)
+from indexer.exporters.postgres_item_exporter import PostgresItemExporter
+
+POSTGRES_EPOCH = datetime(2000, 1, 1)
+
+
+def read_copy_stream(buffer):
+    """Splits a binary COPY stream into rows of raw fields, None for NULL fields."""
+    data = buffer.read()
+    assert data.startswith(COPY_HEADER)
+    offset = len(COPY_HEADER)
+    rows = []
+    while True:
+        (field_count,) = struct.unpack_from(">h", data, offset)
+        offset += 2
+        if field_count == -1:
+            assert offset == len(data)
+            return rows
+        row = []
+        for _ in range(field_count):
+            (length,) = struct.unpack_from(">i", data, offset)
+            offset += 4
+            if length == -1:
+                row.append(None)
+            else:
+                row.append(data[offset : offset + length])
+                offset += length
+        rows.append(row)
+
+
+def decode_numeric(data):
+    ndigits, weight, sign, scale = struct.unpack_from(">hhHH", data)
+    digits = struct.unpack_from(f">{ndigits}H", data, 8)
+    # Base 10000 digits, the first one of weight "weight"
+    integer = sum(digit * 10000 ** (len(digits) - 1 - i) for i, digit in enumerate(digits))
+    with localcontext() as context:
+        context.prec = 1000
+        value = Decimal(integer).scaleb(4 * (weight - len(digits) + 1))
+        value = value.quantize(Decimal(1).scaleb(-scale))
+    return -value if sign == 0x4000 else value
+
+
+def decode_timestamp(data):
+    return POSTGRES_EPOCH + timedelta(microseconds=struct.unpack(">q", data)[0])
+
+
+def decode_array(data, decode_element):
+    ndim, has_null, element_oid = struct.unpack_from(">iiI", data)
+    if ndim == 0:
+        return element_oid, []
+    length, _ = struct.unpack_from(">ii", data, 12)
+    offset = 20
+    elements = []
+    for _ in range(length):
+        (size,) = struct.unpack_from(">i", data, offset)
+        offset += 4
+        if size == -1:
+            elements.append(None)
+        else:
+            elements.append(decode_element(data[offset : offset + size]))
+            offset += size
+    assert bool(has_null) == (None in elements)
+    return element_oid, elements
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_exporter
+@pytest.mark.parametrize(
+    "value",
+    [0, 1, 9999, 10000, -12345, 10**40 + 7, Decimal("0.0001"), Decimal("-12345.678"), Decimal("1E+5"), 1.5],
+)
+def test_numeric_round_trip(value):
+    assert decode_numeric(encode_numeric(value)) == Decimal(repr(value) if isinstance(value, float) else value)
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_exporter
+def test_rows_round_trip():
+    columns = ["hash", "value", "receipt_l1_fee_scalar", "block_timestamp", "blob_versioned_hashes", "exist_error"]
+    timestamp = datetime(2024, 5, 1, 12, 30, 15, 250)
+    rows = [
+        (b"\x01" * 32, 10**30, Decimal("0.684"), timestamp, [b"\x02" * 32, None], True),
+        (b"\x03" * 32, None, None, None, [], None),
+    ]
+
+    copied = read_copy_stream(BinaryCopyEncoder(Transactions, columns).encode(rows))
+
+    assert len(copied) == 2 and all(len(row) == len(columns) for row in copied)
+    first, second = copied
+    assert first[0] == b"\x01" * 32
+    assert decode_numeric(first[1]) == 10**30
+    assert decode_numeric(first[2]) == Decimal("0.684")
+    assert decode_timestamp(first[3]) == timestamp
+    assert decode_array(first[4], bytes) == (17, [b"\x02" * 32, None])
+    assert first[5] == b"\x01"
+    assert second[1:4] == [None, None, None] and second[5] is None
+    assert decode_array(second[4], bytes) == (17, [])
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_exporter
+def test_jsonb_is_copied_with_its_version():
+    urls = {"website": "https://example.com", "tags": ["a", "b"]}
+    copied = read_copy_stream(BinaryCopyEncoder(Tokens, ["urls"]).encode([(urls,)]))
+    assert copied[0][0][:1] == b"\x01"
+    assert json.loads(copied[0][0][1:]) == urls
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_exporter
+@pytest.mark.parametrize(
+    "column, value",
+    [("block_number", "12"), ("block_number", 2**63), ("value", float("inf")), ("block_timestamp", 1714566615)],
+)
+def test_unsupported_values_raise(column, value):
+    with pytest.raises(UnsupportedCopyValue):
+        BinaryCopyEncoder(Transactions, [column]).encode([(value,)])
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_exporter
+def test_unsupported_column_type_raises():
+    from sqlalchemy import Interval
+
+    with pytest.raises(UnsupportedCopyValue):
+        column_encoder(Interval())
+
+
+class FakeCursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(statement)
+
+    def copy_expert(self, statement, buffer):
+        self.statements.append(statement)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.cursors = []
+
+    def cursor(self):
+        self.cursors.append(FakeCursor())
+        return self.cursors[-1]
+
+
+def build_transaction(block_number, value):
+    return Transaction(
+        hash="0x" + f"{block_number:064x}",
+        nonce=0,
+        transaction_index=0,
+        from_address="0x" + "11" * 20,
+        to_address="0x" + "22" * 20,
+        value=value,
+        gas_price=1,
+        gas=21000,
+        transaction_type=0,
+        input="0x",
+        block_number=block_number,
+        block_timestamp=1714566615,
+        block_hash="0x" + f"{block_number:064x}",
+    )
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_exporter
+def test_exporter_falls_back_to_insert_on_unsupported_value(monkeypatch):
+    inserted = []
+    monkeypatch.setattr(
+        postgres_item_exporter, "execute_values", lambda cur, statement, values, page_size: inserted.extend(values)
+    )
+    exporter = PostgresItemExporter(service=None, copy_min_items=1)
+
+    connection = FakeConnection()
+    exporter._export_group(connection, Transaction, [build_transaction(1, 10)])
+    assert any("FORMAT binary" in statement for statement in connection.cursors[0].statements)
+    assert inserted == []
+
+    connection = FakeConnection()
+    exporter._export_group(connection, Transaction, [build_transaction(2, float("inf"))])
+    assert not any("FORMAT binary" in statement for statement in connection.cursors[0].statements)
+    assert len(inserted) == 1
@@ -0,0 +1,82 @@
+import orjson
+import pytest
+
+from indexer.domain.log import Log
+from indexer.domain.transaction import Transaction
+from indexer.jobs.export_transactions_and_logs_job import ExportTransactionsAndLogsJob
+
+ADDRESS = "0x" + "11" * 20
+
+
+def transaction_hash(block_number):
+    return "0x" + f"{block_number:064x}"
+
+
+class ReorgingProvider:
+    """Answers eth_getBlockReceipts, the receipts of block 2 belonging to a fork on the first request."""
+
+    endpoint_uri = "http://localhost:8545"
+
+    def __init__(self):
+        self.requests = 0
+
+    def make_request(self, method=None, params=None):
+        self.requests += 1
+        requests = orjson.loads(params)
+        return [self.block_receipts(request, forked=self.requests == 1) for request in requests]
+
+    @staticmethod
+    def block_receipts(request, forked):
+        block_number = int(request["params"][0], 16)
+        hash = transaction_hash(block_number + 100 if forked and block_number == 2 else block_number)
+        log = {
+            "logIndex": "0x0",
+            "address": ADDRESS,
+            "data": "0x",
+            "transactionHash": hash,
+            "transactionIndex": "0x0",
+            "topics": [],
+        }
+        receipt = {"transactionHash": hash, "transactionIndex": "0x0", "status": "0x1", "logs": [log]}
+        return {"jsonrpc": "2.0", "id": request["id"], "result": [receipt]}
+
+
+def block_transaction(block_number):
+    return Transaction(
+        hash=transaction_hash(block_number),
+        nonce=0,
+        transaction_index=0,
+        from_address=ADDRESS,
+        to_address=ADDRESS,
+        value=0,
+        gas_price=0,
+        gas=21000,
+        transaction_type=0,
+        input="0x",
+        block_number=block_number,
+        block_timestamp=block_number,
+        block_hash=transaction_hash(block_number),
+    )
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_exporter
+def test_mismatched_block_receipts_are_not_collected_twice():
+    provider = ReorgingProvider()
+    job = ExportTransactionsAndLogsJob(
+        batch_web3_provider=provider,
+        item_exporters=[],
+        batch_size=2,
+        max_workers=1,
+        chain_id=1,
+        required_output_types=[Log],
+        config={"export_transactions_and_logs_job": {"receipt_fetch_mode": "block"}},
+    )
+    job._collect_items(Transaction.type(), [block_transaction(1), block_transaction(2)])
+    job._run_context.merge()
+
+    # The batch of both blocks fails on the forked receipts of block 2, and is retried one block at a time
+    job._collect()
+
+    assert provider.requests == 3
+    assert [log.block_number for log in job._data_buff[Log.type()]] == [1, 2]
@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+from indexer.jobs.run_context import RunContext
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_jobs
+def test_run_context_merges_thread_shards():
+    run_context = RunContext(1, 10)
+
+    def collect(worker):
+        for index in range(1000):
+            run_context.collect("block", (worker, index))
+        run_context.collect_many("transaction", [worker, worker])
+
+    workers = [threading.Thread(target=collect, args=(worker,)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert len(run_context["block"]) == 4000
+    assert sorted(run_context.get("transaction")) == [0, 0, 1, 1, 2, 2, 3, 3]
+    assert run_context["log"] == []
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_jobs
+def test_run_context_drop_keeps_item_counts():
+    run_context = RunContext(1, 10)
+    run_context.collect_many("transaction", [1, 2, 3])
+    run_context.collect("block", 1)
+
+    run_context.drop("transaction")
+
+    assert "transaction" not in run_context
+    assert run_context.item_counts() == {"transaction": 3, "block": 1}
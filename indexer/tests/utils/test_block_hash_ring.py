@@ -0,0 +1,47 @@
+from collections import namedtuple
+
+import pytest
+
+from indexer.utils.block_hash_ring import BlockHashRing
+
+BlockHeader = namedtuple("BlockHeader", ["number", "hash", "parent_hash"])
+
+
+def chain(start, end, fork=""):
+    return [BlockHeader(number, f"0x{fork}{number}", f"0x{fork}{number - 1}") for number in range(start, end + 1)]
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_block_hash_ring_finds_fork_ancestor():
+    ring = BlockHashRing(capacity=5)
+    ring.extend(chain(1, 8))
+    assert ring.numbers() == [4, 5, 6, 7, 8]
+
+    assert ring.first_mismatch(chain(9, 10)) is None
+    forked = [BlockHeader(9, "0xb9", "0xb8")] + chain(10, 10, fork="b")
+    assert ring.first_mismatch(forked).number == 9
+    broken = chain(9, 9) + chain(10, 10, fork="b")
+    assert ring.first_mismatch(broken).number == 10
+
+    chain_hashes = {4: "0x4", 5: "0x5", 6: "0x6", 7: "0xb7", 8: "0xb8"}
+    assert ring.common_ancestor(chain_hashes) == 6
+    assert ring.common_ancestor({7: "0xb7"}) is None
+
+    ring.rewind(6)
+    assert ring.numbers() == [4, 5, 6]
+    ring.extend(chain(5, 6, fork="b"))
+    assert ring.get(5) == ("0xb5", "0xb4")
+    assert ring.numbers() == [4, 5, 6]
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_block_hash_ring_persists(tmp_path):
+    file_name = str(tmp_path / "ring.json")
+    ring = BlockHashRing(capacity=3, file_name=file_name)
+    ring.extend(chain(1, 4))
+
+    loaded = BlockHashRing(capacity=2, file_name=file_name)
+    assert loaded.numbers() == [3, 4]
+    assert loaded.get(4) == ("0x4", "0x3")
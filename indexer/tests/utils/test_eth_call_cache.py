@@ -0,0 +1,74 @@
+import orjson
+import pytest
+
+from indexer.utils.eth_call_cache import CachedCallProvider, EthCallCache, immutable_selectors
+
+POOL = "0x00000000000000000000000000000000000000aa"
+
+
+class CountingProvider:
+    endpoint_uri = "http://localhost:8545"
+
+    def __init__(self):
+        self.sent = []
+
+    def make_request(self, method=None, params=None):
+        requests = orjson.loads(params)
+        self.sent.append(requests)
+        return [{"jsonrpc": "2.0", "id": request["id"], "result": f"0x{request['id']:02x}"} for request in requests]
+
+
+def eth_call(request_id, data, block):
+    return {"jsonrpc": "2.0", "method": "eth_call", "params": [{"to": POOL, "data": data}, block], "id": request_id}
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_cached_call_provider_sends_only_misses():
+    provider = CountingProvider()
+    cached = CachedCallProvider(provider, EthCallCache(max_size=10, block_window=5))
+    assert cached.endpoint_uri == provider.endpoint_uri
+
+    first = cached.make_request(params=orjson.dumps([eth_call(1, "0x0dfe1681", "0x10"), eth_call(2, "0x1234", "0x10")]))
+    assert [response["result"] for response in first] == ["0x01", "0x02"]
+
+    # token0() is immutable, the other call is only cached at its block
+    requests = [eth_call(3, "0x0dfe1681", "0x20"), eth_call(4, "0x1234", "0x10"), eth_call(5, "0x1234", "0x11")]
+    second = cached.make_request(params=orjson.dumps(requests))
+    assert [response["id"] for response in second] == [3, 4, 5]
+    assert [response["result"] for response in second] == ["0x01", "0x02", "0x05"]
+    assert [request["id"] for request in provider.sent[-1]] == [5]
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_eth_call_cache_evicts_old_blocks_and_persists(tmp_path):
+    cache = EthCallCache(max_size=10, block_window=5, persist_uri=str(tmp_path / "calls.json"))
+    cache.put(cache.cache_key(POOL, "0x1234", "0x10"), "0x01")
+    cache.put(cache.cache_key(POOL, "0x313ce567", "latest"), "0x12")
+    cache.put(cache.cache_key(POOL, "0xc45a0155", "latest"), "0x")
+    assert cache.cache_key(POOL, "0x1234", "latest") is None
+
+    cache.put(cache.cache_key(POOL, "0x1234", "0x20"), "0x02")
+    assert cache.get(cache.cache_key(POOL, "0x1234", "0x10")) is None
+    assert cache.get(cache.cache_key(POOL, "0x1234", "0x20")) == "0x02"
+    cache.save()
+
+    loaded = EthCallCache(persist_uri=str(tmp_path / "calls.json"))
+    assert len(loaded) == 1
+    assert loaded.get(loaded.cache_key(POOL, "0x313ce567", "0x30")) == "0x12"
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_eth_call_cache_immutable_calls_are_opt_in():
+    # name() and fee() change on some contracts, they are only kept whatever their block when asked for
+    assert EthCallCache().cache_key(POOL, "0x06fdde03", "latest") is None
+    assert EthCallCache().cache_key(POOL, "0xddca3f43", "0x10") == (POOL, "0xddca3f43", 16)
+
+    cache = EthCallCache(immutable_selectors=immutable_selectors(["name", "0xDDCA3F43"]))
+    assert cache.cache_key(POOL, "0x06fdde03", "latest") == (POOL, "0x06fdde03", None)
+    assert cache.cache_key(POOL, "0xddca3f43", "0x10") == (POOL, "0xddca3f43", None)
+    assert cache.cache_key(POOL, "0x313ce567", "0x10") == (POOL, "0x313ce567", None)
+    with pytest.raises(ValueError):
+        immutable_selectors(["totalSupply"])
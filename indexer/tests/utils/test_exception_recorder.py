@@ -0,0 +1,115 @@
+import struct
+
+import pytest
+
+from indexer.exporters.postgres_binary_copy import COPY_HEADER
+from indexer.utils import exception_recorder as exception_recorder_module
+from indexer.utils.exception_recorder import ExceptionRecorder
+
+
+def copied_block_numbers(data):
+    """Returns the block numbers, first field of every row, of a binary COPY stream."""
+    offset = len(COPY_HEADER)
+    block_numbers = []
+    while True:
+        (field_count,) = struct.unpack_from(">h", data, offset)
+        offset += 2
+        if field_count == -1:
+            return block_numbers
+        for index in range(field_count):
+            (length,) = struct.unpack_from(">i", data, offset)
+            offset += 4
+            if index == 0:
+                block_numbers.append(struct.unpack_from(">q", data, offset)[0])
+            offset += max(length, 0)
+
+
+class FakeCursor:
+    def __init__(self, service):
+        self.service = service
+
+    def copy_expert(self, statement, buffer):
+        self.service.copies.append(copied_block_numbers(buffer.read()))
+
+
+class FakeConnection:
+    def __init__(self, service):
+        self.service = service
+
+    def cursor(self):
+        return FakeCursor(self.service)
+
+    def commit(self):
+        self.service.commits += 1
+
+    def rollback(self):
+        pass
+
+
+class FakeService:
+    def __init__(self):
+        self.copies = []
+        self.commits = 0
+        self.released = 0
+
+    def get_conn(self):
+        return FakeConnection(self)
+
+    def release_conn(self, conn):
+        self.released += 1
+
+
+@pytest.fixture
+def recorder(monkeypatch):
+    monkeypatch.setattr(ExceptionRecorder, "_instance", None)
+    monkeypatch.setattr(exception_recorder_module, "MAX_BUFFER_SIZE", 10)
+    monkeypatch.setattr(exception_recorder_module, "LOG_BUFFER_SIZE", 4)
+    monkeypatch.setattr(exception_recorder_module, "OVERLOAD_SAMPLE_RATE", 5)
+    recorder = ExceptionRecorder()
+    # The service is set without init_pg_service, so no background thread flushes while the test runs
+    recorder._service = FakeService()
+    return recorder
+
+
+def log(recorder, block_number):
+    recorder.log(block_number=block_number, dataclass="block", message_type="test", message="message")
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_full_buffer_samples_new_records(recorder):
+    for block_number in range(10):
+        log(recorder, block_number)
+    assert len(recorder._log_buffer) == 10
+
+    # Every fifth record logged while the buffer is full replaces the oldest one, the others are dropped
+    for block_number in range(10, 20):
+        log(recorder, block_number)
+    assert len(recorder._log_buffer) == 10
+    assert recorder._dropped == 10
+    assert [record[0] for record in recorder._log_buffer] == [2, 3, 4, 5, 6, 7, 8, 9, 14, 19]
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_force_to_flush_drains_buffer(recorder):
+    for block_number in range(12):
+        log(recorder, block_number)
+
+    recorder.force_to_flush()
+
+    service = recorder._service
+    assert len(recorder._log_buffer) == 0
+    assert recorder._dropped == 0
+    # Records are written in batches of LOG_BUFFER_SIZE, oldest first, the two logged while full are dropped
+    assert service.copies == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert service.commits == service.released == 3
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_records_are_ignored_without_service(recorder):
+    recorder._service = None
+    log(recorder, 1)
+    recorder.force_to_flush()
+    assert len(recorder._log_buffer) == 0
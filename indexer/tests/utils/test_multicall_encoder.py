@@ -0,0 +1,80 @@
+import pytest
+
+from indexer.utils.multicall_hemera.encoder import (
+    decode_try_aggregate_result,
+    encode_aggregate_calls,
+    encode_static_args,
+    static_layout,
+)
+
+TRY_BLOCK_AND_AGGREGATE = bytes.fromhex("399542e9")
+BALANCE_OF = bytes.fromhex("70a08231")
+TOKEN = "0x" + "11" * 20
+HOLDER = "0x" + "22" * 20
+OTHER_TOKEN = "0x" + "33" * 20
+
+
+def word(value):
+    return value.to_bytes(32, "big")
+
+
+def padded_address(address):
+    return bytes(12) + bytes.fromhex(address[2:])
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_encode_try_block_and_aggregate_calls():
+    balance_call = encode_static_args(BALANCE_OF, static_layout(["address"]), [HOLDER])
+    assert balance_call == BALANCE_OF + padded_address(HOLDER)
+
+    decimals_call = bytes.fromhex("313ce567")
+    calls = [(TOKEN, balance_call), (OTHER_TOKEN, decimals_call)]
+    calldata = encode_aggregate_calls(TRY_BLOCK_AND_AGGREGATE, calls, False)
+
+    assert calldata == (
+        TRY_BLOCK_AND_AGGREGATE
+        + word(0)  # require success
+        + word(0x40)  # offset of the calls
+        + word(2)  # number of calls
+        + word(0x40)  # offset of the first call
+        + word(0xE0)  # offset of the second call
+        + padded_address(TOKEN)
+        + word(0x40)
+        + word(36)
+        + balance_call
+        + bytes(28)
+        + padded_address(OTHER_TOKEN)
+        + word(0x40)
+        + word(4)
+        + decimals_call
+        + bytes(28)
+    )
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_decode_try_block_and_aggregate_result():
+    result = (
+        word(100)  # block number
+        + word(0)  # block hash
+        + word(0x60)  # offset of the results
+        + word(2)
+        + word(0x40)
+        + word(0xC0)
+        + word(1)
+        + word(0x40)
+        + word(32)
+        + word(5)
+        + word(0)
+        + word(0x40)
+        + word(0)
+    )
+
+    block_number, block_hash, outputs = decode_try_aggregate_result(result)
+    assert block_number == 100
+    assert block_hash == bytes(32)
+    assert outputs == [(True, word(5)), (False, b"")]
+
+    with pytest.raises(ValueError):
+        decode_try_aggregate_result(result[:-64])
@@ -0,0 +1,132 @@
+from concurrent.futures import Future
+
+import orjson
+import pytest
+
+from indexer.utils.eth_call_cache import EthCallCache
+from indexer.utils.multicall_hemera.planner import MulticallPlanner
+from indexer.utils.multicall_hemera.util import make_request_concurrent
+
+MAINNET_CHAIN_ID = 1
+POOL = "0x" + "11" * 20
+TOKEN = "0x" + "22" * 20
+HOLDER = "0x" + "33" * 20
+
+
+def word(value):
+    return value.to_bytes(32, "big")
+
+
+class FakeProvider:
+    """Answers every aggregated call with 42 and every plain eth_call with 7."""
+
+    def __init__(self):
+        self.batches = []
+
+    def make_request(self, method=None, params=None):
+        requests = orjson.loads(params)
+        self.batches.append(requests)
+        return [{"jsonrpc": "2.0", "id": request["id"], "result": self.answer(request)} for request in requests]
+
+    @staticmethod
+    def answer(request):
+        data = bytes.fromhex(request["params"][0]["data"][2:])
+        if request["params"][0]["to"].lower() != "0xca11bde05977b3631167028862be2a173976ca11":
+            return "0x" + word(7).hex()
+        count = int.from_bytes(data[4 + 64 : 4 + 96], "big")
+        result = word(int(request["params"][1], 16)) + word(0) + word(0x60) + word(count)
+        result += b"".join(word(32 * count + i * 128) for i in range(count))
+        result += (word(1) + word(0x40) + word(32) + word(42)) * count
+        return "0x" + result.hex()
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_multicall_planner_packs_calls_by_block():
+    provider = FakeProvider()
+    planner = MulticallPlanner(provider.make_request, MAINNET_CHAIN_ID, max_workers=1)
+
+    # calls of two jobs at the same block share one aggregate, calls before Multicall3 are sent as eth_call
+    token0 = planner.submit(POOL, "token0()(address)", block_id=20000000)
+    slot0 = planner.submit(POOL, "slot0()(uint160,int24,uint16,uint16,uint16,uint8,bool)", block_id=20000000)
+    balance = planner.submit(TOKEN, "balanceOf(address)(uint256)", [HOLDER], block_id=20000000)
+    early = planner.submit(TOKEN, "balanceOf(address)(uint256)", [HOLDER], block_id=100)
+    assert len(planner) == 4
+
+    assert balance.result() == 42
+    assert len(planner) == 0
+    assert token0.done() and slot0.done() and early.done()
+    assert early.result() == 7
+    assert token0.result() == "0x" + "00" * 19 + "2a"
+
+    aggregates = [request for batch in provider.batches for request in batch if request["params"][1] == "0x1312d00"]
+    assert len(aggregates) == 1
+    assert aggregates[0]["params"][0]["data"].startswith("0x399542e9")
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_multicall_planner_resolves_cached_calls_on_submit():
+    provider = FakeProvider()
+    call_cache = EthCallCache()
+    planner = MulticallPlanner(provider.make_request, MAINNET_CHAIN_ID, max_workers=1, call_cache=call_cache)
+
+    token0 = planner.submit(POOL, "token0()(address)", block_id=20000000)
+    balance = planner.submit(TOKEN, "balanceOf(address)(uint256)", [HOLDER], block_id=20000000)
+    early = planner.submit(TOKEN, "balanceOf(address)(uint256)", [HOLDER], block_id=100)
+    assert balance.result() == 42 and early.result() == 7
+    # The early call falls behind the block window of the cache
+    assert len(call_cache) == 2
+    requests = len(provider.batches)
+
+    # Results packed into the aggregate are cached per sub-call, token0 whatever its block
+    cached = [
+        planner.submit(POOL, "token0()(address)", block_id=20000001),
+        planner.submit(TOKEN, "balanceOf(address)(uint256)", [HOLDER], block_id=20000000),
+    ]
+    assert all(planned.done() for planned in cached)
+    assert len(planner) == 0
+    assert [planned.result() for planned in cached] == [token0.result(), 42]
+    assert len(provider.batches) == requests
+
+
+class SubmittingProvider:
+    """Sends nothing until every submitted request is awaited, as a blocking make_request would deadlock."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit_request(self, method=None, params=None):
+        future = Future()
+        self.submitted.append((future, orjson.loads(params)))
+        if len(self.submitted) == 3:
+            for submitted, requests in self.submitted:
+                submitted.set_result([{"id": request["id"], "result": hex(request["id"])} for request in requests])
+        return future
+
+    def make_request(self, method=None, params=None):
+        raise AssertionError("Requests should be submitted")
+
+
+class WrappingProvider:
+    def __init__(self, provider):
+        self._provider = provider
+
+    def __getattr__(self, name):
+        return getattr(self._provider, name)
+
+    def make_request(self, method=None, params=None):
+        return [{"id": request["id"], "result": "0x0"} for request in orjson.loads(params)]
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_make_request_concurrent_submits_every_chunk():
+    chunks = [([{"id": i}], None) for i in range(3)]
+    provider = SubmittingProvider()
+    responses = make_request_concurrent(provider.make_request, chunks, max_workers=1)
+    assert [response[0]["result"] for response in responses] == ["0x0", "0x1", "0x2"]
+
+    # Wrappers forwarding submit_request to the provider they wrap are called through make_request
+    responses = make_request_concurrent(WrappingProvider(provider).make_request, chunks, max_workers=1)
+    assert [response[0]["result"] for response in responses] == ["0x0", "0x0", "0x0"]
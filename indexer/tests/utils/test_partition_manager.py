@@ -0,0 +1,104 @@
+import pytest
+
+from common.models.logs import Logs
+from common.models.transactions import Transactions
+from indexer.utils.partition_manager import (
+    _partitioned_tables,
+    conflict_columns,
+    partition_boundary,
+    partition_existing_tables,
+    partitioned_models,
+    sql_convert_to_partitioned_statements,
+    sql_create_partition_statement,
+)
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_partition_boundaries():
+    assert partition_boundary(None, 1000) == 1000
+    assert partition_boundary(0, 1000) == 1000
+    assert partition_boundary(999, 1000) == 1000
+    assert partition_boundary(1000, 1000) == 2000
+
+    assert sql_create_partition_statement(Logs, 2000, 3000, 1000) == (
+        "CREATE TABLE IF NOT EXISTS public.logs_partition_000002 PARTITION OF public.logs "
+        "FOR VALUES FROM (2000) TO (3000)"
+    )
+    assert Logs in partitioned_models()
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_partitioned_tables_conflict_on_partition_column():
+    assert conflict_columns(Transactions) == ["hash"]
+    _partitioned_tables.add(Transactions.__tablename__)
+    try:
+        assert conflict_columns(Transactions) == ["hash", "block_number"]
+    finally:
+        _partitioned_tables.discard(Transactions.__tablename__)
+
+    statements = sql_convert_to_partitioned_statements(Transactions, 5000, "transactions_pkey", ["transactions_index"])
+    assert statements[0] == "ALTER TABLE public.transactions RENAME TO transactions_partition_000000"
+    assert "ALTER TABLE public.transactions ADD PRIMARY KEY (hash, block_number)" in statements
+    assert statements[-1] == (
+        "ALTER TABLE public.transactions ATTACH PARTITION public.transactions_partition_000000 "
+        "FOR VALUES FROM (0) TO (5000)"
+    )
+
+
+class FakeCursor:
+    """Reports every table but transactions as partitioned, with rows of transactions up to block 4321."""
+
+    def __init__(self, statements):
+        self.statements = statements
+        self.row = None
+
+    def execute(self, statement):
+        self.statements.append(statement)
+        if "pg_partitioned_table" in statement:
+            self.row = None if "'transactions'" in statement else (1,)
+        elif "contype = 'p'" in statement:
+            self.row = ("transactions_pkey",)
+        elif statement.startswith("SELECT max("):
+            self.row = (4321,)
+
+    def fetchone(self):
+        return self.row
+
+    def fetchall(self):
+        return [("transactions_index",)]
+
+
+class FakeService:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    def get_conn(self):
+        return self
+
+    def release_conn(self, conn):
+        pass
+
+    def cursor(self):
+        return FakeCursor(self.statements)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_partition_existing_tables_converts_unpartitioned_tables():
+    service = FakeService()
+    assert partition_existing_tables(service, 1000) == [Transactions]
+    assert service.commits == 1
+    assert service.statements[-1] == (
+        "ALTER TABLE public.transactions ATTACH PARTITION public.transactions_partition_000000 "
+        "FOR VALUES FROM (0) TO (5000)"
+    )
+    assert not any(statement.startswith("ALTER TABLE public.logs") for statement in service.statements)
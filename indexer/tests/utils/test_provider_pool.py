@@ -0,0 +1,117 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from indexer.utils.provider_pool import COOLDOWN_ERRORS, MIN_HEDGE_SAMPLES, PooledBatchProvider, ProviderPool
+
+
+class FakeProvider:
+    def __init__(self, uri, delay=0, fail=False):
+        self.endpoint_uri = uri
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+
+    def make_request(self, method=None, params=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError(self.endpoint_uri)
+        if b"eth_blockNumber" in params:
+            return {"jsonrpc": "2.0", "id": 1, "result": "0x10"}
+        return [{"jsonrpc": "2.0", "id": 1, "result": self.endpoint_uri}]
+
+
+class FakeAsyncProvider(FakeProvider):
+    """Sends submitted requests from its own threads, as an asynchronous transport does from its event loop."""
+
+    executor = ThreadPoolExecutor(max_workers=4)
+
+    def submit_request(self, method=None, params=None):
+        return self.executor.submit(self.make_request, params=params)
+
+
+def create_pool(providers, hedge_percentile=0):
+    pool = ProviderPool(list(providers), lambda uri: providers[uri], hedge_percentile)
+    return pool, PooledBatchProvider(pool, lambda uri: providers[uri])
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_failed_endpoint_is_retried_elsewhere_and_ranked_last():
+    providers = {"http://a": FakeProvider("http://a", fail=True), "http://b": FakeProvider("http://b")}
+    pool, provider = create_pool(providers)
+
+    for _ in range(3):
+        assert provider.make_request(params=b"[]")[0]["result"] == "http://b"
+
+    assert pool.endpoints[0].errors == 1
+    assert [endpoint.uri for endpoint in pool.ranked()] == ["http://b", "http://a"]
+    assert provider.endpoint_uri == "http://b"
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_failing_endpoint_cools_down():
+    providers = {"http://a": FakeProvider("http://a"), "http://b": FakeProvider("http://b")}
+    pool, provider = create_pool(providers)
+    a, b = pool.endpoints
+    b.start()
+    b.record_success(1)
+
+    # An endpoint that only failed ranks behind a slow endpoint
+    a.start()
+    a.record_error()
+    assert a.score() > b.score()
+
+    a.start()
+    a.record_success(0.01)
+    assert pool.ranked()[0] is a
+
+    for _ in range(COOLDOWN_ERRORS):
+        a.start()
+        a.record_error()
+    assert a.cooling_down()
+    assert pool.ranked()[0] is b
+
+    a.start()
+    a.record_success(0.01)
+    assert not a.cooling_down()
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_slow_request_is_hedged_to_next_endpoint():
+    providers = {"http://a": FakeAsyncProvider("http://a"), "http://b": FakeAsyncProvider("http://b")}
+    pool, provider = create_pool(providers, hedge_percentile=95)
+    a, b = pool.endpoints
+    for _ in range(MIN_HEDGE_SAMPLES):
+        a.start()
+        a.record_success(0.01)
+    b.start()
+    b.record_success(0.02)
+
+    providers["http://a"].delay = 1
+    start_time = time.time()
+    assert provider.make_request(params=b"[]")[0]["result"] == "http://b"
+    assert time.time() - start_time < 0.5
+    pool.executor.shutdown(wait=True)
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_blocking_providers_are_not_hedged():
+    providers = {"http://a": FakeProvider("http://a"), "http://b": FakeProvider("http://b")}
+    pool, provider = create_pool(providers, hedge_percentile=95)
+    a, b = pool.endpoints
+    for _ in range(MIN_HEDGE_SAMPLES):
+        a.start()
+        a.record_success(0.01)
+    b.start()
+    b.record_success(0.02)
+
+    providers["http://a"].delay = 0.2
+    assert provider.make_request(params=b"[]")[0]["result"] == "http://a"
+    assert b.inflight == 0
+    pool.executor.shutdown(wait=True)
@@ -0,0 +1,118 @@
+import pytest
+from psycopg2.extras import Json
+
+from common.converter.pg_converter import domain_model_mapping
+from common.models import convert_rows, general_converter
+from indexer.domain.log import Log
+from indexer.domain.token_balance import TokenBalance
+from indexer.domain.token_id_infos import ERC721TokenIdDetail
+from indexer.domain.transaction import Transaction
+
+ADDRESS = "0x" + "11" * 20
+
+
+def word(value):
+    return "0x" + f"{value:064x}"
+
+
+def logs():
+    return [
+        Log(
+            log_index=index,
+            address=ADDRESS,
+            data="0x" if index else word(7),
+            transaction_hash=word(index),
+            transaction_index=0,
+            block_timestamp=1714566615,
+            block_number=20000000,
+            block_hash=word(20000000),
+            topic0=word(1),
+            topic1=word(2) if index else None,
+        )
+        for index in range(3)
+    ]
+
+
+def transactions():
+    return [
+        Transaction(
+            hash=word(index),
+            nonce=index,
+            transaction_index=index,
+            from_address=ADDRESS,
+            to_address=ADDRESS if index else None,
+            value=10**30 * index,
+            gas_price=1,
+            gas=21000,
+            transaction_type=3 if index else None,
+            input="0x",
+            block_number=20000000,
+            block_timestamp=1714566615,
+            block_hash=word(20000000),
+            blob_versioned_hashes=[word(index)] if index else [],
+            max_fee_per_gas=None if index else 2,
+        )
+        for index in range(3)
+    ]
+
+
+def token_balances():
+    return [
+        TokenBalance(
+            address=ADDRESS,
+            token_id=index,
+            token_type="ERC1155",
+            token_address="0x" + "22" * 20,
+            balance=index * 10**18,
+            block_number=20000000 + index,
+            block_timestamp=1714566615 + index,
+        )
+        for index in range(3)
+    ]
+
+
+def token_id_details():
+    return [
+        ERC721TokenIdDetail(
+            token_address=ADDRESS,
+            token_id=index,
+            token_uri="ipfs://token" if index else None,
+            block_number=20000000,
+            block_timestamp=1714566615,
+            token_uri_info={"name": f"Token #{index}", "attributes": [index]} if index else None,
+        )
+        for index in range(3)
+    ]
+
+
+def comparable(value):
+    return ("json", value.adapted) if isinstance(value, Json) else value
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+@pytest.mark.parametrize("is_update", [False, True])
+@pytest.mark.parametrize("build_items", [logs, transactions, token_balances, token_id_details])
+def test_convert_rows_matches_general_converter(build_items, is_update):
+    items = build_items()
+    table = domain_model_mapping[type(items[0]).__name__]["table"]
+
+    columns, rows = convert_rows(table, items, is_update)
+
+    for item, row in zip(items, rows):
+        expected = general_converter(table, item, is_update)
+        assert sorted(columns) == sorted(expected.keys())
+        # Update times are taken once per batch by convert_rows, once per item by general_converter
+        converted = {column: value for column, value in zip(columns, row) if column != "update_time"}
+        assert {key: comparable(value) for key, value in converted.items()} == {
+            key: comparable(value) for key, value in expected.items() if key != "update_time"
+        }
+    assert len(rows) == len(items)
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_convert_rows_rejects_domains_with_different_attributes():
+    items = logs()
+    items[1].extra = "not a column"
+    assert convert_rows(domain_model_mapping["Log"]["table"], items) is None
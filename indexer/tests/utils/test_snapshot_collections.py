@@ -0,0 +1,19 @@
+from collections import namedtuple
+
+import pytest
+
+from indexer.utils.utils import snapshot_collections_by_group
+
+Record = namedtuple("Record", ["address", "block_number"])
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_snapshot_collections_by_group():
+    records = [Record("0x1", 99), Record("0x1", 101), Record("0x1", 150), Record("0x2", 120), Record("0x1", 201)]
+
+    latest = snapshot_collections_by_group(records, ["address"], 0)
+    assert sorted(latest) == [Record("0x1", 201), Record("0x2", 120)]
+
+    snapshots = snapshot_collections_by_group(records, ["address"], 100)
+    assert sorted(snapshots) == [Record("0x1", 99), Record("0x1", 150), Record("0x1", 201), Record("0x2", 120)]
@@ -0,0 +1,62 @@
+import pytest
+
+from indexer.aggr_jobs.utils import read_sync_record_from_file
+from indexer.utils.sync_recorder import CoalescingRecorder, FileSyncRecorder
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_file_sync_recorder_records_job_progress(tmp_path):
+    file_name = str(tmp_path / "sync_record")
+    with open(file_name, "w") as f:
+        f.write("100\n")
+
+    recorder = FileSyncRecorder(file_name)
+    assert recorder.get_last_synced_block() == 100
+    assert recorder.get_job_progress() == {}
+
+    recorder.track_jobs(["ExportBlocksJob", "ExportTracesJob"])
+    recorder.set_last_synced_block(120)
+    recorder.track_jobs(["ExportBlocksJob"])
+    recorder.set_last_synced_block(150)
+
+    restarted = FileSyncRecorder(file_name)
+    assert restarted.get_last_synced_block() == 150
+    assert restarted.get_job_progress() == {"ExportBlocksJob": 150, "ExportTracesJob": 120}
+    restarted.track_jobs(["ExportBlocksJob", "ExportTracesJob", "ExportContractsJob"])
+    assert restarted.get_resume_block() == 120
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_aggregates_read_file_record_with_job_progress(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("sync_record", "w") as f:
+        f.write("100\n")
+    assert read_sync_record_from_file() == 100
+
+    recorder = FileSyncRecorder("sync_record")
+    recorder.track_jobs(["ExportBlocksJob"])
+    recorder.set_last_synced_block(120)
+    assert read_sync_record_from_file() == 120
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_coalescing_recorder_writes_every_n_ranges(tmp_path):
+    file_name = str(tmp_path / "sync_record")
+    inner = FileSyncRecorder(file_name)
+    recorder = CoalescingRecorder(inner, flush_ranges=3)
+    assert recorder.get_last_synced_block() == 0
+
+    recorder.set_last_synced_block(10)
+    recorder.set_last_synced_block(20)
+    assert recorder.get_last_synced_block() == 20
+    assert inner.get_last_synced_block() == 0
+
+    recorder.set_last_synced_block(30)
+    assert inner.get_last_synced_block() == 30
+
+    recorder.set_last_synced_block(40)
+    recorder.flush()
+    assert inner.get_last_synced_block() == 40
@@ -0,0 +1,86 @@
+import pytest
+
+from indexer.domain.token_transfer import ERC20TokenTransfer, ERC1155TokenTransfer
+from indexer.utils.token_balance_ledger import TokenBalanceLedger
+from indexer.utils.utils import ZERO_ADDRESS
+
+TOKEN = "0x00000000000000000000000000000000000000aa"
+ALICE = "0x0000000000000000000000000000000000000001"
+BOB = "0x0000000000000000000000000000000000000002"
+
+
+def erc20_transfer(from_address, to_address, value, block_number, log_index=0, token_address=TOKEN):
+    return ERC20TokenTransfer(
+        transaction_hash="0x",
+        log_index=log_index,
+        from_address=from_address,
+        to_address=to_address,
+        value=value,
+        token_type="ERC20",
+        token_address=token_address,
+        block_number=block_number,
+        block_hash="0x",
+        block_timestamp=block_number,
+    )
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_token_balance_ledger_applies_transfers():
+    ledger = TokenBalanceLedger()
+    transfers = [
+        erc20_transfer(ALICE, BOB, 30, 11, log_index=1),
+        erc20_transfer(ZERO_ADDRESS, ALICE, 100, 10),
+        erc20_transfer(ALICE, BOB, 20, 11, log_index=2),
+    ]
+    ledger.start_range(10)
+    keys = ledger.holder_keys(transfers)
+    assert sorted(ledger.missing_keys(keys)) == [(TOKEN, ALICE, None), (TOKEN, BOB, None)]
+    ledger.seed({(TOKEN, ALICE, None): 5, (TOKEN, BOB, None): 0})
+
+    balances, failed_tokens = ledger.apply(transfers, 11)
+    assert failed_tokens == set()
+    assert balances == {
+        ((TOKEN, ALICE, None), 10): 105,
+        ((TOKEN, ALICE, None), 11): 55,
+        ((TOKEN, BOB, None), 11): 50,
+    }
+
+    ledger.start_range(12)
+    assert ledger.get((TOKEN, BOB, None)) == 50
+    ledger.start_range(20)
+    assert len(ledger) == 0
+
+    # A fork clears the ledger even when the next range follows the synced block
+    ledger.seed({(TOKEN, BOB, None): 50})
+    ledger.apply([], 20)
+    ledger.clear()
+    ledger.start_range(21)
+    assert len(ledger) == 0
+    assert ledger.missing_keys({(TOKEN, BOB, None): "ERC20"}) == [(TOKEN, BOB, None)]
+
+
+@pytest.mark.indexer
+@pytest.mark.indexer_utils
+def test_token_balance_ledger_distrusts_negative_balances():
+    ledger = TokenBalanceLedger()
+    transfer = ERC1155TokenTransfer(
+        transaction_hash="0x",
+        log_index=0,
+        from_address=BOB,
+        to_address=ALICE,
+        token_id=7,
+        value=3,
+        token_type="ERC1155",
+        token_address=TOKEN,
+        block_number=10,
+        block_hash="0x",
+        block_timestamp=10,
+    )
+    ledger.seed({(TOKEN, BOB, 7): 1, (TOKEN, ALICE, 7): 0})
+
+    balances, failed_tokens = ledger.apply([transfer], 10)
+    assert balances == {}
+    assert failed_tokens == {TOKEN}
+    assert TOKEN in ledger.untrusted_tokens
+    assert len(ledger) == 0
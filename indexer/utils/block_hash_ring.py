@@ -0,0 +1,99 @@
+import os
+import threading
+from collections import OrderedDict
+
+import orjson
+
+DEFAULT_RING_SIZE = 256
+
+
+class BlockHashRing:
+    """
+    Keeps (number, hash, parent_hash) of the last "capacity" synced blocks in memory, so a new batch of blocks
+    can be checked against the chain already synced, and the common ancestor of a fork found, without reading
+    the blocks table. When "file_name" is given the ring is saved there after every change and loaded on start.
+    """
+
+    def __init__(self, capacity=DEFAULT_RING_SIZE, file_name=None):
+        self.capacity = capacity
+        self.file_name = file_name
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        if file_name is not None and os.path.isfile(file_name):
+            self._load()
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def get(self, number):
+        """Returns (hash, parent_hash) of the block, or None if it is not in the ring."""
+        return self._blocks.get(number)
+
+    def numbers(self):
+        return list(self._blocks.keys())
+
+    def first_mismatch(self, blocks):
+        """
+        Returns the first block, in ascending order, whose parent hash does not match the block before it,
+        from the ring or the given blocks, or None if they all chain.
+        """
+        previous = None
+        for block in sorted(blocks, key=lambda x: x.number):
+            if previous is not None and previous.number == block.number - 1:
+                parent_hash = previous.hash
+            else:
+                parent = self._blocks.get(block.number - 1)
+                parent_hash = parent[0] if parent is not None else None
+            if parent_hash is not None and block.parent_hash != parent_hash:
+                return block
+            previous = block
+        return None
+
+    def common_ancestor(self, chain_hashes):
+        """
+        Returns the number of the highest block of the ring whose hash matches chain_hashes {number: hash},
+        or None if none of them does.
+        """
+        for number in reversed(self._blocks.keys()):
+            chain_hash = chain_hashes.get(number)
+            if chain_hash is not None and chain_hash == self._blocks[number][0]:
+                return number
+        return None
+
+    def extend(self, blocks):
+        """Adds the given (number, hash, parent_hash) entries, replacing the ones of the same numbers and above."""
+        entries = sorted(blocks, key=lambda x: x[0])
+        if not entries:
+            return
+        with self._lock:
+            self._truncate(entries[0][0] - 1)
+            for number, block_hash, parent_hash in entries:
+                self._blocks[number] = (block_hash, parent_hash)
+            while len(self._blocks) > self.capacity:
+                self._blocks.popitem(last=False)
+            self._save()
+
+    def rewind(self, number):
+        """Drops every block above the given number."""
+        with self._lock:
+            self._truncate(number)
+            self._save()
+
+    def _truncate(self, number):
+        while self._blocks and next(reversed(self._blocks)) > number:
+            self._blocks.popitem(last=True)
+
+    def _load(self):
+        with open(self.file_name, "rb") as f:
+            entries = orjson.loads(f.read() or b"[]")
+        for number, block_hash, parent_hash in entries[-self.capacity :]:
+            self._blocks[number] = (block_hash, parent_hash)
+
+    def _save(self):
+        if self.file_name is None:
+            return
+        # Written aside and renamed, a crash never leaves a partial ring behind
+        temp_file_name = self.file_name + ".tmp"
+        with open(temp_file_name, "wb") as f:
+            f.write(orjson.dumps([[number, *entry] for number, entry in self._blocks.items()]))
+        os.replace(temp_file_name, self.file_name)
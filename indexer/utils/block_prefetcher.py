@@ -0,0 +1,165 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from indexer.executors.batch_work_executor import BatchWorkExecutor
+from indexer.jobs.export_blocks_job import blocks_rpc_requests
+from indexer.jobs.export_transactions_and_logs_job import receipt_rpc_requests
+
+DEFAULT_SAFE_DEPTH = 32
+
+logger = logging.getLogger(__name__)
+
+
+class BlockPrefetcher:
+    """
+    Fetches the blocks and receipts of upcoming block ranges in the background, so ExportBlocksJob and
+    ExportTransactionsAndLogsJob find them in memory when the scheduler reaches those ranges.
+
+    At most "max_ranges" ranges are cached or being fetched at once. Blocks closer than "safe_depth" to the
+    chain head are never prefetched, fetched blocks must chain by parent hash or the cache is dropped, and
+    receipts are only served to transactions of the same block hash, so a reorg can not leak stale data.
+    Anything missing from the cache is simply fetched by the jobs as before.
+    """
+
+    def __init__(
+        self,
+        batch_web3_provider,
+        batch_size,
+        max_workers,
+        max_ranges,
+        fetch_receipts=True,
+        safe_depth=DEFAULT_SAFE_DEPTH,
+    ):
+        self._batch_web3_provider = batch_web3_provider
+        self.fetch_receipts = fetch_receipts
+        self._is_batch = batch_size > 1
+        self.max_ranges = max_ranges
+        self.safe_depth = safe_depth
+        self._batch_work_executor = BatchWorkExecutor(batch_size, max_workers, job_name=self.__class__.__name__)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.__class__.__name__)
+        self._lock = threading.Lock()
+        self._ranges = deque()
+        self._prefetched_until = None
+        self._blocks = {}
+        self._receipts = {}
+        self._last_hash = None
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, start_block, steps, head_block):
+        """Schedules the ranges of "steps" blocks following start_block, up to head_block - safe_depth."""
+        limit_block = head_block - self.safe_depth
+        with self._lock:
+            if self._prefetched_until is not None and self._prefetched_until >= start_block:
+                start_block = self._prefetched_until + 1
+            while len(self._ranges) < self.max_ranges and start_block <= limit_block:
+                end_block = min(start_block + steps - 1, limit_block)
+                self._ranges.append((start_block, end_block))
+                self._prefetched_until = end_block
+                self._executor.submit(self._fetch_range, start_block, end_block)
+                start_block = end_block + 1
+
+    def _fetch_range(self, start_block, end_block):
+        fetched_blocks = {}
+        fetched_receipts = {}
+
+        def fetch_blocks(block_number_batch):
+            for block in blocks_rpc_requests(
+                self._batch_web3_provider.make_request, block_number_batch, self._is_batch
+            ):
+                fetched_blocks[int(block["number"], 16)] = block
+
+        def fetch_receipts(transaction_hashes):
+            for receipt in receipt_rpc_requests(
+                self._batch_web3_provider.make_request, transaction_hashes, self._is_batch
+            ):
+                fetched_receipts[receipt["transactionHash"]] = receipt
+
+        try:
+            self._batch_work_executor.execute(range(start_block, end_block + 1), fetch_blocks)
+            self._batch_work_executor.wait()
+            if self.fetch_receipts:
+                transaction_hashes = [
+                    transaction["hash"] for block in fetched_blocks.values() for transaction in block["transactions"]
+                ]
+                self._batch_work_executor.execute(transaction_hashes, fetch_receipts)
+                self._batch_work_executor.wait()
+        except Exception as e:
+            logger.warning(f"Failed to prefetch blocks [{start_block}, {end_block}], they will be fetched by jobs: {e}")
+            return
+
+        with self._lock:
+            if (start_block, end_block) not in self._ranges:
+                # Released or invalidated while fetching
+                return
+            for block_number in range(start_block, end_block + 1):
+                block = fetched_blocks.get(block_number)
+                if block is None:
+                    continue
+                if self._last_hash is not None and self._last_hash[0] == block_number - 1:
+                    if block["parentHash"] != self._last_hash[1]:
+                        logger.warning(f"Prefetched block {block_number} does not chain to its parent, dropping cache.")
+                        self._invalidate()
+                        return
+                self._last_hash = (block_number, block["hash"])
+                self._blocks[block_number] = block
+                self._receipts[block_number] = (
+                    block["hash"],
+                    {
+                        transaction["hash"]: fetched_receipts[transaction["hash"]]
+                        for transaction in block["transactions"]
+                        if transaction["hash"] in fetched_receipts
+                    },
+                )
+
+    def take_blocks(self, block_numbers):
+        """Returns {block_number: block rpc dict} of the given blocks found in the cache."""
+        with self._lock:
+            blocks = {
+                block_number: self._blocks.pop(block_number)
+                for block_number in block_numbers
+                if block_number in self._blocks
+            }
+        self.hits += len(blocks)
+        self.misses += len(block_numbers) - len(blocks)
+        return blocks
+
+    def take_receipts(self, transactions):
+        """Returns {transaction_hash: receipt rpc dict} of the given transactions found in the cache."""
+        receipts = {}
+        with self._lock:
+            for transaction in transactions:
+                block_hash, block_receipts = self._receipts.get(transaction.block_number, (None, None))
+                if block_hash == transaction.block_hash and transaction.hash in block_receipts:
+                    receipts[transaction.hash] = block_receipts.pop(transaction.hash)
+        return receipts
+
+    def release(self, end_block):
+        """Drops everything cached up to end_block, once the range has been processed."""
+        with self._lock:
+            while self._ranges and self._ranges[0][1] <= end_block:
+                self._ranges.popleft()
+            for block_number in [block_number for block_number in self._blocks if block_number <= end_block]:
+                del self._blocks[block_number]
+            for block_number in [block_number for block_number in self._receipts if block_number <= end_block]:
+                del self._receipts[block_number]
+
+    def invalidate(self):
+        with self._lock:
+            self._invalidate()
+
+    def _invalidate(self):
+        self._ranges.clear()
+        self._blocks.clear()
+        self._receipts.clear()
+        self._prefetched_until = None
+        self._last_hash = None
+
+    def metrics(self):
+        return {"ranges": len(self._ranges), "blocks": len(self._blocks), "hits": self.hits, "misses": self.misses}
+
+    def shutdown(self):
+        self.invalidate()
+        self._executor.shutdown(wait=True)
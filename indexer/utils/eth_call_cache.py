@@ -0,0 +1,265 @@
+import atexit
+import logging
+import os
+import threading
+from collections import OrderedDict, defaultdict
+
+import orjson
+
+from common.utils.file_utils import write_to_file_atomically
+
+DEFAULT_CACHE_SIZE = 100000
+DEFAULT_BLOCK_WINDOW = 128
+PERSIST_EVERY_ENTRIES = 1000
+
+# Selectors of calls whose results never change once the contract is deployed, on any contract implementing them
+IMMUTABLE_SELECTORS = {
+    "0x313ce567",  # decimals()
+    "0x0dfe1681",  # token0()
+    "0xd21220a7",  # token1()
+    "0xc45a0155",  # factory()
+}
+
+# Selectors which may be cached whatever their block when asked for, their results change on some contracts,
+# such as fees of dynamic fee pools or names of upgradeable tokens
+OPTIONAL_IMMUTABLE_SELECTORS = {
+    "name": "0x06fdde03",
+    "symbol": "0x95d89b41",
+    "fee": "0xddca3f43",
+    "tickSpacing": "0xd0c93a7c",
+}
+
+logger = logging.getLogger(__name__)
+
+
+def immutable_selectors(names):
+    """
+    Returns the default immutable selectors along with the given ones, names of OPTIONAL_IMMUTABLE_SELECTORS
+    or 0x prefixed selectors.
+    """
+    selectors = set(IMMUTABLE_SELECTORS)
+    for name in names:
+        if name.startswith("0x"):
+            selectors.add(name.lower())
+        elif name in OPTIONAL_IMMUTABLE_SELECTORS:
+            selectors.add(OPTIONAL_IMMUTABLE_SELECTORS[name])
+        else:
+            raise ValueError(
+                f"Unknown immutable call {name}, expected one of {', '.join(OPTIONAL_IMMUTABLE_SELECTORS)}"
+            )
+    return selectors
+
+
+def parse_block_number(block_id):
+    """Returns the block number of a block id, or None for tags like latest whose block is unknown."""
+    if isinstance(block_id, int):
+        return block_id
+    if isinstance(block_id, str) and block_id.startswith("0x"):
+        return int(block_id, 16)
+    return None
+
+
+class EthCallCache:
+    """
+    Results of eth_call shared by every job and thread. Calls of immutable (contract, selector) pairs are kept
+    once whatever the block they are made at, other calls are kept per block and dropped once they fall
+    "block_window" blocks behind the highest block seen. At most "max_size" results are kept, the least recently
+    used are dropped first. Immutable results can be persisted to a file or a redis:// uri and are loaded on start.
+    """
+
+    def __init__(
+        self,
+        max_size=DEFAULT_CACHE_SIZE,
+        block_window=DEFAULT_BLOCK_WINDOW,
+        immutable_selectors=IMMUTABLE_SELECTORS,
+        immutable_calls=(),
+        persist_uri=None,
+    ):
+        self.max_size = max_size
+        self.block_window = block_window
+        self.immutable_selectors = set(selector.lower() for selector in immutable_selectors)
+        self.immutable_calls = set((to.lower(), selector.lower()) for to, selector in immutable_calls)
+        self.persist_uri = persist_uri
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._block_keys = defaultdict(set)
+        self._max_block = None
+        self._unsaved = 0
+        self._redis = None
+        self._lock = threading.Lock()
+        if persist_uri:
+            self._load()
+            atexit.register(self.save)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def mark_immutable(self, to, selector):
+        self.immutable_calls.add((to.lower(), selector.lower()))
+
+    def is_immutable(self, to, data):
+        selector = data[:10].lower()
+        return selector in self.immutable_selectors or (to.lower(), selector) in self.immutable_calls
+
+    def cache_key(self, to, data, block_id):
+        """Returns the key of the call, or None when its result can not be cached."""
+        if not to or not data:
+            return None
+        if self.is_immutable(to, data):
+            return to.lower(), data.lower(), None
+        block_number = parse_block_number(block_id)
+        if block_number is None:
+            return None
+        return to.lower(), data.lower(), block_number
+
+    def get(self, key):
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return result
+
+    def put(self, key, result):
+        block_number = key[2]
+        if block_number is None and result == "0x":
+            # Empty results of immutable calls come from contracts not deployed yet at the block
+            return
+        with self._lock:
+            if block_number is not None:
+                if self._max_block is not None and block_number < self._max_block - self.block_window:
+                    return
+                self._block_keys[block_number].add(key)
+                self._advance(block_number)
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                evicted, _ = self._entries.popitem(last=False)
+                if evicted[2] is not None:
+                    self._block_keys[evicted[2]].discard(evicted)
+            if block_number is None:
+                self._unsaved += 1
+        if block_number is None and self._unsaved >= PERSIST_EVERY_ENTRIES:
+            self.save()
+
+    def _advance(self, block_number):
+        if self._max_block is not None and block_number <= self._max_block:
+            return
+        self._max_block = block_number
+        threshold = self._max_block - self.block_window
+        for evicted_block in [number for number in self._block_keys if number < threshold]:
+            for key in self._block_keys.pop(evicted_block):
+                self._entries.pop(key, None)
+
+    def immutable_entries(self):
+        with self._lock:
+            return [
+                [to, data, result] for (to, data, block_number), result in self._entries.items() if block_number is None
+            ]
+
+    def save(self):
+        if not self.persist_uri:
+            return
+        entries = self.immutable_entries()
+        self._unsaved = 0
+        try:
+            if self.persist_uri.startswith("redis"):
+                if entries:
+                    self._get_redis().hset(
+                        "eth_call_cache", mapping={f"{to}|{data}": result for to, data, result in entries}
+                    )
+            else:
+                write_to_file_atomically(self.persist_uri, orjson.dumps(entries).decode("utf-8"))
+        except Exception as e:
+            logger.warning(f"Saving eth_call cache to {self.persist_uri} failed: {e}")
+
+    def _load(self):
+        if self.persist_uri.startswith("redis"):
+            stored = self._get_redis().hgetall("eth_call_cache")
+            entries = [key.decode("utf-8").split("|") + [value.decode("utf-8")] for key, value in stored.items()]
+        elif os.path.isfile(self.persist_uri):
+            with open(self.persist_uri, "rb") as f:
+                entries = orjson.loads(f.read() or b"[]")
+        else:
+            entries = []
+        # Results of calls no longer treated as immutable are dropped
+        entries = [entry for entry in entries if self.is_immutable(entry[0], entry[1])]
+        for to, data, result in entries[-self.max_size :]:
+            self._entries[(to, data, None)] = result
+        logger.info(f"Loaded {len(entries)} eth_call results from {self.persist_uri}")
+
+    def _get_redis(self):
+        if self._redis is None:
+            from redis.client import Redis
+
+            self._redis = Redis.from_url(self.persist_uri)
+        return self._redis
+
+
+class CachedCallProvider:
+    """
+    Batch provider answering the eth_call requests of a batch from an EthCallCache, only the other requests
+    are sent to the wrapped provider. Responses keep the order of the requests.
+    """
+
+    def __init__(self, provider, call_cache: EthCallCache):
+        self._provider = provider
+        self._call_cache = call_cache
+
+    def __getattr__(self, name):
+        return getattr(self._provider, name)
+
+    def make_request(self, method=None, params=None):
+        if method is not None or params is None or b'"eth_call"' not in self._as_bytes(params):
+            return self._provider.make_request(method=method, params=params)
+
+        requests = orjson.loads(params)
+        is_batch = isinstance(requests, list)
+        requests = requests if is_batch else [requests]
+
+        responses = [None] * len(requests)
+        keys = [None] * len(requests)
+        pending = []
+        for i, request in enumerate(requests):
+            if request.get("method") == "eth_call":
+                call = request["params"][0]
+                keys[i] = self._call_cache.cache_key(
+                    call.get("to"), call.get("data") or call.get("input"), request["params"][1]
+                )
+            result = self._call_cache.get(keys[i]) if keys[i] is not None else None
+            if result is not None:
+                responses[i] = {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+            else:
+                pending.append(i)
+
+        if pending:
+            if len(pending) == len(requests):
+                sent = params
+            else:
+                sent = orjson.dumps([requests[i] for i in pending] if is_batch else requests[pending[0]])
+            received = self._provider.make_request(params=sent)
+            received = received if isinstance(received, list) else [received]
+            for i, response in zip(pending, self._order_responses(requests, pending, received)):
+                responses[i] = response
+                if keys[i] is not None and isinstance(response, dict) and response.get("result") is not None:
+                    self._call_cache.put(keys[i], response["result"])
+
+        return responses if is_batch else responses[0]
+
+    @staticmethod
+    def _order_responses(requests, pending, received):
+        # Responses are matched to the requests by id when ids are unique, by position otherwise
+        ids = [requests[i].get("id") for i in pending]
+        if len(set(ids)) != len(ids) or len(received) != len(pending):
+            return received
+        by_id = {response.get("id"): response for response in received if isinstance(response, dict)}
+        if len(by_id) != len(received):
+            return received
+        return [by_id.get(request_id) for request_id in ids]
+
+    @staticmethod
+    def _as_bytes(params):
+        return params.encode("utf-8") if isinstance(params, str) else params
@@ -1,14 +1,32 @@
+import atexit
+import logging
 import threading
-from queue import Queue
+from collections import deque
+from datetime import datetime
 
 from sqlalchemy.dialects.postgresql import insert
 
 from common.models.exception_records import ExceptionRecords
+from indexer.exporters.postgres_binary_copy import BinaryCopyEncoder, UnsupportedCopyValue
 
 LOG_BUFFER_SIZE = 5000
+MAX_BUFFER_SIZE = 100000
+FLUSH_INTERVAL_SECONDS = 5
+# Once the buffer is full, one of every OVERLOAD_SAMPLE_RATE new records replaces the oldest one, the rest are dropped
+OVERLOAD_SAMPLE_RATE = 100
+
+RECORD_COLUMNS = ["block_number", "dataclass", "level", "message_type", "message", "exception_env", "record_time"]
+
+logger = logging.getLogger(__name__)
 
 
 class ExceptionRecorder(object):
+    """
+    Buffers records in memory and writes them to postgres from a background thread, every
+    FLUSH_INTERVAL_SECONDS or as soon as LOG_BUFFER_SIZE records are buffered, so logging never waits on the database.
+    The buffer holds at most MAX_BUFFER_SIZE records, records logged while it is full are sampled.
+    """
+
     _instance = None
 
     _queue_lock = threading.Lock()
@@ -20,57 +38,104 @@ class ExceptionRecorder(object):
         return cls._instance
 
     def __init__(self):
+        # Every module creates the recorder, the shared instance is only set up once
+        if getattr(self, "_initialized", False):
+            return
+        self._initialized = True
         self._service = None
-        self._log_buffer = Queue()
-        self._multicall_log_buffer = Queue()
+        self._log_buffer = deque()
+        self._overflowed = 0
+        self._dropped = 0
+        self._flush_event = threading.Event()
+        self._flusher = None
 
     def init_pg_service(self, service):
         self._service = service
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name="ExceptionRecorderFlusher", daemon=True)
+            self._flusher.start()
+            atexit.register(self.force_to_flush)
 
     def log(self, block_number: int, dataclass: str, message_type: str, message: str, exception_env={}, level="Info"):
-        if self._service is not None:
-            self._log_buffer.put(
-                {
-                    "block_number": block_number,
-                    "dataclass": dataclass,
-                    "message_type": message_type,
-                    "message": message,
-                    "exception_env": exception_env,
-                    "level": level,
-                }
-            )
-            self._check_and_flush()
-
-    def force_to_flush(self):
-        if self._service is not None:
-            with self._queue_lock:
-                with self._flush_lock:
-                    # Double-check after acquiring flush lock
-                    logs = []
-                    while not self._log_buffer.empty():
-                        logs.append(self._log_buffer.get())
-                    self._flush_logs_to_db(logs)
+        if self._service is None:
+            return
 
-    def _check_and_flush(self):
-        if self._log_buffer.qsize() >= LOG_BUFFER_SIZE:
-            with self._queue_lock:
-                # Double-check after acquiring queue lock
-                if self._log_buffer.qsize() >= LOG_BUFFER_SIZE:
-                    with self._flush_lock:
-                        logs = []
-                        while not self._log_buffer.empty():
-                            logs.append(self._log_buffer.get())
-                        self._flush_logs_to_db(logs)
+        record = (block_number, dataclass, level, message_type, message, exception_env, datetime.utcnow())
+        with self._queue_lock:
+            if len(self._log_buffer) >= MAX_BUFFER_SIZE:
+                self._overflowed += 1
+                self._dropped += 1
+                if self._overflowed % OVERLOAD_SAMPLE_RATE != 0:
+                    return
+                self._log_buffer.popleft()
+            self._log_buffer.append(record)
+            buffered = len(self._log_buffer)
+
+        if buffered >= LOG_BUFFER_SIZE:
+            self._flush_event.set()
+
+    def force_to_flush(self, wait=True):
+        """Writes the buffered records. Without wait the background thread is only woken up to write them."""
+        if self._service is None:
+            return
+        if wait:
+            self._flush_buffer()
+        else:
+            self._flush_event.set()
+
+    def _flush_loop(self):
+        while True:
+            self._flush_event.wait(FLUSH_INTERVAL_SECONDS)
+            self._flush_event.clear()
+            try:
+                self._flush_buffer()
+            except Exception as e:
+                logger.exception(f"Flushing exception records failed: {e}")
+
+    def _flush_buffer(self):
+        with self._flush_lock:
+            while True:
+                with self._queue_lock:
+                    logs = [self._log_buffer.popleft() for _ in range(min(len(self._log_buffer), LOG_BUFFER_SIZE))]
+                    dropped, self._dropped = self._dropped, 0
+                if dropped:
+                    logger.warning(f"Exception recorder is overloaded, {dropped} records were dropped.")
+                if not logs:
+                    return
+                try:
+                    self._flush_logs_to_db(logs)
+                except Exception as e:
+                    logger.error(f"Writing {len(logs)} exception records failed, they are dropped: {e}")
 
     def _flush_logs_to_db(self, logs):
+        try:
+            copy_buffer = BinaryCopyEncoder(ExceptionRecords, RECORD_COLUMNS).encode(logs)
+        except UnsupportedCopyValue:
+            self._insert_logs(logs)
+            return
+
+        conn = self._service.get_conn()
+        try:
+            cur = conn.cursor()
+            cur.copy_expert(
+                "COPY {} ({}) FROM STDIN (FORMAT binary)".format(
+                    ExceptionRecords.__tablename__, ", ".join(RECORD_COLUMNS)
+                ),
+                copy_buffer,
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self._service.release_conn(conn)
+
+    def _insert_logs(self, logs):
         session = self._service.get_service_session()
 
         try:
-            statement = insert(ExceptionRecords).values(logs)
+            statement = insert(ExceptionRecords).values([dict(zip(RECORD_COLUMNS, log)) for log in logs])
             session.execute(statement)
             session.commit()
-        except Exception as e:
-            print(e)
-            raise e
         finally:
             session.close()
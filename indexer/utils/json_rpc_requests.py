@@ -29,6 +29,16 @@ def generate_get_receipt_json_rpc(transaction_hashes):
         )
 
 
+def generate_get_block_receipts_json_rpc(block_numbers):
+    for block_number in block_numbers:
+        yield generate_json_rpc(
+            method="eth_getBlockReceipts",
+            params=[hex(block_number)],
+            # save block_number in request ID, so later we can identify block number in response
+            request_id=block_number,
+        )
+
+
 def generate_get_code_json_rpc(contract_addresses, block="latest"):
     for idx, contract_address in enumerate(contract_addresses):
         yield generate_json_rpc(
@@ -1,11 +1,11 @@
+import itertools
 import logging
 from typing import Any, Callable, Iterable, List, Optional, Tuple, Union
 
-import orjson
 from eth_typing import Address, ChecksumAddress, HexAddress
 from eth_typing.abi import Decodable
-from eth_utils import to_checksum_address
 
+from indexer.utils.multicall_hemera.encoder import cached_checksum_address
 from indexer.utils.multicall_hemera.signature import Signature, _get_signature
 from indexer.utils.utils import format_block_id
 
@@ -13,6 +13,12 @@ logger = logging.getLogger(__name__)
 
 AnyAddress = Union[str, Address, ChecksumAddress, HexAddress]
 
+_request_ids = itertools.count(1)
+
+
+def next_request_id() -> int:
+    return next(_request_ids)
+
 
 class Call:
 
@@ -24,7 +30,7 @@ class Call:
         block_id: Union[Optional[int], str] = None,
         gas_limit: Optional[int] = None,
     ) -> None:
-        self.target = to_checksum_address(target)
+        self.target = cached_checksum_address(target)
         self.returns = returns
         self.block_id = block_id
         self.gas_limit = gas_limit
@@ -82,7 +88,7 @@ class Call:
             "jsonrpc": "2.0",
             "method": "eth_call",
             "params": args,
-            "id": abs(hash(orjson.dumps(args))),
+            "id": next_request_id(),
         }
 
 
@@ -0,0 +1,201 @@
+"""
+Fixed-offset encoding and decoding of multicall data.
+Calls whose arguments and outputs are all static 32 bytes words, such as balanceOf(address) or ownerOf(uint256),
+are spliced into preallocated buffers instead of going through eth_abi, and tryBlockAndAggregate calldata and
+results are laid out by hand as their ABI layout only depends on the length of each call data.
+"""
+
+import re
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple
+
+from eth_utils import to_checksum_address
+
+WORD_SIZE = 32
+
+_STATIC_TYPE_PATTERN = re.compile(r"^(address|bool|uint(\d*)|int(\d*)|bytes(\d+))$")
+
+CallResult = Tuple[bool, bytes]
+
+
+@lru_cache(maxsize=1000000)
+def cached_checksum_address(address: str) -> str:
+    return to_checksum_address(address)
+
+
+@lru_cache(maxsize=None)
+def parse_static_type(type_str: str) -> Optional[Tuple[str, int]]:
+    """
+    Returns (kind, bits) of a type encoded in a single word, bits being the size of uint, int and bytesN values.
+    Returns None for dynamic types, tuples and arrays.
+    """
+    match = _STATIC_TYPE_PATTERN.match(type_str)
+    if match is None:
+        return None
+    if type_str == "address":
+        return "address", 160
+    if type_str == "bool":
+        return "bool", 8
+    if type_str.startswith("uint"):
+        bits = int(match.group(2) or 256)
+        return ("uint", bits) if 0 < bits <= 256 and bits % 8 == 0 else None
+    if type_str.startswith("int"):
+        bits = int(match.group(3) or 256)
+        return ("int", bits) if 0 < bits <= 256 and bits % 8 == 0 else None
+    size = int(match.group(4))
+    return ("bytes", size * 8) if 0 < size <= 32 else None
+
+
+def static_layout(types: Sequence[str]) -> Optional[Tuple[Tuple[str, int], ...]]:
+    """Returns the word layout of the types, or None when any of them is not a single static word."""
+    layout = tuple(parse_static_type(type_str) for type_str in types)
+    if any(word is None for word in layout):
+        return None
+    return layout
+
+
+def _address_bytes(value) -> bytes:
+    if isinstance(value, str):
+        raw = bytes.fromhex(value[2:] if value[:2] in ("0x", "0X") else value)
+    elif isinstance(value, (bytes, bytearray)):
+        raw = bytes(value)
+    else:
+        raise TypeError(f"Invalid address {value!r}")
+    if len(raw) != 20:
+        raise ValueError(f"Invalid address length {value!r}")
+    return raw
+
+
+def encode_static_args(selector: bytes, layout: Sequence[Tuple[str, int]], args: Sequence) -> bytes:
+    """
+    Encodes a call of single word arguments into a preallocated buffer.
+    Raises TypeError, ValueError or OverflowError for values not fitting their type, so callers can fall back
+    to eth_abi.
+    """
+    buffer = bytearray(4 + WORD_SIZE * len(layout))
+    buffer[:4] = selector
+    offset = 4
+    for (kind, bits), value in zip(layout, args):
+        if kind == "address":
+            buffer[offset + 12 : offset + WORD_SIZE] = _address_bytes(value)
+        elif kind == "uint":
+            if not isinstance(value, int) or isinstance(value, bool) or value < 0 or value.bit_length() > bits:
+                raise ValueError(f"Value {value!r} out of uint{bits} range")
+            buffer[offset : offset + WORD_SIZE] = value.to_bytes(WORD_SIZE, "big")
+        elif kind == "int":
+            if not isinstance(value, int) or isinstance(value, bool) or not -(1 << bits - 1) <= value < 1 << bits - 1:
+                raise ValueError(f"Value {value!r} out of int{bits} range")
+            buffer[offset : offset + WORD_SIZE] = value.to_bytes(WORD_SIZE, "big", signed=True)
+        elif kind == "bool":
+            if not isinstance(value, bool):
+                raise TypeError(f"Invalid bool {value!r}")
+            buffer[offset + WORD_SIZE - 1] = int(value)
+        else:
+            if not isinstance(value, (bytes, bytearray)) or len(value) > bits // 8:
+                raise ValueError(f"Value {value!r} does not fit bytes{bits // 8}")
+            buffer[offset : offset + len(value)] = value
+        offset += WORD_SIZE
+    return bytes(buffer)
+
+
+def decode_static_words(layout: Sequence[Tuple[str, int]], data: bytes) -> tuple:
+    """Decodes single word outputs at fixed offsets, checking paddings as eth_abi does."""
+    if len(data) < WORD_SIZE * len(layout):
+        raise ValueError(f"Expected at least {WORD_SIZE * len(layout)} bytes, got {len(data)}")
+    values = []
+    offset = 0
+    for kind, bits in layout:
+        word = data[offset : offset + WORD_SIZE]
+        if kind == "uint":
+            value = int.from_bytes(word, "big")
+            if value.bit_length() > bits:
+                raise ValueError(f"Padding bytes of uint{bits} are not empty")
+        elif kind == "address":
+            if any(word[:12]):
+                raise ValueError("Padding bytes of address are not empty")
+            value = "0x" + word[12:].hex()
+        elif kind == "bool":
+            value = int.from_bytes(word, "big")
+            if value > 1:
+                raise ValueError(f"Invalid bool value {value}")
+            value = bool(value)
+        elif kind == "int":
+            value = int.from_bytes(word, "big", signed=True)
+            if not -(1 << bits - 1) <= value < 1 << bits - 1:
+                raise ValueError(f"Padding bytes of int{bits} are not empty")
+        else:
+            size = bits // 8
+            if any(word[size:]):
+                raise ValueError(f"Padding bytes of bytes{size} are not empty")
+            value = bytes(word[:size])
+        values.append(value)
+        offset += WORD_SIZE
+    return tuple(values)
+
+
+def _padded_size(length: int) -> int:
+    return (length + WORD_SIZE - 1) // WORD_SIZE * WORD_SIZE
+
+
+def encode_aggregate_calls(
+    selector: bytes, calls: Sequence[Tuple[str, bytes]], require_success: Optional[bool] = None
+) -> bytes:
+    """
+    Encodes aggregate((address,bytes)[]) calldata, or tryBlockAndAggregate(bool,(address,bytes)[]) calldata when
+    require_success is given, from (target, call data) pairs.
+    """
+    head_words = 1 if require_success is None else 2
+    element_sizes = [3 * WORD_SIZE + _padded_size(len(data)) for _, data in calls]
+    array_start = 4 + head_words * WORD_SIZE
+    elements_start = array_start + WORD_SIZE
+    buffer = bytearray(elements_start + WORD_SIZE * len(calls) + sum(element_sizes))
+    buffer[:4] = selector
+
+    offset = 4
+    if require_success is not None:
+        buffer[offset + WORD_SIZE - 1] = int(bool(require_success))
+        offset += WORD_SIZE
+    buffer[offset : offset + WORD_SIZE] = (array_start - 4).to_bytes(WORD_SIZE, "big")
+    buffer[array_start:elements_start] = len(calls).to_bytes(WORD_SIZE, "big")
+
+    head = elements_start
+    element_offset = WORD_SIZE * len(calls)
+    for (target, data), element_size in zip(calls, element_sizes):
+        buffer[head : head + WORD_SIZE] = element_offset.to_bytes(WORD_SIZE, "big")
+        position = elements_start + element_offset
+        buffer[position + 12 : position + WORD_SIZE] = _address_bytes(target)
+        buffer[position + 2 * WORD_SIZE - 1] = 2 * WORD_SIZE
+        buffer[position + 2 * WORD_SIZE : position + 3 * WORD_SIZE] = len(data).to_bytes(WORD_SIZE, "big")
+        buffer[position + 3 * WORD_SIZE : position + 3 * WORD_SIZE + len(data)] = data
+        head += WORD_SIZE
+        element_offset += element_size
+    return bytes(buffer)
+
+
+def _read_word(data: bytes, offset: int) -> int:
+    if offset < 0 or offset + WORD_SIZE > len(data):
+        raise ValueError(f"Offset {offset} out of data of {len(data)} bytes")
+    return int.from_bytes(data[offset : offset + WORD_SIZE], "big")
+
+
+def decode_try_aggregate_result(data: bytes) -> Tuple[int, bytes, List[CallResult]]:
+    """
+    Decodes tryBlockAndAggregate results, (uint256 block number, bytes32 block hash, (bool,bytes)[] results),
+    following the offsets of the result rather than assuming their layout.
+    """
+    block_number = _read_word(data, 0)
+    block_hash = bytes(data[WORD_SIZE : 2 * WORD_SIZE])
+    array_start = _read_word(data, 2 * WORD_SIZE)
+    count = _read_word(data, array_start)
+    elements_start = array_start + WORD_SIZE
+
+    results = []
+    for i in range(count):
+        position = elements_start + _read_word(data, elements_start + i * WORD_SIZE)
+        success = _read_word(data, position) != 0
+        data_start = position + _read_word(data, position + WORD_SIZE)
+        length = _read_word(data, data_start)
+        if data_start + WORD_SIZE + length > len(data):
+            raise ValueError(f"Result {i} of {length} bytes out of data of {len(data)} bytes")
+        results.append((success, bytes(data[data_start + WORD_SIZE : data_start + WORD_SIZE + length])))
+    return block_number, block_hash, results
@@ -1,12 +1,12 @@
 import logging
 from typing import Any, List, Optional, Tuple, Union
 
-import orjson
-
 from indexer.utils.multicall_hemera import Call
-from indexer.utils.multicall_hemera.call import prep_args
+from indexer.utils.multicall_hemera.call import next_request_id
 from indexer.utils.multicall_hemera.constants import GAS_LIMIT, MULTICALL3_ADDRESSES, Network
+from indexer.utils.multicall_hemera.encoder import encode_aggregate_calls
 from indexer.utils.multicall_hemera.signature import _get_signature
+from indexer.utils.utils import format_block_id
 
 logger = logging.getLogger(__name__)
 CallResponse = Tuple[Union[None, bool], bytes]
@@ -61,14 +61,17 @@ class Multicall:
         )
 
     def to_rpc_param(self):
-        args = get_args(self.calls, self.require_success)
-        args = prep_args(
-            self.multicall_address, _get_signature(self.multicall_sig), args, self.block_id, hex(self.gas_limit)
+        call_data = encode_aggregate_calls(
+            _get_signature(self.multicall_sig).fourbyte,
+            [(call.target, call.data) for call in self.calls],
+            None if self.require_success is True else self.require_success,
         )
-        args[0]["data"] = "0x" + (args[0]["data"]).hex()
+        params = {"to": self.multicall_address, "data": "0x" + call_data.hex()}
+        if self.gas_limit:
+            params["gas"] = hex(self.gas_limit)
         return {
             "jsonrpc": "2.0",
             "method": "eth_call",
-            "params": args,
-            "id": abs(hash(orjson.dumps(args))),
+            "params": [params, format_block_id(self.block_id)],
+            "id": next_request_id(),
         }
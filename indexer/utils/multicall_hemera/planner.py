@@ -0,0 +1,206 @@
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from typing import Any, List, Optional, Union
+
+from common.utils.exception_control import RetriableError
+from indexer.utils.eth_call_cache import EthCallCache
+from indexer.utils.multicall_hemera.call import Call
+from indexer.utils.multicall_hemera.constants import GAS_LIMIT, MULTICALL3_ADDRESSES, Network
+from indexer.utils.multicall_hemera.encoder import decode_try_aggregate_result
+from indexer.utils.multicall_hemera.multi_call import Multicall
+from indexer.utils.multicall_hemera.util import make_request_concurrent, rebatch_by_size
+from indexer.utils.utils import rpc_response_to_result
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CALLS_PER_AGGREGATE = 500
+DEFAULT_MAX_REQUEST_SIZE = 1024 * 250
+
+
+class PlannedCall(Future):
+    """Future of a call submitted to a MulticallPlanner, asking for its result flushes the planner."""
+
+    def __init__(self, planner: "MulticallPlanner", call: Call):
+        super().__init__()
+        self._planner = planner
+        self.call = call
+        self.cache_key = None
+
+    def result(self, timeout=None):
+        if not self.done():
+            self._planner.flush()
+        return super().result(timeout)
+
+
+class MulticallPlanner:
+    """
+    Collects eth_call requests submitted by every job and sends them together. Calls are grouped by block across
+    jobs and packed into tryBlockAndAggregate requests of at most "max_calls" calls, which are rebatched by size
+    and sent concurrently. Calls before the deployment of Multicall3, on chains without it, or failing inside
+    the aggregate are sent as plain eth_call batches.
+    Results are decoded with the output types of the call signature, failed calls resolve to None.
+    With a call cache, calls found in it are resolved on submit and results of the other calls are cached,
+    including the results of calls packed into an aggregate.
+    """
+
+    def __init__(
+        self,
+        make_request,
+        chain_id: int,
+        batch_size: int = 100,
+        max_workers: Optional[int] = None,
+        max_calls: int = DEFAULT_MAX_CALLS_PER_AGGREGATE,
+        max_size: int = DEFAULT_MAX_REQUEST_SIZE,
+        call_cache: Optional[EthCallCache] = None,
+    ):
+        self._make_request = make_request
+        self.chain_id = chain_id
+        self.batch_size = max(batch_size, 1)
+        self.max_workers = max_workers
+        self.max_calls = max_calls
+        self.max_size = max_size
+        self.call_cache = call_cache
+        self._pending = []
+        self._lock = threading.Lock()
+        try:
+            network = Network.from_value(chain_id)
+        except ValueError:
+            network = None
+        self.is_multicall = network in MULTICALL3_ADDRESSES
+        self.deploy_block_number = network.deploy_block_number if self.is_multicall else None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def submit(
+        self,
+        target: str,
+        signature: str,
+        args: Optional[List[Any]] = None,
+        block_id: Union[Optional[int], str] = "latest",
+    ) -> PlannedCall:
+        """Plans a call such as submit(pool, "slot0()(uint160,int24,uint16,uint16,uint16,uint8,bool)", block_id=n)."""
+        call = Call(target, [signature, *args] if args else signature, block_id=block_id)
+        planned = PlannedCall(self, call)
+        if self.call_cache is not None:
+            planned.cache_key = self.call_cache.cache_key(call.target, "0x" + call.data.hex(), call.block_id)
+            result = self.call_cache.get(planned.cache_key) if planned.cache_key is not None else None
+            if result is not None:
+                planned.set_result(self._decode_result(planned, result))
+                return planned
+        with self._lock:
+            self._pending.append(planned)
+        return planned
+
+    def flush(self):
+        """Sends every pending call, including calls submitted by other jobs."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            self._send(pending)
+        except Exception as e:
+            for planned in pending:
+                if not planned.done():
+                    planned.set_exception(e)
+            raise
+
+    def _can_aggregate(self, block_id):
+        if not self.is_multicall:
+            return False
+        return not isinstance(block_id, int) or block_id >= self.deploy_block_number
+
+    def _send(self, pending: List[PlannedCall]):
+        by_block = defaultdict(list)
+        direct = []
+        for planned in pending:
+            if self._can_aggregate(planned.call.block_id):
+                by_block[planned.call.block_id].append(planned)
+            else:
+                direct.append(planned)
+
+        multicall_rpc = []
+        groups = []
+        for block_id, planned_calls in by_block.items():
+            for i in range(0, len(planned_calls), self.max_calls):
+                group = planned_calls[i : i + self.max_calls]
+                multicall_rpc.append(
+                    Multicall(
+                        [planned.call for planned in group],
+                        chain_id=self.chain_id,
+                        block_id=block_id,
+                        require_success=False,
+                        gas_limit=len(group) * GAS_LIMIT,
+                    ).to_rpc_param()
+                )
+                groups.append(group)
+
+        if multicall_rpc:
+            chunks = list(rebatch_by_size(multicall_rpc, groups, self.max_size))
+            logger.debug(f"MulticallPlanner packed {len(pending)} calls into {len(multicall_rpc)} aggregates")
+            responses = make_request_concurrent(self._make_request, chunks, self.max_workers)
+            for response_chunk, (_, chunk_groups) in zip(responses, chunks):
+                for group, response in zip(chunk_groups, response_chunk):
+                    direct.extend(self._resolve_aggregate(group, response))
+
+        if direct:
+            self._send_direct(direct)
+
+    def _resolve_aggregate(self, group: List[PlannedCall], response) -> List[PlannedCall]:
+        """Resolves the calls of an aggregate, returns the calls to send again as plain eth_call."""
+        result = response.get("result") if isinstance(response, dict) else None
+        if not result:
+            return group
+        try:
+            _, _, outputs = decode_try_aggregate_result(bytes.fromhex(result[2:]))
+        except ValueError as e:
+            logger.warning(f"Decoding tryBlockAndAggregate result failed: {e}")
+            return group
+        if len(outputs) != len(group):
+            return group
+
+        failed = []
+        for planned, (success, output) in zip(group, outputs):
+            if success:
+                self._cache_result(planned, "0x" + output.hex())
+                planned.set_result(Call.decode_output(output, planned.call.signature, None, success))
+            else:
+                failed.append(planned)
+        return failed
+
+    def _send_direct(self, direct: List[PlannedCall]):
+        chunks = []
+        for i in range(0, len(direct), self.batch_size):
+            batch = direct[i : i + self.batch_size]
+            chunks.append(([planned.call.to_rpc_param() for planned in batch], batch))
+        responses = make_request_concurrent(self._make_request, chunks, self.max_workers)
+
+        for response_chunk, (requests, batch) in zip(responses, chunks):
+            response_chunk = response_chunk if isinstance(response_chunk, list) else [response_chunk]
+            response_by_id = {response.get("id"): response for response in response_chunk}
+            for request, planned in zip(requests, batch):
+                response = response_by_id.get(request["id"])
+                if response is None:
+                    planned.set_exception(RetriableError(f"No response to eth_call {request['id']}"))
+                    continue
+                try:
+                    result = rpc_response_to_result(response)
+                except RetriableError as e:
+                    planned.set_exception(e)
+                    continue
+                if isinstance(result, str):
+                    self._cache_result(planned, result)
+                planned.set_result(self._decode_result(planned, result))
+
+    def _cache_result(self, planned: PlannedCall, result: str):
+        if planned.cache_key is not None:
+            self.call_cache.put(planned.cache_key, result)
+
+    @staticmethod
+    def _decode_result(planned: PlannedCall, result):
+        if isinstance(result, str) and result.startswith("0x") and len(result) > 2:
+            return Call.decode_output(bytes.fromhex(result[2:]), planned.call.signature, None, True)
+        return None
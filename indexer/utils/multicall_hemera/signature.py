@@ -6,7 +6,7 @@ from eth_typing.abi import Decodable, TypeStr
 from eth_utils import function_signature_to_4byte_selector
 from hexbytes import HexBytes
 
-from indexer.utils.abi import pad_address, uint256_to_bytes
+from indexer.utils.multicall_hemera.encoder import decode_static_words, encode_static_args, static_layout
 
 
 def parse_signature(signature: str) -> Tuple[str, List[TypeStr], List[TypeStr]]:
@@ -59,15 +59,18 @@ def _get_signature(signature: str) -> "Signature":
 
 
 class Signature:
-    __slots__ = "signature", "function", "input_types", "output_types"
+    __slots__ = "signature", "function", "input_types", "output_types", "_fourbyte", "_input_layout", "_output_layout"
 
     def __init__(self, signature: str) -> None:
         self.signature = signature
         self.function, self.input_types, self.output_types = parse_signature(signature)
+        self._fourbyte = function_signature_to_4byte_selector(self.function)
+        self._input_layout = static_layout(self.input_types)
+        self._output_layout = static_layout(self.output_types) if self.output_types else None
 
     @property
     def fourbyte(self) -> bytes:
-        return function_signature_to_4byte_selector(self.function)
+        return self._fourbyte
 
     def encode_data(self, args: Optional[List[Any]] = None) -> bytes:
         if args is None:
@@ -76,21 +79,16 @@ class Signature:
         if len(args) != len(self.input_types):
             raise ValueError(f"Expected {len(self.input_types)} arguments, got {len(args)}")
 
-        if len(args) > 2:
-            return self.fourbyte + encode(self.input_types, args)
+        if self._input_layout is not None:
+            try:
+                return encode_static_args(self._fourbyte, self._input_layout, args)
+            except (TypeError, ValueError, OverflowError):
+                # let eth_abi handle or reject values it accepts in other forms
+                pass
 
-        encoded = self.fourbyte
-
-        for arg, arg_type in zip(args, self.input_types):
-            if arg_type == "address":
-                encoded += pad_address(arg)
-            elif arg_type == "uint256":
-                encoded += uint256_to_bytes(arg)
-            else:
-                # cannot handle, call encode directly
-                return self.fourbyte + encode(self.input_types, args)
-
-        return encoded
+        return self._fourbyte + encode(self.input_types, args)
 
     def decode_data(self, output: Decodable) -> Any:
+        if self._output_layout is not None:
+            return decode_static_words(self._output_layout, output)
         return decode(self.output_types, output)
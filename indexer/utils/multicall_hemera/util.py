@@ -14,7 +14,7 @@ import orjson
 from mpire import WorkerPool
 
 from indexer.utils.multicall_hemera import Call
-from indexer.utils.multicall_hemera.signature import _get_signature
+from indexer.utils.multicall_hemera.encoder import decode_try_aggregate_result
 
 logger = logging.getLogger(__name__)
 from contextlib import contextmanager
@@ -88,7 +88,24 @@ def calculate_execution_time(func):
     return wrapper
 
 
+def request_submitter(make_request):
+    """
+    Returns the submit_request of the provider of make_request when it sends requests without blocking, such as
+    AsyncBatchHTTPProvider. Attributes forwarded by wrapping providers are ignored, as they would bypass the wrapper.
+    """
+    provider = getattr(make_request, "__self__", None)
+    if provider is None or getattr(type(provider), "submit_request", None) is None:
+        return None
+    return provider.submit_request
+
+
 def make_request_concurrent(make_request, chunks, max_workers=None):
+    submit_request = request_submitter(make_request)
+    if submit_request is not None:
+        # Every chunk is in flight at once on the provider's event loop, bounded by its max_inflight
+        request_futures = [submit_request(params=orjson.dumps(chunk[0])) for chunk in chunks]
+        return [future.result() for future in request_futures]
+
     def single_request(chunk, index):
         logger.debug(f"single request {len(chunk)}")
         return index, make_request(params=orjson.dumps(chunk))
@@ -106,12 +123,9 @@ def make_request_concurrent(make_request, chunks, max_workers=None):
     return results
 
 
-sig = _get_signature("tryBlockAndAggregate(bool,(address,bytes)[])(uint256,uint256,(bool,bytes)[])")
-
-
 def process_response(calls, result):
     logger.debug(f"{__name__}, calls {len(calls)}")
-    block_id, _, outputs = sig.decode_data(bytes.fromhex(result[2:]))
+    block_id, _, outputs = decode_try_aggregate_result(bytes.fromhex(result[2:]))
     res = {}
     for call, (success, output) in zip(calls, outputs):
         res.update(Call.decode_output(output, call.signature, call.returns, success))
@@ -0,0 +1,248 @@
+import logging
+import re
+from typing import Type
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from common.converter.pg_converter import domain_model_mapping
+from common.models import HemeraModel
+
+# Partitions are named after the index of their first block range, matching the names migrations/env.py ignores
+PARTITION_NAME_FORMAT = "{}_partition_{:06d}"
+DEFAULT_PARTITIONS_AHEAD = 2
+
+PARTITION_BOUND_PATTERN = re.compile(r"TO \('?(\d+)'?\)")
+
+logger = logging.getLogger(__name__)
+
+# Names of the tables found range partitioned, upserts into them need the partition column
+_partitioned_tables = set()
+
+
+def partitioned_models():
+    """Models which may be range partitioned, the ones declaring a __partition_column__."""
+    models = set(config["table"] for config in domain_model_mapping.values())
+    return sorted(
+        [model for model in models if model.__partition_column__ is not None], key=lambda model: model.__tablename__
+    )
+
+
+def is_partitioned(model: Type[HemeraModel]):
+    return model.__tablename__ in _partitioned_tables
+
+
+def conflict_columns(model: Type[HemeraModel]):
+    """Primary key columns to upsert on. Unique keys of a partitioned table must include its partition column."""
+    pk_list = [pk.name for pk in model.__table__.primary_key.columns]
+    if is_partitioned(model) and model.__partition_column__ not in pk_list:
+        pk_list.append(model.__partition_column__)
+    return pk_list
+
+
+def partition_name(model: Type[HemeraModel], partition_index):
+    return PARTITION_NAME_FORMAT.format(model.__tablename__, partition_index)
+
+
+def partition_boundary(max_block_number, partition_size):
+    """First block after the partition holding max_block_number."""
+    if max_block_number is None:
+        return partition_size
+    return (max_block_number // partition_size + 1) * partition_size
+
+
+def sql_create_partition_statement(model: Type[HemeraModel], start_block, end_block, partition_size):
+    return "CREATE TABLE IF NOT EXISTS {}.{} PARTITION OF {}.{} FOR VALUES FROM ({}) TO ({})".format(
+        model.schema(),
+        partition_name(model, start_block // partition_size),
+        model.schema(),
+        model.__tablename__,
+        start_block,
+        end_block,
+    )
+
+
+def sql_convert_to_partitioned_statements(model: Type[HemeraModel], boundary, pkey_name, index_names):
+    """
+    Statements turning an existing table into a table range partitioned by its partition column. The existing rows
+    are not copied, the old table is renamed and attached as the partition of blocks [0, boundary). Its indexes are
+    renamed so the partitioned table can take their names, and are attached to the matching partitioned indexes.
+
+    The rows are still read under an ACCESS EXCLUSIVE lock of the old table, held until the statements commit:
+    SET NOT NULL and the range constraint scan the whole table, and when the primary key lacks the partition column,
+    ATTACH PARTITION builds a unique index over every row to match the primary key of the partitioned table.
+    Reads and writes of the table wait meanwhile, which takes minutes to hours on large tables, so the indexer
+    should be stopped while tables are converted.
+    """
+    schema = model.schema()
+    table = model.__tablename__
+    column = model.__partition_column__
+    legacy = partition_name(model, 0)
+    pk_list = [pk.name for pk in model.__table__.primary_key.columns]
+    if column not in pk_list:
+        pk_list.append(column)
+
+    statements = [
+        "ALTER TABLE {}.{} RENAME TO {}".format(schema, table, legacy),
+        "ALTER TABLE {}.{} RENAME CONSTRAINT {} TO {}_pkey".format(schema, legacy, pkey_name, legacy),
+    ]
+    for i, index_name in enumerate(index_names):
+        statements.append("ALTER INDEX {}.{} RENAME TO {}_index_{}".format(schema, index_name, legacy, i))
+    statements += [
+        "CREATE TABLE {}.{} (LIKE {}.{} INCLUDING DEFAULTS) PARTITION BY RANGE ({})".format(
+            schema, table, schema, legacy, column
+        ),
+        "ALTER TABLE {}.{} ALTER COLUMN {} SET NOT NULL".format(schema, table, column),
+        "ALTER TABLE {}.{} ADD PRIMARY KEY ({})".format(schema, table, ", ".join(pk_list)),
+    ]
+    for index in sorted(model.__table__.indexes, key=lambda index: index.name):
+        statements.append(str(CreateIndex(index).compile(dialect=postgresql.dialect())))
+    statements += [
+        # A validated range constraint spares the scan of the old rows when attaching them
+        "ALTER TABLE {}.{} ALTER COLUMN {} SET NOT NULL".format(schema, legacy, column),
+        "ALTER TABLE {}.{} ADD CONSTRAINT {}_range CHECK ({} >= 0 AND {} < {})".format(
+            schema, legacy, legacy, column, column, boundary
+        ),
+        "ALTER TABLE {}.{} ATTACH PARTITION {}.{} FOR VALUES FROM (0) TO ({})".format(
+            schema, table, schema, legacy, boundary
+        ),
+    ]
+    return statements
+
+
+def sql_is_partitioned_statement(model: Type[HemeraModel]):
+    return (
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname = '{}' AND c.relname = '{}'".format(
+            model.schema(), model.__tablename__
+        )
+    )
+
+
+def sql_table_info_statements(model: Type[HemeraModel]):
+    """Queries returning the primary key constraint name, the other index names and the maximum partition column."""
+    return (
+        "SELECT conname FROM pg_constraint WHERE conrelid = '{}.{}'::regclass AND contype = 'p'".format(
+            model.schema(), model.__tablename__
+        ),
+        "SELECT indexname FROM pg_indexes WHERE schemaname = '{}' AND tablename = '{}' "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = '{}.{}'::regclass) "
+        "ORDER BY indexname".format(model.schema(), model.__tablename__, model.schema(), model.__tablename__),
+        "SELECT max({}) FROM {}.{}".format(model.__partition_column__, model.schema(), model.__tablename__),
+    )
+
+
+def partition_existing_tables(service, partition_size):
+    """
+    Converts the partitioned models' tables which are not range partitioned yet, returning the converted models.
+    Each table is converted and committed on its own, so its locks are released before the next one is converted
+    and an interrupted run is resumed by running it again.
+    """
+    converted = []
+    conn = service.get_conn()
+    try:
+        cur = conn.cursor()
+        for model in partitioned_models():
+            cur.execute(sql_is_partitioned_statement(model))
+            if cur.fetchone() is not None:
+                continue
+
+            pkey_statement, indexes_statement, max_statement = sql_table_info_statements(model)
+            cur.execute(pkey_statement)
+            pkey_name = cur.fetchone()[0]
+            cur.execute(indexes_statement)
+            index_names = [row[0] for row in cur.fetchall()]
+            cur.execute(max_statement)
+            boundary = partition_boundary(cur.fetchone()[0], partition_size)
+
+            logger.info(f"Converting {model.__tablename__} to a partitioned table, blocks [0, {boundary}) kept as is.")
+            for statement in sql_convert_to_partitioned_statements(model, boundary, pkey_name, index_names):
+                cur.execute(statement)
+            conn.commit()
+            converted.append(model)
+    except Exception as e:
+        conn.rollback()
+        raise e
+    finally:
+        service.release_conn(conn)
+    return converted
+
+
+def load_partitioned_tables(service):
+    """Finds which tables are range partitioned, returning {model: upper block of its last partition}."""
+    upper_blocks = {}
+    conn = service.get_conn()
+    try:
+        cur = conn.cursor()
+        for model in partitioned_models():
+            cur.execute(
+                "SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "JOIN pg_namespace n ON n.oid = p.relnamespace "
+                "JOIN pg_partitioned_table pt ON pt.partrelid = p.oid "
+                "WHERE n.nspname = %s AND p.relname = %s",
+                (model.schema(), model.__tablename__),
+            )
+            bounds = [PARTITION_BOUND_PATTERN.search(row[0]) for row in cur.fetchall() if row[0]]
+            blocks = [int(bound.group(1)) for bound in bounds if bound is not None]
+            if blocks:
+                upper_blocks[model] = max(blocks)
+                _partitioned_tables.add(model.__tablename__)
+            else:
+                _partitioned_tables.discard(model.__tablename__)
+        conn.commit()
+    finally:
+        service.release_conn(conn)
+    return upper_blocks
+
+
+class PartitionManager:
+    """
+    Keeps range partitions of the partitioned tables created ahead of the sync head. Partitions hold
+    "partition_size" blocks, and "partitions_ahead" partitions past the one of the highest synced block
+    always exist, so exports never fail on a missing partition.
+    Tables are partitioned by the partitioned tables migration when PG_PARTITION_SIZE is set, or by the
+    partition_tables command on databases already migrated, tables left unpartitioned are only reported.
+    """
+
+    def __init__(self, service, partition_size, partitions_ahead=DEFAULT_PARTITIONS_AHEAD):
+        self.service = service
+        self.partition_size = partition_size
+        self.partitions_ahead = partitions_ahead
+        self._upper_blocks = {}
+        self.refresh()
+
+    def refresh(self):
+        self._upper_blocks = load_partitioned_tables(self.service)
+        for model in partitioned_models():
+            if model not in self._upper_blocks:
+                logger.warning(
+                    f"Table {model.__tablename__} is not range partitioned, tables are partitioned by the partitioned "
+                    f"tables migration when it runs with PG_PARTITION_SIZE set, or by the partition_tables command."
+                )
+
+    def ensure_partitions(self, block_number):
+        """Creates the missing partitions up to partitions_ahead partitions past block_number."""
+        target_block = partition_boundary(block_number, self.partition_size) + (
+            self.partitions_ahead * self.partition_size
+        )
+        missing = {model: upper for model, upper in self._upper_blocks.items() if upper < target_block}
+        if not missing:
+            return
+
+        conn = self.service.get_conn()
+        try:
+            cur = conn.cursor()
+            for model, upper_block in missing.items():
+                for start_block in range(upper_block, target_block, self.partition_size):
+                    end_block = start_block + self.partition_size
+                    cur.execute(sql_create_partition_statement(model, start_block, end_block, self.partition_size))
+                    logger.info(f"Created partition of {model.__tablename__} for blocks [{start_block}, {end_block}).")
+                self._upper_blocks[model] = target_block
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            self.service.release_conn(conn)
@@ -1,16 +1,57 @@
-import json
+import asyncio
 import socket
-from json import JSONDecodeError
+import threading
 from urllib.parse import urlparse
 
+import aiohttp
+import orjson
 from web3 import HTTPProvider, IPCProvider
 from web3._utils.request import make_post_request
 from web3._utils.threads import Timeout
 
+from common.utils.exception_control import RetriableError
+
 DEFAULT_TIMEOUT = 60
+DEFAULT_MAX_INFLIGHT_REQUESTS = 256
+IPC_READ_CHUNK_SIZE = 64 * 1024
+
+
+def get_provider_from_uri(
+    uri_string,
+    timeout=DEFAULT_TIMEOUT,
+    batch=False,
+    pool_size=0,
+    max_inflight=DEFAULT_MAX_INFLIGHT_REQUESTS,
+    hedge_percentile=0,
+    call_cache=None,
+):
+    if batch and call_cache is not None:
+        from indexer.utils.eth_call_cache import CachedCallProvider
 
+        return CachedCallProvider(
+            get_provider_from_uri(
+                uri_string,
+                timeout=timeout,
+                batch=True,
+                pool_size=pool_size,
+                max_inflight=max_inflight,
+                hedge_percentile=hedge_percentile,
+            ),
+            call_cache,
+        )
+
+    uris = [uri.strip() for uri in uri_string.split(",")]
+    if batch and len(uris) > 1:
+        from indexer.utils.provider_pool import create_pooled_provider
+
+        return create_pooled_provider(
+            uris,
+            lambda endpoint: get_provider_from_uri(
+                endpoint, timeout=timeout, batch=True, pool_size=pool_size, max_inflight=max_inflight
+            ),
+            hedge_percentile=hedge_percentile,
+        )
 
-def get_provider_from_uri(uri_string, timeout=DEFAULT_TIMEOUT, batch=False):
     uri = urlparse(uri_string)
     if uri.scheme == "file":
         if batch:
@@ -19,7 +60,11 @@ def get_provider_from_uri(uri_string, timeout=DEFAULT_TIMEOUT, batch=False):
             return IPCProvider(uri.path, timeout=timeout)
     elif uri.scheme == "http" or uri.scheme == "https":
         request_kwargs = {"timeout": timeout}
-        if batch:
+        if batch and pool_size > 0:
+            return AsyncBatchHTTPProvider(
+                uri_string, request_kwargs=request_kwargs, pool_size=pool_size, max_inflight=max_inflight
+            )
+        elif batch:
             return BatchHTTPProvider(uri_string, request_kwargs=request_kwargs)
         else:
             return HTTPProvider(uri_string, request_kwargs=request_kwargs)
@@ -31,7 +76,7 @@ class BatchIPCProvider(IPCProvider):
     _socket = None
 
     def make_request(self, method=None, params=None):
-        request = params.encode("utf-8")
+        request = params.encode("utf-8") if isinstance(params, str) else params
         with self._lock, self._socket as sock:
             try:
                 sock.sendall(request)
@@ -40,27 +85,31 @@ class BatchIPCProvider(IPCProvider):
                 sock = self._socket.reset()
                 sock.sendall(request)
 
-            raw_response = b""
+            # Receive into a growing buffer instead of concatenating chunks, and only try to decode
+            # once the received data ends like a complete response.
+            buffer = bytearray(IPC_READ_CHUNK_SIZE)
+            size = 0
             with Timeout(self.timeout) as timeout:
                 while True:
-                    try:
-                        raw_response += sock.recv(4096)
-                    except socket.timeout:
+                    if size == len(buffer):
+                        buffer.extend(bytes(len(buffer)))
+                    with memoryview(buffer) as view, view[size:] as free:
+                        try:
+                            received = sock.recv_into(free)
+                        except socket.timeout:
+                            received = 0
+                    if received == 0:
                         timeout.sleep(0)
                         continue
-                    if raw_response == b"":
-                        timeout.sleep(0)
-                    elif has_valid_json_rpc_ending(raw_response):
+
+                    size += received
+                    if has_valid_json_rpc_ending(buffer[max(0, size - 2) : size]):
                         try:
-                            response = json.loads(raw_response.decode("utf-8"))
-                            timeout.sleep(0)
-                        except JSONDecodeError:
+                            with memoryview(buffer) as view, view[:size] as frame:
+                                return orjson.loads(frame)
+                        except orjson.JSONDecodeError:
                             continue
-                        else:
-                            return response
-                    else:
-                        timeout.sleep(0)
-                        continue
+                    timeout.sleep(0)
 
 
 class BatchHTTPProvider(HTTPProvider):
@@ -81,6 +130,114 @@ class BatchHTTPProvider(HTTPProvider):
         )
         return response
 
+    def decode_rpc_response(self, raw_response):
+        return orjson.loads(raw_response)
+
+
+class AsyncRPCTransport:
+    """AsyncRPCTransport posts JSON-RPC payloads to one endpoint from a background asyncio loop.
+
+    Requests share a pool of at most "pool_size" keep-alive connections and at most "max_inflight"
+    requests are in flight at once, whichever thread submits them. One transport is shared by every
+    provider of the same endpoint in the process.
+    """
+
+    _transports = {}
+    _transports_lock = threading.Lock()
+
+    @classmethod
+    def for_endpoint(cls, endpoint_uri, timeout, pool_size, max_inflight):
+        # Providers of the same endpoint with other limits get their own transport
+        key = (endpoint_uri, timeout, pool_size, max_inflight)
+        with cls._transports_lock:
+            transport = cls._transports.get(key)
+            if transport is None:
+                transport = cls(endpoint_uri, timeout, pool_size, max_inflight)
+                cls._transports[key] = transport
+            return transport
+
+    def __init__(self, endpoint_uri, timeout, pool_size, max_inflight):
+        self.endpoint_uri = endpoint_uri
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_inflight = max_inflight
+        self._session = None
+        self._semaphore = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name="AsyncRPCTransport", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _get_session(self):
+        # Only called from the loop thread, so no lock is needed
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Content-Type": "application/json"},
+            )
+            self._semaphore = asyncio.Semaphore(self.max_inflight)
+        return self._session
+
+    async def post(self, request_data):
+        session = self._get_session()
+        async with self._semaphore:
+            try:
+                async with session.post(self.endpoint_uri, data=request_data) as response:
+                    response.raise_for_status()
+                    return await response.read()
+            except aiohttp.ClientError as e:
+                raise RetriableError(f"Request to {self.endpoint_uri} failed: {e}")
+            except asyncio.TimeoutError:
+                raise RetriableError(f"Request to {self.endpoint_uri} timed out after {self.timeout} seconds")
+
+    async def _request(self, request_data, decode):
+        raw_response = await self.post(request_data)
+        return raw_response if decode is None else decode(raw_response)
+
+    def submit(self, request_data, decode=None):
+        """Returns a concurrent.futures.Future of the raw response body, or of decode(body) when given."""
+        return asyncio.run_coroutine_threadsafe(self._request(request_data, decode), self._loop)
+
+    def close(self):
+        if self._session is not None:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+class AsyncBatchHTTPProvider(BatchHTTPProvider):
+    """Batch HTTP provider backed by a shared AsyncRPCTransport.
+
+    make_request keeps the blocking interface jobs use, submit_request lets a single thread keep many batches
+    in flight, see make_request_concurrent.
+    """
+
+    def __init__(
+        self, endpoint_uri, request_kwargs=None, pool_size=16, max_inflight=DEFAULT_MAX_INFLIGHT_REQUESTS, **kwargs
+    ):
+        super().__init__(endpoint_uri, request_kwargs=request_kwargs, **kwargs)
+        timeout = (request_kwargs or {}).get("timeout", DEFAULT_TIMEOUT)
+        self._transport = AsyncRPCTransport.for_endpoint(self.endpoint_uri, timeout, pool_size, max_inflight)
+
+    def submit_request(self, method=None, params=None):
+        """Sends the request without blocking, returning a concurrent.futures.Future of the decoded response."""
+        request_data = params.encode("utf-8") if isinstance(params, str) else params
+        return self._transport.submit(request_data, self.decode_rpc_response)
+
+    def make_request(self, method=None, params=None):
+        self.logger.debug("Making request HTTP. URI: %s, Request: %s", self.endpoint_uri, params)
+        response = self.submit_request(params=params).result()
+        self.logger.debug(
+            "Getting response HTTP. URI: %s, " "Request: %s, Response: %s",
+            self.endpoint_uri,
+            params,
+            response,
+        )
+        return response
+
 
 def has_valid_json_rpc_ending(raw_response):
     for valid_ending in [b"}\n", b"]\n"]:
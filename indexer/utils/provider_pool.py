@@ -0,0 +1,257 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+
+HEAD_REFRESH_SECONDS = 10
+MAX_HEAD_LAG_BLOCKS = 5
+LATENCY_WINDOW_SIZE = 200
+MIN_HEDGE_SAMPLES = 20
+EWMA_ALPHA = 0.2
+ERROR_PENALTY = 10
+# Latency assumed for endpoints that only failed so far
+ERROR_LATENCY_SECONDS = 5
+# Endpoints failing that many requests in a row are ranked last for COOLDOWN_SECONDS
+COOLDOWN_ERRORS = 3
+COOLDOWN_SECONDS = 30
+
+logger = logging.getLogger(__name__)
+
+
+class EndpointHealth:
+    """Latency, error rate, in-flight requests and head block of one endpoint, shared by every thread."""
+
+    def __init__(self, uri):
+        self.uri = uri
+        self.latency = None
+        self.error_rate = 0.0
+        self.head_block = None
+        self.inflight = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.cooldown_until = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW_SIZE)
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.inflight += 1
+            self.requests += 1
+
+    def record_success(self, latency):
+        with self._lock:
+            self.inflight -= 1
+            self._latencies.append(latency)
+            self.latency = latency if self.latency is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+            self.error_rate = (1 - EWMA_ALPHA) * self.error_rate
+            self.consecutive_errors = 0
+            self.cooldown_until = 0
+
+    def record_error(self):
+        with self._lock:
+            self.inflight -= 1
+            self.errors += 1
+            self.error_rate = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.error_rate
+            self.consecutive_errors += 1
+            if self.consecutive_errors >= COOLDOWN_ERRORS:
+                self.cooldown_until = time.time() + COOLDOWN_SECONDS
+                logger.warning(f"{self.uri} failed {self.consecutive_errors} requests in a row, cooling down")
+
+    def percentile(self, percentile):
+        with self._lock:
+            if len(self._latencies) < MIN_HEDGE_SAMPLES:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+    def cooling_down(self, now=None):
+        return self.cooldown_until > (time.time() if now is None else now)
+
+    def score(self):
+        # Lower is better. Endpoints without samples yet are tried first, endpoints that only failed last.
+        if self.latency is not None:
+            latency = self.latency
+        else:
+            latency = ERROR_LATENCY_SECONDS if self.errors else 0
+        return (latency + 0.001) * (1 + ERROR_PENALTY * self.error_rate) * (1 + self.inflight)
+
+    def metrics(self):
+        return {
+            "uri": self.uri,
+            "latency": self.latency,
+            "error_rate": self.error_rate,
+            "head_block": self.head_block,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "cooling_down": self.cooling_down(),
+        }
+
+
+class ProviderPool:
+    """
+    Health of the endpoints behind one comma separated provider uri. A pool is shared by every
+    PooledBatchProvider of the same uri list in the process, so all worker threads rank endpoints
+    from the same observations.
+    """
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @classmethod
+    def for_uris(cls, uris, create_provider, hedge_percentile=0):
+        key = tuple(uris)
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                pool = cls(uris, create_provider, hedge_percentile)
+                cls._pools[key] = pool
+            return pool
+
+    def __init__(self, uris, create_provider, hedge_percentile=0):
+        self.endpoints = [EndpointHealth(uri) for uri in uris]
+        self.hedge_percentile = hedge_percentile
+        # Only refreshes head blocks, requests are sent on the caller's thread or submitted to async providers
+        self.executor = ThreadPoolExecutor(max_workers=len(uris), thread_name_prefix="ProviderPool")
+        self._create_provider = create_provider
+        self._head_providers = {}
+        self._last_head_refresh = 0
+        self._lock = threading.Lock()
+
+    def ranked(self):
+        heads = [endpoint.head_block for endpoint in self.endpoints if endpoint.head_block is not None]
+        best_head = max(heads) if heads else None
+        now = time.time()
+
+        def rank(endpoint):
+            lagging = (
+                best_head is not None
+                and endpoint.head_block is not None
+                and endpoint.head_block < best_head - MAX_HEAD_LAG_BLOCKS
+            )
+            return endpoint.cooling_down(now), lagging, endpoint.score()
+
+        return sorted(self.endpoints, key=rank)
+
+    def hedge_deadline(self, endpoint):
+        if not self.hedge_percentile:
+            return None
+        return endpoint.percentile(self.hedge_percentile)
+
+    def maybe_refresh_heads(self):
+        now = time.time()
+        with self._lock:
+            if now - self._last_head_refresh < HEAD_REFRESH_SECONDS:
+                return
+            self._last_head_refresh = now
+
+        logger.info(f"Provider pool health: {self.metrics()}")
+        for endpoint in self.endpoints:
+            self.executor.submit(self._refresh_head, endpoint)
+
+    def _refresh_head(self, endpoint):
+        provider = self._head_providers.get(endpoint.uri)
+        if provider is None:
+            provider = self._head_providers[endpoint.uri] = self._create_provider(endpoint.uri)
+        try:
+            response = provider.make_request(
+                params=orjson.dumps({"jsonrpc": "2.0", "method": "eth_blockNumber", "params": [], "id": 1})
+            )
+            endpoint.head_block = int(response["result"], 16)
+        except Exception as e:
+            logger.warning(f"Failed to refresh head block of {endpoint.uri}: {e}")
+
+    def metrics(self):
+        return [endpoint.metrics() for endpoint in self.endpoints]
+
+
+class PooledBatchProvider:
+    """
+    Batch provider sending each request to the healthiest endpoint of a ProviderPool.
+    A failed request is retried once on the next endpoint. With hedging enabled, a request still running
+    after the primary endpoint's latency percentile is also sent to the next endpoint and
+    the first successful response wins. Hedging needs providers sending requests without blocking,
+    such as AsyncBatchHTTPProvider, so no thread is taken by a request while it is in flight.
+    """
+
+    def __init__(self, pool, create_provider):
+        self._pool = pool
+        self._providers = {endpoint.uri: create_provider(endpoint.uri) for endpoint in pool.endpoints}
+        self._can_hedge = all(
+            getattr(type(provider), "submit_request", None) is not None for provider in self._providers.values()
+        )
+        if pool.hedge_percentile and not self._can_hedge:
+            logger.warning("Requests are only hedged with asynchronous providers, set --rpc-pool-size to enable it.")
+
+    @property
+    def endpoint_uri(self):
+        return self._pool.ranked()[0].uri
+
+    def make_request(self, method=None, params=None):
+        self._pool.maybe_refresh_heads()
+        ranked = self._pool.ranked()
+        primary = ranked[0]
+        if len(ranked) == 1:
+            return self._send(primary, params)
+
+        deadline = self._pool.hedge_deadline(primary) if self._can_hedge else None
+        if deadline is None:
+            try:
+                return self._send(primary, params)
+            except Exception as e:
+                logger.warning(f"Request to {primary.uri} failed, retrying on {ranked[1].uri}: {e}")
+                return self._send(ranked[1], params)
+
+        first = self._submit(primary, params)
+        try:
+            return first.result(timeout=deadline)
+        except futures.TimeoutError:
+            pass
+        except Exception as e:
+            logger.warning(f"Request to {primary.uri} failed, retrying on {ranked[1].uri}: {e}")
+            return self._send(ranked[1], params)
+
+        hedge = self._submit(ranked[1], params)
+        error = None
+        for future in futures.as_completed([first, hedge]):
+            try:
+                return future.result()
+            except Exception as e:
+                error = e
+        raise error
+
+    def _send(self, endpoint, params):
+        endpoint.start()
+        start_time = time.time()
+        try:
+            response = self._providers[endpoint.uri].make_request(params=params)
+        except Exception:
+            endpoint.record_error()
+            raise
+        endpoint.record_success(time.time() - start_time)
+        return response
+
+    def _submit(self, endpoint, params):
+        """Sends the request without blocking on the caller's thread, returning a future of the response."""
+        endpoint.start()
+        start_time = time.time()
+
+        def record(future):
+            if future.cancelled() or future.exception() is not None:
+                endpoint.record_error()
+            else:
+                endpoint.record_success(time.time() - start_time)
+
+        future = self._providers[endpoint.uri].submit_request(params=params)
+        future.add_done_callback(record)
+        return future
+
+
+def create_pooled_provider(uris, create_provider, hedge_percentile=0):
+    pool = ProviderPool.for_uris(uris, create_provider, hedge_percentile)
+    return PooledBatchProvider(pool, create_provider)
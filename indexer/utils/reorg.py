@@ -1,4 +1,5 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
 from sqlalchemy import and_
@@ -8,56 +9,107 @@ from common.models import HemeraModel
 from common.services.postgresql_service import PostgreSQLService
 from common.utils.exception_control import RetriableError
 
+# Tables are marked in parallel on at most that many pooled connections
+MAX_REORG_WORKERS = 4
 
-def set_reorg_sign(jobs, block_number, service):
-    conn = service.get_conn()
-    cur = conn.cursor()
-    try:
-        table_done = set()
-        for job in jobs:
-            for output in job.output_types:
-                model = domain_model_mapping[output.__name__]
-                table = model["table"]
-                if table.__name__ in table_done:
-                    continue
-
-                table_done.add(table.__name__)
-                if hasattr(table, "reorg"):
-                    update_stmt = (
-                        f"UPDATE {table.__tablename__} "
-                        + f"SET reorg=TRUE, update_time='{datetime.utcfromtimestamp(datetime.now(timezone.utc).timestamp())}'"
+
+def reorg_tables(jobs):
+    """Returns [(table, block number column)] of the tables written by the given jobs which keep a reorg flag."""
+    tables = []
+    table_done = set()
+    for job in jobs:
+        for output in job.output_types:
+            model = domain_model_mapping[output.__name__]
+            table = model["table"]
+            if table.__name__ in table_done:
+                continue
+
+            table_done.add(table.__name__)
+            if hasattr(table, "reorg"):
+                if hasattr(table, "number"):
+                    tables.append((table, "number"))
+                elif hasattr(table, "block_number"):
+                    tables.append((table, "block_number"))
+                else:
+                    logging.warning(
+                        f"Reorging table: {table} has no block number info, "
+                        f"could not complete reorg action, "
+                        f"reorging will be skipped this table."
                     )
+    return tables
+
+
+def set_reorg_sign(jobs, start_block, end_block, service):
+    """
+    Flags the rows of blocks [start_block, end_block] of every table written by the given jobs as reorged.
+    Tables are updated in parallel on several connections, which are only committed once every table is updated,
+    and are all rolled back otherwise. Should a commit fail after others went through, some tables are left flagged,
+    the range is flagged again on retry, skipping the rows already flagged.
+    """
+    tables = reorg_tables(jobs)
+    if not tables:
+        return
+    update_time = datetime.utcfromtimestamp(datetime.now(timezone.utc).timestamp())
+
+    workers = min(len(tables), MAX_REORG_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_set_tables_reorg_sign, tables[i::workers], start_block, end_block, update_time, service)
+            for i in range(workers)
+        ]
+    connections = [future.result() for future in futures if future.exception() is None]
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    try:
+        if not errors:
+            for conn in connections:
+                conn.commit()
+    except Exception as e:
+        errors.append(e)
+    finally:
+        for conn in connections:
+            _release_conn(conn, service)
+    if errors:
+        logging.error(errors[0])
+        raise RetriableError(errors[0])
 
-                    if hasattr(table, "number"):
-                        update_stmt += f"WHERE number={block_number}"
-                    elif hasattr(table, "block_number"):
-                        update_stmt += f"WHERE block_number={block_number}"
-                    else:
-                        update_stmt = None
-                        logging.warning(
-                            f"Reorging table: {table} has no block number info, "
-                            f"could not complete reorg action, "
-                            f"reorging will be skipped this table."
-                        )
-
-                    if update_stmt:
-                        cur.execute(update_stmt)
-        conn.commit()
+
+def _set_tables_reorg_sign(tables, start_block, end_block, update_time, service):
+    """Updates the tables on one connection, returning the connection with the updates left uncommitted."""
+    conn = service.get_conn()
+    try:
+        cur = conn.cursor()
+        for table, column in tables:
+            # The block number range lets partitioned tables be pruned to the partitions of the range
+            cur.execute(
+                f"UPDATE {table.__tablename__} SET reorg=TRUE, update_time=%s "
+                f"WHERE {column} BETWEEN %s AND %s AND reorg IS NOT TRUE",
+                (update_time, start_block, end_block),
+            )
     except Exception as e:
-        logging.error(e)
-        raise RetriableError(e)
+        _release_conn(conn, service)
+        raise e
+    return conn
+
+
+def _release_conn(conn, service):
+    # Rolling back a committed connection is a no-op, so every connection is rolled back before going back to the pool
+    try:
+        conn.rollback()
     finally:
         service.release_conn(conn)
 
 
-def should_reorg(block_number: int, table: HemeraModel, service: PostgreSQLService):
+def should_reorg(block_number: int, table: HemeraModel, service: PostgreSQLService, end_block=None):
+    """Tells whether the table has rows flagged as reorged in blocks [block_number, end_block]."""
     if not hasattr(table, "reorg"):
         return False
+    if end_block is None:
+        end_block = block_number
     condition = None
     if hasattr(table, "number"):
-        condition = and_(table.reorg == True, table.number == block_number)
+        condition = and_(table.reorg == True, table.number.between(block_number, end_block))
     elif hasattr(table, "block_number"):
-        condition = and_(table.reorg == True, table.block_number == block_number)
+        condition = and_(table.reorg == True, table.block_number.between(block_number, end_block))
     else:
         return False
 
@@ -1,35 +1,84 @@
+import json
 import os
+import time
 from datetime import datetime, timezone
 
 from sqlalchemy import func
 from sqlalchemy.dialects.postgresql import insert
 
 from common.models.sync_record import SyncRecord
-from common.utils.file_utils import smart_open, write_to_file
+from common.utils.file_utils import smart_open, write_to_file_atomically
 
 
 class BaseRecorder(object):
+    # Jobs whose progress is recorded together with the last synced block
+    _job_names = []
+
     def set_last_synced_block(self, last_synced_block):
         pass
 
     def get_last_synced_block(self):
         pass
 
+    def track_jobs(self, job_names):
+        self._job_names = list(job_names)
+
+    def get_job_progress(self):
+        """Returns {job name: last block synced by the job} for every job ever tracked."""
+        return {}
+
+    def get_resume_block(self):
+        """
+        Block to resume after. Jobs tracked again which stopped before the last synced block, because they were
+        left out of the runs since, resume from their own position. Jobs never tracked start from the record.
+        """
+        job_progress = self.get_job_progress()
+        positions = [job_progress[job_name] for job_name in self._job_names if job_name in job_progress]
+        return min([self.get_last_synced_block()] + positions)
+
+    def flush(self):
+        pass
+
+
+def parse_file_record(content):
+    """Returns the last synced block and the job progress of the content of a file record."""
+    # Records without job progress are a plain block number
+    if content.lstrip().startswith("{"):
+        record = json.loads(content)
+        return record["last_synced_block"], record.get("jobs", {})
+    return int(content), {}
+
 
 class FileSyncRecorder(BaseRecorder):
 
     def __init__(self, file_name):
         self.file_name = file_name
+        self._job_progress = None
 
     def set_last_synced_block(self, last_synced_block):
-        write_to_file(self.file_name, str(last_synced_block) + "\n")
+        job_progress = self.get_job_progress()
+        job_progress.update({job_name: last_synced_block for job_name in self._job_names})
+        if job_progress:
+            content = json.dumps({"last_synced_block": last_synced_block, "jobs": job_progress})
+        else:
+            content = str(last_synced_block)
+        write_to_file_atomically(self.file_name, content + "\n")
 
     def get_last_synced_block(self):
+        return self._read_record()[0]
+
+    def get_job_progress(self):
+        if self._job_progress is None:
+            self._job_progress = self._read_record()[1]
+        return self._job_progress
+
+    def _read_record(self):
         if not os.path.isfile(self.file_name):
+            self._job_progress = {}
             self.set_last_synced_block(0)
-            return 0
+            return 0, {}
         with smart_open(self.file_name, "r") as last_synced_block_file:
-            return int(last_synced_block_file.read())
+            return parse_file_record(last_synced_block_file.read())
 
 
 class PGSyncRecorder(BaseRecorder):
@@ -37,27 +86,52 @@ class PGSyncRecorder(BaseRecorder):
     def __init__(self, key, service):
         self.key = key
         self.service = service
+        self._written_block = None
+
+    def job_sign(self, job_name):
+        return f"{self.key}:{job_name}"
+
+    def checkpoint_rows(self, last_synced_block):
+        """(mission_sign, last_block_number) rows of the record and of the progress of the tracked jobs."""
+        return [(self.key, last_synced_block)] + [
+            (self.job_sign(job_name), last_synced_block) for job_name in self._job_names
+        ]
+
+    def sql_upsert_statement(self):
+        """Statement writing the record from another transaction, taking (mission_sign, last_block_number)."""
+        return (
+            "INSERT INTO {}.{} (mission_sign, last_block_number, update_time) VALUES (%s, %s, now()) "
+            "ON CONFLICT (mission_sign) DO UPDATE SET "
+            "last_block_number = EXCLUDED.last_block_number, update_time = EXCLUDED.update_time"
+        ).format(SyncRecord.schema(), SyncRecord.__tablename__)
+
+    def mark_written(self, last_synced_block):
+        """Tells the recorder the block has been recorded together with the exported items."""
+        self._written_block = last_synced_block
 
     def set_last_synced_block(self, last_synced_block):
+        if self._written_block is not None and last_synced_block <= self._written_block:
+            # Already recorded by the export, possibly with a newer range committed in between
+            return
         session = self.service.get_service_session()
         update_time = func.to_timestamp(int(datetime.now(timezone.utc).timestamp()))
         try:
-            statement = (
-                insert(SyncRecord)
-                .values(
+            statement = insert(SyncRecord).values(
+                [
                     {
-                        "mission_sign": self.key,
-                        "last_block_number": last_synced_block,
+                        "mission_sign": mission_sign,
+                        "last_block_number": block_number,
                         "update_time": update_time,
                     }
-                )
-                .on_conflict_do_update(
-                    index_elements=[SyncRecord.mission_sign],
-                    set_={
-                        "last_block_number": last_synced_block,
-                        "update_time": update_time,
-                    },
-                )
+                    for mission_sign, block_number in self.checkpoint_rows(last_synced_block)
+                ]
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=[SyncRecord.mission_sign],
+                set_={
+                    "last_block_number": statement.excluded.last_block_number,
+                    "update_time": statement.excluded.update_time,
+                },
             )
             session.execute(statement)
             session.commit()
@@ -80,6 +154,67 @@ class PGSyncRecorder(BaseRecorder):
             return result
         return 0
 
+    def get_job_progress(self):
+        prefix = self.job_sign("")
+        session = self.service.get_service_session()
+        try:
+            result = (
+                session.query(SyncRecord.mission_sign, SyncRecord.last_block_number)
+                .filter(SyncRecord.mission_sign.startswith(prefix, autoescape=True))
+                .all()
+            )
+        finally:
+            session.close()
+        return {mission_sign[len(prefix) :]: block_number for mission_sign, block_number in result}
+
+
+class CoalescingRecorder(BaseRecorder):
+    """
+    Writes the record of the wrapped recorder only every "flush_ranges" ranges or "flush_seconds" seconds,
+    whichever comes first, and when flushed. After a crash the ranges synced since the last written record
+    are synced again, exports being upserts this only costs time.
+    """
+
+    def __init__(self, recorder: BaseRecorder, flush_ranges=0, flush_seconds=0):
+        self.recorder = recorder
+        self.flush_ranges = flush_ranges
+        self.flush_seconds = flush_seconds
+        self._pending_block = None
+        self._pending_ranges = 0
+        self._pending_since = None
+
+    def track_jobs(self, job_names):
+        super().track_jobs(job_names)
+        self.recorder.track_jobs(job_names)
+
+    def set_last_synced_block(self, last_synced_block):
+        self._pending_block = last_synced_block
+        self._pending_ranges += 1
+        if self._pending_since is None:
+            self._pending_since = time.time()
+
+        if (self.flush_ranges <= 0 and self.flush_seconds <= 0) or (
+            (self.flush_ranges > 0 and self._pending_ranges >= self.flush_ranges)
+            or (self.flush_seconds > 0 and time.time() - self._pending_since >= self.flush_seconds)
+        ):
+            self.flush()
+
+    def get_last_synced_block(self):
+        if self._pending_block is not None:
+            return self._pending_block
+        return self.recorder.get_last_synced_block()
+
+    def get_job_progress(self):
+        return self.recorder.get_job_progress()
+
+    def flush(self):
+        if self._pending_block is None:
+            return
+        self.recorder.set_last_synced_block(self._pending_block)
+        self._pending_block = None
+        self._pending_ranges = 0
+        self._pending_since = None
+
 
 def create_recorder(sync_recorder: str, config: dict) -> BaseRecorder:
     recorder_sign = sync_recorder.find(":")
@@ -0,0 +1,108 @@
+from collections import OrderedDict
+
+from indexer.utils.utils import ZERO_ADDRESS
+
+DEFAULT_LEDGER_SIZE = 1000000
+
+
+def balance_key(token_address, address, token_id=None):
+    return token_address, address, token_id
+
+
+def transfer_token_id(transfer):
+    # ERC20 transfers have no token id, ERC1155 balances are kept per token id
+    return getattr(transfer, "token_id", None)
+
+
+class TokenBalanceLedger:
+    """
+    Keeps the balances of the (token, holder, token id) touched by the last synced ranges, so the balances of
+    the next range are derived from its transfers instead of being read with eth_call at every block.
+    Balances are only valid for ranges following each other, the ledger is cleared when a range does not
+    follow the last applied one. At most "max_entries" balances are kept, the least recently moved are dropped.
+    Tokens found not to follow their transfers, such as rebasing or fee-on-transfer tokens, are distrusted and
+    never accounted again.
+    """
+
+    def __init__(self, max_entries=DEFAULT_LEDGER_SIZE, untrusted_tokens=()):
+        self.max_entries = max_entries
+        self.untrusted_tokens = set(untrusted_tokens)
+        self._balances = OrderedDict()
+        self._synced_block = None
+
+    def __len__(self):
+        return len(self._balances)
+
+    def get(self, key):
+        return self._balances.get(key)
+
+    def start_range(self, start_block):
+        if self._synced_block is not None and start_block != self._synced_block + 1:
+            self.clear()
+
+    def clear(self):
+        """Drops every balance, the next range is seeded again whatever its start."""
+        self._balances.clear()
+        self._synced_block = None
+
+    def holder_keys(self, transfers):
+        """Returns {balance key: token type} of the holders moved by the transfers."""
+        keys = {}
+        for transfer in transfers:
+            token_id = transfer_token_id(transfer)
+            for address in (transfer.from_address, transfer.to_address):
+                if address != ZERO_ADDRESS:
+                    keys[balance_key(transfer.token_address, address, token_id)] = transfer.token_type
+        return keys
+
+    def missing_keys(self, keys):
+        return [key for key in keys if key not in self._balances]
+
+    def seed(self, balances):
+        """Sets the balances of holders before the range, as {balance key: balance}."""
+        for key, balance in balances.items():
+            self._balances[key] = balance
+
+    def apply(self, transfers, end_block):
+        """
+        Applies the transfers of the range in log order. Returns {(balance key, block number): balance after the
+        block} of every moved holder, and the tokens whose balances went negative or whose values are missing.
+        Balances of these tokens are dropped and they are left out of the returned balances.
+        """
+        balances = {}
+        failed_tokens = set()
+        for transfer in sorted(transfers, key=lambda x: (x.block_number, x.log_index)):
+            if transfer.token_address in failed_tokens:
+                continue
+            if transfer.value is None:
+                failed_tokens.add(transfer.token_address)
+                continue
+            token_id = transfer_token_id(transfer)
+            for address, delta in ((transfer.from_address, -transfer.value), (transfer.to_address, transfer.value)):
+                if address == ZERO_ADDRESS:
+                    continue
+                key = balance_key(transfer.token_address, address, token_id)
+                balance = self._balances.get(key)
+                if balance is None or balance + delta < 0:
+                    failed_tokens.add(transfer.token_address)
+                    break
+                self._balances[key] = balance + delta
+                self._balances.move_to_end(key)
+                balances[(key, transfer.block_number)] = balance + delta
+
+        for token_address in failed_tokens:
+            self.distrust(token_address)
+        while len(self._balances) > self.max_entries:
+            self._balances.popitem(last=False)
+        self._synced_block = end_block
+
+        return {
+            (key, block_number): balance
+            for (key, block_number), balance in balances.items()
+            if key[0] not in failed_tokens
+        }, failed_tokens
+
+    def distrust(self, token_address):
+        self.untrusted_tokens.add(token_address)
+        for key in [key for key in self._balances if key[0] == token_address]:
+            del self._balances[key]
@@ -162,6 +162,26 @@ def distinct_collections_by_group(collections: List[object], group_by: List[str]
     return [distinct[key] for key in distinct.keys()]
 
 
+def snapshot_collections_by_group(
+    collections: List[object], group_by: List[str], snapshot_blocks: int, block_key: str = "block_number"
+):
+    """
+    Keeps the item of the highest block of each group in every window of snapshot_blocks blocks, windows being
+    aligned on block numbers so snapshots fall at the same blocks across ranges. With snapshot_blocks 0 only the
+    item of the highest block of each group is kept.
+    """
+    snapshots = {}
+    for item in collections:
+        block_number = getattr(item, block_key)
+        window = block_number // snapshot_blocks if snapshot_blocks > 0 else 0
+        key = tuple(getattr(item, idx) for idx in group_by) + (window,)
+
+        if key not in snapshots or getattr(snapshots[key], block_key) < block_number:
+            snapshots[key] = item
+
+    return list(snapshots.values())
+
+
 def format_block_id(block_id: Union[Optional[int], str]) -> str:
     return hex(block_id) if block_id and isinstance(block_id, int) else block_id
 
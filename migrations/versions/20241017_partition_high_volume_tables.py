@@ -0,0 +1,63 @@
+"""partition high volume tables by block number
+
+Databases migrated past this revision without PG_PARTITION_SIZE are partitioned with the partition_tables command.
+Tables are converted under an ACCESS EXCLUSIVE lock held while their rows are scanned and, when the primary key
+lacks the block number, while a new unique index is built, see sql_convert_to_partitioned_statements.
+
+Revision ID: 3bd2e3099bae
+Revises: 67015d9fa59b
+Create Date: 2024-10-17 10:12:31.524117
+
+"""
+
+import os
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import context, op
+
+from indexer.utils.partition_manager import (
+    partition_boundary,
+    partitioned_models,
+    sql_convert_to_partitioned_statements,
+    sql_is_partitioned_statement,
+    sql_table_info_statements,
+)
+
+# revision identifiers, used by Alembic.
+revision: str = "3bd2e3099bae"
+down_revision: Union[str, None] = "67015d9fa59b"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def get_partition_size():
+    partition_size = context.config.attributes.get("partition_size")
+    if not partition_size:
+        partition_size = int(os.environ.get("PG_PARTITION_SIZE", 0))
+    return partition_size
+
+
+def upgrade() -> None:
+    # Optional, tables stay unpartitioned unless a partition size is given
+    partition_size = get_partition_size()
+    if not partition_size:
+        return
+
+    bind = op.get_bind()
+    for model in partitioned_models():
+        if bind.execute(sa.text(sql_is_partitioned_statement(model))).scalar():
+            continue
+
+        pkey_statement, indexes_statement, max_statement = sql_table_info_statements(model)
+        pkey_name = bind.execute(sa.text(pkey_statement)).scalar()
+        index_names = [row[0] for row in bind.execute(sa.text(indexes_statement)).fetchall()]
+        boundary = partition_boundary(bind.execute(sa.text(max_statement)).scalar(), partition_size)
+        for statement in sql_convert_to_partitioned_statements(model, boundary, pkey_name, index_names):
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    # Rows of a partitioned table can not be turned back into a single table without copying them all,
+    # partitioned tables are kept as they are.
+    pass